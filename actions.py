@@ -1,63 +1,410 @@
-from kivymd.uix.boxlayout import MDBoxLayout
-from kivymd.uix.dialog import MDDialog
-from kivymd.uix.button import MDRaisedButton, MDFlatButton
-from kivymd.uix.textfield import MDTextField
-from kivymd.uix.list import OneLineListItem, MDList
-from kivymd.uix.label import MDLabel
-from kivy.uix.scrollview import ScrollView
-from plyer import filechooser
+from kivy.graphics.texture import Texture
 import os
 
+from session import loadSession, saveSession
+from tracing import tracer
+from utils import writeCubeFile
+
+# LATO LUNGO MINIMO DEL PROXY USATO PER L'ANTEPRIMA LIVE DURANTE IL TRASCINAMENTO DEGLI SLIDER
+LIVE_PREVIEW_SIDE = 640
+
+
+def _fileChooser():
+    # PLYER (E IL BACKEND DEL FILECHOOSER DI SISTEMA) SI CARICA SOLO ALLA PRIMA APERTURA O SALVATAGGIO DI UN FILE
+    from plyer import filechooser
+    return filechooser
+
+
+def refreshPreviewAction(app, image=None):
+    # AGGIORNA IL PREVIEW DELL'IMMAGINE NELL'UI DOPO OGNI MODIFICA (DI DEFAULT L'ANTEPRIMA DEL PROCESSORE)
+    # I PIXEL ELABORATI VANNO DIRETTAMENTE NELLA TEXTURE, SENZA ENCODE/DECODE PNG SU DISCO
+    if image is None:
+        image = app.processor.processedImage
+    if image is None:
+        return
 
-def refreshPreviewAction(app):
-    # AGGIORNA IL PREVIEW DELL'IMMAGINE NELL'UI DOPO OGNI MODIFICA
-    tempPath = app.processor.saveTempResult()
     imageWidget = app.root.ids.main_image
-    imageWidget.source = ""
-    imageWidget.source = tempPath
-    imageWidget.reload()
+    texture = app.previewTexture
+
+    # LA TEXTURE SI RIALLOCA SOLO SE CAMBIANO LE DIMENSIONI DEL PROXY (NUOVA IMMAGINE, RITAGLIO, RESIZE)
+    if texture is None or texture.size != image.size:
+        texture = Texture.create(size=image.size, colorfmt="rgb")
+        # LE TEXTURE KIVY HANNO ORIGINE IN BASSO, LE RIGHE PIL PARTONO DALL'ALTO
+        texture.flip_vertical()
+        app.previewTexture = texture
+
+    with tracer.span("preview.upload", size=image.size):
+        texture.blit_buffer(image.tobytes(), colorfmt="rgb", bufferfmt="ubyte")
+
+    if imageWidget.texture is not texture:
+        # SVUOTA LA SORGENTE (PLACEHOLDER) PRIMA DI ASSEGNARE LA TEXTURE IN MEMORIA
+        imageWidget.source = ""
+        imageWidget.texture = texture
+    else:
+        imageWidget.canvas.ask_update()
+
+    # ISTOGRAMMA DELL'ANTEPRIMA MOSTRATA E, SE MANCANO, STATISTICHE DELL'ORIGINALE PER I COMANDI AUTOMATICI
+    app.statistics.requestPreview(image, lambda stats: updateHistogramAction(app, stats))
+    app.statistics.prefetch(app.processor)
+
+
+def updateHistogramAction(app, stats):
+    # AGGIORNA L'ISTOGRAMMA LIVE E LE PERCENTUALI DI CLIPPING DEL PANNELLO LATERALE
+    app.root.ids.histogram.setStatistics(stats)
+    clipping = stats["clipping"]
+    app.root.ids.histogramInfo.text = f"Ombre chiuse {clipping['shadows']:.1f}%   Luci bruciate {clipping['highlights']:.1f}%"
+
+
+def requestRenderAction(app, onDone=None):
+    # ELABORA L'ANTEPRIMA SUL THREAD DI RENDER CON UNA COPIA DEI PARAMETRI CORRENTI
+    # SE NEL FRATTEMPO ARRIVA UNA RICHIESTA PIÙ RECENTE, QUESTO RISULTATO VIENE SCARTATO
+    processor = app.processor
+    params = dict(processor.currentParams)
+
+    view = processor.getViewport()
+    if view is not None:
+        # ANTEPRIMA INGRANDITA: SI ELABORANO SOLO I TILE VISIBILI (L'ANTEPRIMA INTERA RESTA QUELLA GIÀ REGISTRATA)
+        def show(image):
+            refreshPreviewAction(app, image)
+            if onDone:
+                onDone()
+
+        app.renderer.submit(lambda: processor.renderViewport(view, params), show)
+        return
+
+    source = processor.getPreviewSource()
+
+    def commit(image):
+        # ESEGUITA SUL THREAD PRINCIPALE TRAMITE CLOCK
+        processor.commitPreview(image)
+        refreshPreviewAction(app)
+        if onDone:
+            onDone()
+
+    app.renderer.submit(lambda: processor.renderImage(source, params), commit)
+
+
+def livePreviewAction(app, paramKey, value):
+    # ANTEPRIMA DURANTE IL TRASCINAMENTO: RENDER SU UN PROXY RIDOTTO CON IL VALORE PROVVISORIO
+    # NON MODIFICA I PARAMETRI NÉ LA CRONOLOGIA: IL VALORE DEFINITIVO ARRIVA AL RILASCIO
+    processor = app.processor
+    if not processor.originalImage or paramKey not in processor.currentParams:
+        return
+
+    params = dict(processor.currentParams)
+    params[paramKey] = value
+
+    # CON L'ANTEPRIMA INGRANDITA SI RIELABORANO I TILE VISIBILI: IL PROXY RIDOTTO MOSTREREBBE L'IMMAGINE INTERA
+    view = processor.getViewport()
+    if view is not None:
+        job = lambda: processor.renderViewport(view, params)
+    else:
+        source = processor.getPreviewSource(maxSide=LIVE_PREVIEW_SIDE)
+        job = lambda: processor.renderImage(source, params)
+
+    # STESSO CANALE DELL'ANTEPRIMA DEFINITIVA: IL RENDER DEL RILASCIO SCARTA QUELLI LIVE ANCORA PENDENTI
+    app.renderer.submit(job, lambda image: refreshPreviewAction(app, image))
+
+
+def resizePreviewAction(app, size):
+    # ADATTA IL PROXY DI ANTEPRIMA ALLE DIMENSIONI DEL WIDGET E RIELABORA SE NECESSARIO
+    # (SEMPRE SE L'ANTEPRIMA È INGRANDITA: CAMBIA LA REGIONE VISIBILE)
+    # SENZA DOCUMENTI LA DIMENSIONE VIENE SOLO RICORDATA: L'ENGINE NON SI CREA PER UN RIDIMENSIONAMENTO
+    if not app.documents.started:
+        app.documents.displaySize = (max(1, int(size[0])), max(1, int(size[1])))
+        return
+
+    processor = app.processor
+    if (processor.setDisplaySize(*size) or processor.viewZoom > 1.0) and processor.originalImage:
+        requestRenderAction(app)
+
+
+def zoomViewAction(app, factor, anchor=(0.5, 0.5)):
+    # INGRANDISCE O RIDUCE L'ANTEPRIMA ATTORNO AD ANCHOR (FRAZIONE DELL'AREA MOSTRATA, Y VERSO IL BASSO)
+    if app.processor.originalImage and app.processor.zoomViewport(factor, anchor):
+        requestRenderAction(app)
+
+
+def toggleZoomAction(app, anchor=(0.5, 0.5)):
+    # PASSA DALL'IMMAGINE INTERA AL 100% (UN PIXEL DELL'IMMAGINE PER PIXEL DI SCHERMO) E VICEVERSA
+    processor = app.processor
+    if not processor.originalImage:
+        return
+
+    zoom = 1.0 if processor.viewZoom > 1.0 else processor.actualSizeZoom()
+    if processor.zoomViewport(zoom / processor.viewZoom, anchor):
+        requestRenderAction(app)
+        app.utils.logAction("Zoom al 100%" if zoom > 1.0 else "Zoom adattato alla finestra")
+
+
+def panViewAction(app, dx, dy):
+    # SPOSTA L'ANTEPRIMA INGRANDITA: I TILE GIÀ ELABORATI SONO IN CACHE, SI ELABORANO SOLO QUELLI NUOVI
+    if app.processor.originalImage and app.processor.panViewport(dx, dy):
+        requestRenderAction(app)
 
 
 def openFileAction(app):
-    # APRE IL FILECHOOSER PER CARICARE UN'IMMAGINE E AGGIORNA SLIDER E PREVIEW
-    filePath = filechooser.open_file(
+    # APRE IL FILECHOOSER PER CARICARE UN'IMMAGINE IN UN NUOVO DOCUMENTO (O PASSA A QUELLO GIÀ APERTO)
+    filePath = _fileChooser().open_file(
         title="Apri Immagine",
         filters=[("Immagini", "*.png", "*.jpg", "*.jpeg", "*.bmp", "*.webp", "*.tiff")]
     )
 
-    if filePath and app.processor.loadImage(filePath[0]):
-        refreshPreviewAction(app)
-        app.manualMenu.syncSliders(app.processor.currentParams)
-        app.utils.logAction(f"Immagine caricata: {os.path.basename(filePath[0])}")
+    if not filePath:
+        return
+
+    path = filePath[0]
+    processor, isNew = app.documents.open(path)
+    if not isNew:
+        switchDocumentAction(app, processor)
+        return
+
+    _setActiveProcessor(app, processor)
+
+    # PRIMA UNA BOZZA RIDOTTA (SE IL FORMATO LO PERMETTE), POI LA DECODIFICA COMPLETA IN BACKGROUND
+    if processor.beginLoad(path):
+        requestRenderAction(app)
+        app.manualMenu.syncSliders(processor.currentParams)
+
+    if processor.loadingPath != path:
+        if processor.originalImage is None:
+            _abandonLoad(app, processor, path)
+        elif not processor.isDraft:
+            app.utils.logAction(f"Immagine caricata: {os.path.basename(path)}")
+            app.documents.enforceBudget()
+        return
+
+    _loadFullResolution(app, processor, path, "Immagine caricata")
+
+
+def _loadFullResolution(app, processor, path, message):
+    # DECODIFICA LA PIENA RISOLUZIONE SUL THREAD DI CARICAMENTO E LA CONSEGNA ALL'ENGINE
+    # UN CANALE PER DOCUMENTO: CARICAMENTI DI DOCUMENTI DIVERSI NON SI ANNULLANO A VICENDA
+    def decode():
+        try:
+            return processor.decodeImage(path)
+        except Exception as e:
+            print(e)
+            return None
+
+    def finish(image):
+        # ESEGUITA SUL THREAD PRINCIPALE: SCARTATA SE NEL FRATTEMPO È STATO APERTO UN ALTRO FILE
+        if image is None:
+            if processor.loadingPath == path:
+                processor.loadingPath = None
+                _abandonLoad(app, processor, path)
+            return
+        if not processor.finishLoad(path, image):
+            return
+        if processor is app.processor:
+            requestRenderAction(app)
+            app.manualMenu.syncSliders(processor.currentParams)
+        app.utils.logAction(f"{message}: {os.path.basename(path)}")
+        app.documents.enforceBudget()
+
+    app.loader.submit(decode, finish, channel=("load", id(processor)))
+
+
+def _abandonLoad(app, processor, path):
+    # DECODIFICA FALLITA: UN DOCUMENTO SENZA NESSUNA IMMAGINE VIENE CHIUSO, COSÌ RIAPRIRE LO STESSO FILE
+    # RIPROVA IL CARICAMENTO INVECE DI PASSARE A UN DOCUMENTO VUOTO; CON UNA BOZZA GIÀ MOSTRATA IL DOCUMENTO
+    # RESTA APERTO E LA PIENA RISOLUZIONE VIENE RIPROVATA AL PROSSIMO PASSAGGIO (BEGINRELOAD)
+    app.utils.logAction(f"Impossibile caricare: {os.path.basename(path)}")
+    if processor.originalImage is not None:
+        return
+
+    if processor is app.processor:
+        closeDocumentAction(app)
+    else:
+        app.loader.cancel(channel=("load", id(processor)))
+        app.documents.close(processor)
+
+
+def _setActiveProcessor(app, processor):
+    # COLLEGA L'INTERFACCIA ALL'ENGINE DEL DOCUMENTO ATTIVO
+    app.processor = processor
+    app.speculation = None
+    app.renderer.cancel()
+    app.renderer.cancel(channel="speculation")
+
+
+def switchDocumentAction(app, processor):
+    # PASSA A UN ALTRO DOCUMENTO APERTO: ANTEPRIMA E SLIDER SUBITO DAI SUOI PROXY,
+    # PIENA RISOLUZIONE RICARICATA IN BACKGROUND SE ERA STATA SCARICATA PER RIENTRARE NEL BUDGET
+    if app.dialog:
+        app.dialog.dismiss()
+
+    app.documents.activate(processor)
+    _setActiveProcessor(app, processor)
+
+    imageWidget = app.root.ids.main_image
+    processor.setDisplaySize(*imageWidget.size)
+    if processor.originalImage:
+        requestRenderAction(app)
+    app.manualMenu.syncSliders(processor.currentParams)
+
+    path = processor.beginReload()
+    if path:
+        _loadFullResolution(app, processor, path, "Piena risoluzione ricaricata")
+
+    app.documents.enforceBudget()
+
+
+def closeDocumentAction(app):
+    # CHIUDE IL DOCUMENTO ATTIVO E PASSA A QUELLO USATO PIÙ DI RECENTE
+    closing = app.processor
+    app.loader.cancel(channel=("load", id(closing)))
+    name = os.path.basename(closing.sourcePath) if closing.sourcePath else None
+
+    switchDocumentAction(app, app.documents.close(closing))
+    if app.processor.processedImage is None:
+        app.root.ids.main_image.texture = None
+        app.root.ids.histogram.setStatistics(None)
+        app.root.ids.histogramInfo.text = ""
+    if name:
+        app.utils.logAction(f"Documento chiuso: {name}")
+
+
+def saveSessionAction(app):
+    # SALVA I DOCUMENTI APERTI (CRONOLOGIA, RITAGLIO, LOOK E PROXY) E IL LOG PER RIPRENDERLI AL PROSSIMO AVVIO
+    documents = [processor for processor in app.documents.documents if processor.sourcePath and processor.previewPyramid]
+    try:
+        if documents:
+            saveSession(app.sessionFile, documents, app.processor, app.utils.logHistory)
+        elif os.path.exists(app.sessionFile):
+            os.remove(app.sessionFile)
+    except Exception as e:
+        print(f"ERRORE NEL SALVATAGGIO DELLA SESSIONE: {e}")
+
+
+def restoreSessionAction(app):
+    # RIPRENDE LA SESSIONE SALVATA: OGNI DOCUMENTO SI MOSTRA SUBITO DAL SUO PROXY CON LE MODIFICHE,
+    # LA PIENA RISOLUZIONE DEL DOCUMENTO ATTIVO VIENE DECODIFICATA IN BACKGROUND (LE ALTRE QUANDO SI ATTIVANO)
+    try:
+        session = loadSession(app.sessionFile)
+    except Exception as e:
+        print(f"ERRORE NEL RIPRISTINO DELLA SESSIONE: {e}")
+        return
+    if session is None:
+        return
+
+    app.utils.restoreLogs(session["logs"])
+
+    resumed = {}
+    for index, entry in enumerate(session["documents"]):
+        name = os.path.basename(entry["source"])
+        if entry["status"] != "ok":
+            # SENZA L'ORIGINALE (O CON UN ORIGINALE DIVERSO) LE MODIFICHE NON SAREBBERO PIÙ ESPORTABILI
+            reason = "mancante" if entry["status"] == "missing" else "modificato"
+            app.utils.logAction(f"Sessione: originale {reason}, documento non ripristinato: {name}")
+            continue
+
+        processor, isNew = app.documents.open(entry["source"])
+        if not isNew:
+            continue
+        try:
+            processor.resumeDraft(entry["source"], entry["proxy"], entry["history"])
+        except ValueError as e:
+            print(f"ERRORE NEL RIPRISTINO DI {name}: {e}")
+            app.documents.close(processor)
+            continue
+
+        if entry["look"]:
+            lut = app.utils.loadLut(entry["look"])
+            if lut is not None:
+                processor.setLook(entry["look"], lut)
+        resumed[index] = processor
+
+    if not resumed:
+        return
+
+    app.utils.logAction(f"Sessione ripristinata: {len(resumed)} documenti")
+    switchDocumentAction(app, resumed.get(session["active"]) or next(iter(resumed.values())))
 
 
 def manualUpdateAction(app, paramKey, value):
     # APPLICA IL VALORE MODIFICATO DAGLI SLIDER AL PROCESSORE
+    # ARRIVA AL RILASCIO DELLO SLIDER: OGNI GESTO È UN PASSO DI UNDO SEPARATO
     if not app.processor.originalImage:
         return
 
-    app.processor.updateParam(paramKey, value)
-    app.processor.applyProcessing()
-    refreshPreviewAction(app)
+    app.processor.updateParam(paramKey, value, gestureEnd=True)
+    requestRenderAction(app)
     app.utils.logAction(f"Slider {paramKey} impostato a {value:.2f}")
 
 
+def promptTextChangedAction(app):
+    # IL TESTO DEL PROMPT È CAMBIATO: L'EVENTUALE RISULTATO PRE-CALCOLATO NON È PIÙ VALIDO
+    app.speculation = None
+    app.renderer.cancel(channel="speculation")
+
+    # IN MODALITÀ SPECULATIVA RIPROGRAMMA L'ANALISI (DEBOUNCE: PARTE SOLO QUANDO SI SMETTE DI SCRIVERE)
+    if app.speculativePrompt:
+        app.speculationTrigger()
+
+
+def speculatePromptAction(app):
+    # ANALIZZA IL PROMPT IN DIGITAZIONE E NE PRE-CALCOLA IL RISULTATO SUL PROXY IN BACKGROUND
+    # LA MEMORIA DELL'INTERPRETER NON VIENE TOCCATA: IL PROMPT NON È ANCORA STATO INVIATO
+    processor = app.processor
+    text = app.root.ids.prompt_input.text
+    if not text.strip() or not processor.originalImage:
+        return
+
+    changes, _ = app.interpreter.parsePrompt(
+        text, processor.currentParams, remember=False, statistics=lambda: app.statistics.forEngine(processor)
+    )
+    if not changes:
+        return
+
+    params = dict(processor.currentParams)
+    params.update(changes)
+    source = processor.getPreviewSource()
+    speculation = {"text": text, "params": params, "source": source, "image": None}
+    app.speculation = speculation
+
+    def ready(image):
+        # IL RISULTATO SERVE SOLO SE NEL FRATTEMPO IL TESTO NON È CAMBIATO
+        if app.speculation is speculation:
+            speculation["image"] = image
+
+    app.renderer.submit(lambda: processor.renderImage(source, params), ready, channel="speculation")
+
+
 def processPromptAction(app):
     # ELABORA IL TESTO INSERITO DALL'UTENTE CON L'INTERPRETER
     text = app.root.ids.prompt_input.text
     if not text or not app.processor.originalImage:
         return
 
-    changes, paramsList = app.interpreter.parsePrompt(text, app.processor.currentParams)
+    speculation = app.speculation
+    app.speculation = None
 
-    if changes:
-        for param, value in changes.items():
-            app.processor.updateParam(param, value)
+    changes, paramsList = app.interpreter.parsePrompt(
+        text, app.processor.currentParams, statistics=lambda: app.statistics.forEngine(app.processor)
+    )
 
-        app.processor.applyProcessing()
-        refreshPreviewAction(app)
+    if changes:
+        # UN PROMPT È UN SOLO PASSO DI UNDO, QUALUNQUE SIA IL NUMERO DI PARAMETRI MODIFICATI
+        processor = app.processor
+        processor.updateParamsBatch(changes, label=f"Prompt: {text}")
+
+        if (speculation and speculation["image"] is not None and speculation["text"] == text
+                and speculation["params"] == processor.currentParams and processor.viewZoom == 1.0
+                and speculation["source"] is processor.getPreviewSource()):
+            # RISULTATO GIÀ PRE-CALCOLATO DURANTE LA DIGITAZIONE: COMMIT IMMEDIATO
+            # EVENTUALI RENDER PIÙ VECCHI ANCORA IN CODA NON DEVONO SOVRASCRIVERLO
+            app.renderer.cancel()
+            processor.commitPreview(speculation["image"])
+            refreshPreviewAction(app)
+        else:
+            # SE LA SPECULAZIONE È ANCORA IN CORSO, GLI STADI CHE HA GIÀ CALCOLATO SONO IN CACHE
+            requestRenderAction(app)
         app.manualMenu.syncSliders(app.processor.currentParams)
         app.utils.logAction(f"Prompt: '{text}' (Modificati: {', '.join(paramsList)})")
+    elif app.interpreter.hasAutoCommand(text):
+        # SENZA STATISTICHE DELL'IMMAGINE I COMANDI AUTOMATICI NON PRODUCONO MODIFICHE: VA DETTO ALL'UTENTE
+        app.utils.logAction(f"Prompt: '{text}' ignorato (statistiche dell'immagine non disponibili)")
 
     app.root.ids.prompt_input.text = ""
 
@@ -67,7 +414,11 @@ def saveFinalImageAction(app):
     if not app.processor.processedImage:
         return
 
-    filePath = filechooser.save_file(
+    if app.processor.isDraft:
+        app.utils.logAction("Export non disponibile: caricamento dell'immagine in corso")
+        return
+
+    filePath = _fileChooser().save_file(
         title="Salva Immagine",
         filters=[("PNG", "*.png"), ("JPEG", "*.jpg"), ("WEBP", "*.webp"), ("TIFF", "*.tiff")]
     )
@@ -82,53 +433,11 @@ def saveFinalImageAction(app):
         targetPath += ".png"
         ext = ".png"
 
-    formatMap = {
-        ".png": "PNG",
-        ".jpg": "JPEG",
-        ".jpeg": "JPEG",
-        ".webp": "WEBP",
-        ".tiff": "TIFF"
-    }
-
-    fmt = formatMap.get(ext, "PNG")
-    app.processor.processedImage.save(targetPath, fmt)
-    app.utils.logAction(f"Immagine esportata: {os.path.basename(targetPath)} ({fmt})")
-
-
-def showCropMenuAction(app):
-    # MOSTRA IL DIALOGO PER SCEGLIERE IL FORMATO DI RITAGLIO
-    if not app.processor.originalImage:
-        return
+    from processor import EXPORT_FORMATS
+    fmt = EXPORT_FORMATS.get(ext, "PNG")
 
-    layout = MDBoxLayout(orientation="vertical", size_hint_y=None, height="240dp")
-    scroll = ScrollView()
-    listView = MDList()
-
-    cropFormats = [
-        ("Originale (Reset)", "original"),
-        ("1:1 Quadrato", 1.0),
-        ("16:9 Panoramico", 16 / 9),
-        ("4:5 Ritratto", 4 / 5),
-        ("3:2 Classico", 3 / 2)
-    ]
-
-    for label, ratio in cropFormats:
-        item = OneLineListItem(
-            text=label,
-            on_release=lambda x, r=ratio: applyCropAction(app, r)
-        )
-        listView.add_widget(item)
-
-    scroll.add_widget(listView)
-    layout.add_widget(scroll)
-
-    app.dialog = MDDialog(
-        title="Scegli Formato Ritaglio",
-        type="custom",
-        content_cls=layout,
-        buttons=[MDFlatButton(text="ANNULLA", on_release=lambda x: app.dialog.dismiss())]
-    )
-    app.dialog.open()
+    from dialogs import showExportOptionsDialogAction
+    showExportOptionsDialogAction(app, targetPath, fmt)
 
 
 def applyCropAction(app, ratio):
@@ -136,41 +445,13 @@ def applyCropAction(app, ratio):
     app.dialog.dismiss()
 
     if ratio == "original":
-        app.processor.workingImage = app.processor.originalImage.copy()
+        app.processor.resetCrop(render=False)
         app.utils.logAction("Ritaglio resettato all'originale")
     else:
-        app.processor.cropFormat(ratio)
+        app.processor.cropFormat(ratio, render=False)
         app.utils.logAction(f"Applicato ritaglio ratio: {ratio:.2f}")
 
-    app.processor.applyProcessing()
-    refreshPreviewAction(app)
-
-
-def showSavePresetDialogAction(app):
-    # MOSTRA IL DIALOGO PER SALVARE UN NUOVO PRESET
-    if not app.processor.originalImage:
-        return
-
-    content = MDBoxLayout(
-        orientation="vertical",
-        spacing="12dp",
-        size_hint_y=None,
-        height="80dp"
-    )
-
-    app.presetField = MDTextField(hint_text="Nome preset (es. Vintage)")
-    content.add_widget(app.presetField)
-
-    app.dialog = MDDialog(
-        title="Salva Preset",
-        type="custom",
-        content_cls=content,
-        buttons=[
-            MDFlatButton(text="ANNULLA", on_release=lambda x: app.dialog.dismiss()),
-            MDRaisedButton(text="SALVA", on_release=lambda x: savePresetAction(app))
-        ]
-    )
-    app.dialog.open()
+    requestRenderAction(app)
 
 
 def savePresetAction(app):
@@ -188,9 +469,8 @@ def loadPresetAction(app, presetName):
     params = app.utils.loadPreset(presetName)
 
     if params:
-        app.processor.updateParamsBatch(params)
-        app.processor.applyProcessing()
-        refreshPreviewAction(app)
+        app.processor.updateParamsBatch(params, label=f"Preset: {presetName}")
+        requestRenderAction(app)
         app.manualMenu.syncSliders(app.processor.currentParams)
         app.utils.logAction(f"Preset caricato: {presetName}")
 
@@ -200,71 +480,92 @@ def deletePresetAction(app, presetName):
     app.utils.deletePreset(presetName)
     app.utils.logAction(f"Preset eliminato: {presetName}")
     app.dialog.dismiss()
-    showLoadPresetDialogAction(app)
-
 
-def showLogDialogAction(app):
-    # MOSTRA IL LOG DELLE AZIONI IN UN DIALOGO SCORRIBILE
-    logs = app.utils.getLogs() or "Nessuna azione registrata in questa sessione."
-
-    content = MDBoxLayout(orientation="vertical", size_hint_y=None, height="300dp", padding="12dp")
-    scroll = ScrollView(do_scroll_x=False)
-
-    label = MDLabel(text=logs, size_hint_y=None, halign="left", valign="top")
-    label.bind(texture_size=lambda inst, val: setattr(inst, "height", val[1]))
-    label.text_size = (400, None)
+    from dialogs import showLoadPresetDialogAction
+    showLoadPresetDialogAction(app)
 
-    scroll.add_widget(label)
-    content.add_widget(scroll)
 
-    app.dialog = MDDialog(
-        title="Cronologia Azioni",
-        type="custom",
-        content_cls=content,
-        buttons=[MDFlatButton(text="CHIUDI", on_release=lambda x: app.dialog.dismiss())]
-    )
-    app.dialog.open()
+def jumpToStateAction(app, index):
+    # SALTA A UNO STATO QUALSIASI DELLA CRONOLOGIA (GLI ALTRI STATI RESTANO DISPONIBILI PER UNDO/REDO)
+    app.dialog.dismiss()
+    if app.processor.jumpToState(index, render=False):
+        requestRenderAction(app)
+        app.manualMenu.syncSliders(app.processor.currentParams)
+        app.utils.logAction(f"Ripristinato stato: {app.processor.history.entries()[index]}")
 
 
 def undoAction(app):
     # ESEGUE UN UNDO E AGGIORNA UI E SLIDER
-    if app.processor.undo():
-        refreshPreviewAction(app)
+    if app.processor.undo(render=False):
+        requestRenderAction(app)
         app.manualMenu.syncSliders(app.processor.currentParams)
         app.utils.logAction("Undo")
 
 
 def redoAction(app):
     # ESEGUE UN REDO E AGGIORNA UI E SLIDER
-    if app.processor.redo():
-        refreshPreviewAction(app)
+    if app.processor.redo(render=False):
+        requestRenderAction(app)
         app.manualMenu.syncSliders(app.processor.currentParams)
         app.utils.logAction("Redo")
 
 
-def showLoadPresetDialogAction(app):
-    # MOSTRA LA LISTA DEI PRESET DISPONIBILI E PERMETTE DI CARICARLI
-    presets = app.utils.getPresetNames()
+def applyLutAction(app, name):
+    # APPLICA UNA LUT SALVATA COME LOOK (NONE LO RIMUOVE)
+    app.dialog.dismiss()
+    lut = app.utils.loadLut(name) if name else None
+    if name and lut is None:
+        app.utils.logAction(f"LUT non valida: {name}")
+        return
+
+    app.processor.setLook(name, lut)
+    if app.processor.originalImage:
+        requestRenderAction(app)
+    app.utils.logAction(f"LUT applicata: {name}" if name else "LUT rimossa")
+
 
-    if not presets:
-        app.utils.logAction("Nessun preset disponibile")
+def importLutAction(app):
+    # IMPORTA UN FILE .CUBE TRA LE LUT E LO APPLICA SUBITO
+    filePath = _fileChooser().open_file(title="Importa LUT", filters=[("LUT 3D", "*.cube")])
+    if not filePath:
         return
 
-    layout = MDBoxLayout(orientation="vertical", size_hint_y=None, height="300dp", padding="12dp")
-    scroll = ScrollView()
-    listView = MDList()
+    imported = app.utils.importLut(filePath[0])
+    if imported is None:
+        app.utils.logAction(f"Importazione LUT fallita: {os.path.basename(filePath[0])}")
+        return
 
-    for name in presets:
-        item = OneLineListItem(text=name, on_release=lambda x, n=name: loadPresetAction(app, n))
-        listView.add_widget(item)
+    app.dialog.dismiss()
+    app.processor.setLook(*imported)
+    if app.processor.originalImage:
+        requestRenderAction(app)
+    app.utils.logAction(f"LUT importata: {imported[0]}")
 
-    scroll.add_widget(listView)
-    layout.add_widget(scroll)
 
-    app.dialog = MDDialog(
-        title="Carica Preset",
-        type="custom",
-        content_cls=layout,
-        buttons=[MDFlatButton(text="CHIUDI", on_release=lambda x: app.dialog.dismiss())]
-    )
-    app.dialog.open()
+def exportLutAction(app):
+    # ESPORTA I COLORI CORRENTI (SATURAZIONE, CONTRASTO, LUMINOSITÀ, TEMPERATURA) COME FILE .CUBE
+    # IL CONTRASTO DIPENDE DALLA LUMINOSITÀ MEDIA: LA LUT È CALIBRATA SULL'IMMAGINE APERTA
+    processor = app.processor
+    if not processor.originalImage:
+        return
+
+    filePath = _fileChooser().save_file(title="Esporta LUT", filters=[("LUT 3D", "*.cube")])
+    if not filePath:
+        return
+
+    targetPath = filePath[0]
+    if not targetPath.lower().endswith(".cube"):
+        targetPath += ".cube"
+
+    params = processor.currentParams
+    mean = processor.luminanceMean(processor.getPreviewSource(), params["saturation"]) if params["contrast"] != 1.0 else 0
+    name = os.path.splitext(os.path.basename(targetPath))[0]
+
+    try:
+        writeCubeFile(targetPath, processor.colorLut(params, mean), name)
+    except Exception as e:
+        app.utils.logAction(f"Errore nell'esportazione LUT: {e}")
+        return
+
+    app.dialog.dismiss()
+    app.utils.logAction(f"LUT esportata: {os.path.basename(targetPath)}")
@@ -0,0 +1,257 @@
+"""
+ELABORAZIONE IN BLOCCO SENZA INTERFACCIA GRAFICA (NESSUN IMPORT DI KIVY)
+APPLICA UN PRESET O UN PROMPT A TUTTE LE IMMAGINI DI UNA CARTELLA (O DI UN GLOB)
+DISTRIBUENDO IL LAVORO SU UN POOL DI PROCESSI
+
+ESEMPI:
+    python batch.py foto/ --preset Vintage --output export/ --format jpg
+    python batch.py "foto/*.png" --prompt "più luminosa e più calda" --output export/
+"""
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import argparse
+import glob
+import math
+import os
+import sys
+import time
+
+from imagestats import computeStatistics
+from interpreter import NaturalLanguageInterpreter
+from processor import ImageEngine, EXPORT_FORMATS, PARAM_MIN, PARAM_MAX
+from utils import UtilsManager
+
+# ESTENSIONI RICONOSCIUTE QUANDO L'INGRESSO È UNA CARTELLA (LE STESSE DEL FILECHOOSER)
+INPUT_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tiff")
+
+# ENGINE E INTERPRETER RIUSATI DA TUTTE LE IMMAGINI ELABORATE DALLO STESSO PROCESSO DI LAVORO
+_workerEngine = None
+_workerInterpreter = None
+
+
+def _initWorker():
+    # INIZIALIZZA UNA SOLA VOLTA PER PROCESSO L'ENGINE DI ELABORAZIONE E L'INTERPRETER (REGEX COMPILATA)
+    global _workerEngine, _workerInterpreter
+    _workerEngine = ImageEngine()
+    _workerInterpreter = NaturalLanguageInterpreter()
+
+
+def processFile(path, params, targetPath, prompt=None):
+    """
+    CARICA, ELABORA A PIENA RISOLUZIONE E SALVA UNA SINGOLA IMMAGINE IN TARGETPATH
+    PROMPT (COMANDI AUTOMATICI) VIENE RISOLTO QUI, SULLE STATISTICHE DI QUESTA IMMAGINE, PARTENDO DA PARAMS
+    RESTITUISCE (PATH, FILE DI USCITA O NONE, ERRORE O NONE, SECONDI IMPIEGATI)
+    """
+    start = time.perf_counter()
+    engine = _workerEngine or ImageEngine()
+
+    try:
+        if not engine.loadImage(path, render=False, preview=False):
+            return path, None, "impossibile leggere l'immagine", time.perf_counter() - start
+
+        if prompt:
+            interpreter = _workerInterpreter or NaturalLanguageInterpreter()
+            changes, _ = interpreter.parsePrompt(
+                prompt, params, remember=False, statistics=lambda: computeStatistics(engine.workingImage)
+            )
+            params = dict(params, **changes)
+
+        engine.currentParams.update(params)
+
+        extension = os.path.splitext(targetPath)[1].lower()
+        engine.exportImage(engine.workingImage, engine.currentParams, None, targetPath, EXPORT_FORMATS[extension])
+        return path, targetPath, None, time.perf_counter() - start
+    except Exception as e:
+        return path, None, str(e), time.perf_counter() - start
+    finally:
+        # LIBERA I PIXEL PRIMA DELLA PROSSIMA IMMAGINE
+        engine.originalImage = engine.workingImage = engine.currentImage = engine.processedImage = None
+
+
+def listInputFiles(source, outputDir=None):
+    """
+    ELENCA (ORDINATI) I FILE DA ELABORARE: IMMAGINI DI UNA CARTELLA O RISULTATI DI UN GLOB
+    L'ELENCO È COMPLETO PRIMA DI INIZIARE: I FILE SCRITTI DURANTE IL BATCH NON VI ENTRANO MAI
+    SONO ESCLUSI I FILE GIÀ PRESENTI IN OUTPUTDIR E I TEMPORANEI NASCOSTI DELL'EXPORT (.NOME.PART.EXT)
+    """
+    if os.path.isdir(source):
+        with os.scandir(source) as entries:
+            paths = [entry.path for entry in entries
+                     if entry.is_file() and entry.name.lower().endswith(INPUT_EXTENSIONS)]
+    else:
+        paths = [path for path in glob.iglob(source) if os.path.isfile(path)]
+
+    outputDir = os.path.abspath(outputDir) if outputDir else None
+    return sorted(
+        path for path in paths
+        if not os.path.basename(path).startswith(".")
+        and (outputDir is None or os.path.dirname(os.path.abspath(path)) != outputDir)
+    )
+
+
+def planOutputs(files, outputDir, extension):
+    """
+    ASSOCIA A OGNI FILE IL SUO FILE DI USCITA (STESSO NOME, ESTENSIONE DEL FORMATO SCELTO)
+    RESTITUISCE (PIANO, CONFLITTI): PIANO È UNA LISTA DI (PATH, FILE DI USCITA); CONFLITTI UNA LISTA DI
+    (PATH, MOTIVO) PER I FILE IL CUI NOME DI USCITA È GIÀ USATO DA UN ALTRO INGRESSO O COINCIDE CON UN INGRESSO
+    (ES. "A.JPG" E "A.PNG" VERSO LO STESSO "A.PNG"): NON VENGONO ELABORATI INVECE DI SOVRASCRIVERSI
+    """
+    inputs = {os.path.normcase(os.path.abspath(path)) for path in files}
+    claimed = {}
+    plan, conflicts = [], []
+
+    for path in files:
+        baseName = os.path.splitext(os.path.basename(path))[0]
+        targetPath = os.path.join(outputDir, baseName + extension)
+        targetKey = os.path.normcase(os.path.abspath(targetPath))
+
+        if targetKey in inputs:
+            conflicts.append((path, f"il file di uscita {targetPath} sovrascriverebbe un'immagine di ingresso"))
+        elif targetKey in claimed:
+            conflicts.append((path, f"il file di uscita {targetPath} è già usato da {claimed[targetKey]}"))
+        else:
+            claimed[targetKey] = path
+            plan.append((path, targetPath))
+    return plan, conflicts
+
+
+def parseParamValue(key, value):
+    """
+    CONVERTE IL VALORE DI UN PARAMETRO ESPLICITO IN FLOAT
+    SOLLEVA VALUEERROR SE NON È NUMERICO, NON È FINITO (NAN, INF) O È FUORI DALL'INTERVALLO DEGLI SLIDER
+    """
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Il parametro {key} deve essere numerico: {value}")
+
+    if not math.isfinite(number) or not PARAM_MIN <= number <= PARAM_MAX:
+        raise ValueError(f"Il parametro {key} deve essere compreso tra {PARAM_MIN:g} e {PARAM_MAX:g}: {value}")
+    return number
+
+
+def resolveParams(presetName=None, prompt=None, presetFile=None, overrides=None,
+                  interpreter=None, utils=None, statistics=None):
+    """
+    CALCOLA I PARAMETRI DA APPLICARE A OGNI IMMAGINE PARTENDO DAI VALORI NEUTRI:
+    PRIMA IL PRESET, POI I PARAMETRI ESPLICITI (OVERRIDES), INFINE IL PROMPT
+    INTERPRETER E UTILS PERMETTONO DI RIUSARE ISTANZE GIÀ PRONTE (SERVER); STATISTICS È LA FUNZIONE
+    CHE FORNISCE LE STATISTICHE DELL'IMMAGINE AI COMANDI AUTOMATICI DEL PROMPT
+    SOLLEVA VALUEERROR SE IL PROMPT HA COMANDI AUTOMATICI MA MANCA STATISTICS (NON VERREBBERO APPLICATI)
+    """
+    params = ImageEngine()._defaultParams()
+
+    if presetName:
+        utils = utils or UtilsManager(presetFile or "presets.json")
+        preset = utils.loadPreset(presetName)
+        if preset is None:
+            raise ValueError(f"Preset non trovato: {presetName}")
+        params.update({key: value for key, value in preset.items() if key in params})
+
+    for key, value in (overrides or {}).items():
+        if key not in params:
+            raise ValueError(f"Parametro sconosciuto: {key}")
+        params[key] = parseParamValue(key, value)
+
+    if prompt:
+        interpreter = interpreter or NaturalLanguageInterpreter()
+        if statistics is None and interpreter.hasAutoCommand(prompt):
+            raise ValueError(f"Il prompt contiene comandi automatici: servono le statistiche dell'immagine ({prompt})")
+        changes, _ = interpreter.parsePrompt(prompt, params, remember=False, statistics=statistics)
+        params.update(changes)
+
+    return params
+
+
+def runBatch(files, params, outputDir, extension, workers=None, report=print, prompt=None):
+    """
+    ELABORA I FILE SU UN POOL DI PROCESSI MANTENENDO AL MASSIMO 2 * WORKERS IMMAGINI IN VOLO
+    (MEMORIA LIMITATA ANCHE CON MIGLIAIA DI FILE) E RIPORTA OGNI RISULTATO APPENA È PRONTO
+    PROMPT (COMANDI AUTOMATICI) VIENE RISOLTO DA OGNI PROCESSO SULLE STATISTICHE DELLA SINGOLA IMMAGINE
+    I FILE CON NOME DI USCITA IN CONFLITTO (VEDI PLANOUTPUTS) SONO CONTATI COME FALLITI E NON ELABORATI
+    RESTITUISCE (ELABORATE, FALLITE)
+    """
+    os.makedirs(outputDir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    maxInFlight = workers * 2
+
+    plan, conflicts = planOutputs(list(files), outputDir, extension)
+    for path, reason in conflicts:
+        report(f"ERRORE  {path}: {reason}")
+
+    done, failed = 0, len(conflicts)
+    files = iter(plan)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker) as executor:
+        pending = set()
+
+        while True:
+            # RIEMPIE LA FINESTRA DI LAVORO SENZA LEGGERE IN ANTICIPO TUTTO L'ELENCO
+            for path, targetPath in files:
+                pending.add(executor.submit(processFile, path, params, targetPath, prompt))
+                if len(pending) >= maxInFlight:
+                    break
+
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path, targetPath, error, elapsed = future.result()
+                if error:
+                    failed += 1
+                    report(f"ERRORE  {path}: {error} ({elapsed * 1000:.0f} ms)")
+                else:
+                    done += 1
+                    report(f"OK      {path} -> {targetPath} ({elapsed * 1000:.0f} ms)")
+
+    return done, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PromptVision: elaborazione in blocco senza interfaccia grafica")
+    parser.add_argument("input", help="cartella di immagini o pattern glob (es. 'foto/*.jpg')")
+
+    look = parser.add_mutually_exclusive_group(required=True)
+    look.add_argument("--preset", help="nome del preset da applicare")
+    look.add_argument("--prompt", help="comando in linguaggio naturale da applicare")
+
+    parser.add_argument("--output", required=True, help="cartella di destinazione")
+    parser.add_argument("--format", default="png", choices=sorted(ext.lstrip(".") for ext in EXPORT_FORMATS),
+                        help="formato di uscita (default: png)")
+    parser.add_argument("--workers", type=int, default=None, help="numero di processi (default: numero di CPU)")
+    parser.add_argument("--presets-file", default=None, help="file dei preset (default: presets.json)")
+    args = parser.parse_args(argv)
+
+    # UN PROMPT CON COMANDI AUTOMATICI ("CORREGGI L'ESPOSIZIONE") DÀ PARAMETRI DIVERSI PER OGNI IMMAGINE:
+    # NON SI RISOLVE QUI UNA VOLTA PER TUTTE MA NEI PROCESSI DI LAVORO, IMMAGINE PER IMMAGINE
+    interpreter = NaturalLanguageInterpreter()
+    autoPrompt = args.prompt if args.prompt and interpreter.hasAutoCommand(args.prompt) else None
+
+    try:
+        params = resolveParams(args.preset, None if autoPrompt else args.prompt, args.presets_file,
+                               interpreter=interpreter)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    # SCRIVERE NELLA CARTELLA DI INGRESSO SOVRASCRIVEREBBE GLI ORIGINALI DELLO STESSO FORMATO
+    if os.path.isdir(args.input) and os.path.isdir(args.output) and os.path.samefile(args.input, args.output):
+        print("La cartella di destinazione deve essere diversa da quella di ingresso", file=sys.stderr)
+        return 2
+
+    if autoPrompt:
+        print("Prompt automatico: parametri calcolati dalle statistiche di ogni immagine")
+
+    start = time.perf_counter()
+    files = listInputFiles(args.input, args.output)
+    if not files:
+        print("Nessuna immagine da elaborare (i file nella cartella di destinazione sono esclusi)", file=sys.stderr)
+    done, failed = runBatch(files, params, args.output, "." + args.format, args.workers, prompt=autoPrompt)
+    elapsed = time.perf_counter() - start
+
+    print(f"Completate: {done}, fallite: {failed}, tempo totale: {elapsed:.1f} s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
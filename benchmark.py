@@ -0,0 +1,376 @@
+"""
+BENCHMARK RIPRODUCIBILI DI ENGINE, INTERPRETE E ARCHIVIO PRESET (NESSUN IMPORT DI KIVY)
+LE IMMAGINI SONO SINTETICHE E DETERMINISTICHE (SEME FISSO): OGNI CASO REGISTRA I TEMPI E UN HASH
+DEL RISULTATO, COSÌ UN'OTTIMIZZAZIONE CHE CAMBIA I PIXEL VIENE SEGNALATA NEL CONFRONTO
+
+ESEMPI:
+    python benchmark.py --output base.json
+    python benchmark.py --sizes 1 12 --repeat 3 --output nuovo.json --compare base.json
+"""
+from io import BytesIO
+import argparse
+import hashlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import PIL
+from PIL import Image
+
+from interpreter import NaturalLanguageInterpreter
+from processor import ImageEngine, EXPORT_FORMATS, EXPORT_OPTIONS, TILE_SIZE
+from tracing import formatCacheStats
+from utils import UtilsManager
+
+# DIMENSIONI DELLE IMMAGINI SINTETICHE (MEGAPIXEL, FORMATO 3:2)
+DEFAULT_SIZES = (1, 4, 12, 24, 50)
+
+# SEME DEL RUMORE DELLE IMMAGINI SINTETICHE
+IMAGE_SEED = 1234
+
+# COMBINAZIONI DI PARAMETRI MISURATE (NOME -> VARIAZIONI RISPETTO AI VALORI NEUTRI)
+PARAM_COMBINATIONS = {
+    "neutral": {},
+    "brightness": {"brightness": 1.3},
+    "contrast": {"contrast": 1.4},
+    "saturation": {"saturation": 0.6},
+    "sharpness": {"sharpness": 1.8},
+    "warmth": {"warmth": 1.2},
+    "all": {"brightness": 1.1, "contrast": 1.2, "saturation": 1.3, "sharpness": 1.5, "warmth": 0.9}
+}
+
+# RAPPORTI DI RITAGLIO MISURATI
+CROP_RATIOS = {"1:1": 1.0, "16:9": 16 / 9, "4:5": 4 / 5}
+
+# CORPUS DI PROMPT PER L'INTERPRETE
+PROMPT_CORPUS = (
+    "più luminosa",
+    "molto più scura e meno satura",
+    "aumenta il contrasto, più calda",
+    "più nitida ma meno contrasto",
+    "bianco e nero",
+    "reset",
+    "un po' più fredda e più luminosa",
+    "tantissimo più saturo e più nitido",
+    "meno luminosa, meno calda e più contrasto",
+    "rendila vintage con colori caldi"
+)
+
+# RIPETIZIONI DEL CORPUS E NUMERO DI PRESET PER I CASI "IN SCALA"
+PARSE_ROUNDS = 2000
+PRESET_COUNT = 2000
+
+
+def syntheticImage(megapixels, seed=IMAGE_SEED):
+    """
+    GENERA UN'IMMAGINE RGB 3:2 DETERMINISTICA: GRADIENTI PIÙ RUMORE (DETTAGLIO PER LA NITIDEZZA)
+    """
+    width = int(round((megapixels * 1_000_000 * 1.5) ** 0.5))
+    height = int(round(width / 1.5))
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    noise = rng.integers(-24, 25, size=(height, width), dtype=np.int16)
+    pixels[..., 0] = np.clip(x + noise, 0, 255)
+    pixels[..., 1] = np.clip(y + noise, 0, 255)
+    pixels[..., 2] = np.clip((x + y) / 2 - noise, 0, 255)
+    return Image.fromarray(pixels, "RGB")
+
+
+def imageHash(image):
+    """
+    HASH DEI PIXEL (MODALITÀ, DIMENSIONI E CONTENUTO), INDIPENDENTE DAL FORMATO DEL FILE
+    """
+    if image is None:
+        return None
+    digest = hashlib.sha256(f"{image.mode}{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def dataHash(data):
+    if not isinstance(data, bytes):
+        data = json.dumps(data, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def measure(function, repeat, setup=None):
+    """
+    ESEGUE FUNCTION REPEAT VOLTE (SETUP ESCLUSO DAL TEMPO) E RESTITUISCE (STATISTICHE, ULTIMO RISULTATO)
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000.0)
+
+    stats = {
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "runs": repeat
+    }
+    return stats, result
+
+
+class BenchmarkSuite:
+    """
+    RACCOGLIE I CASI DI BENCHMARK: OGNI CASO HA UN NOME STABILE, I TEMPI E L'HASH DEL RISULTATO
+    """
+    def __init__(self, workDir, repeat=3, renderEngine="numpy", report=print):
+        self.workDir = workDir
+        self.repeat = repeat
+        self.renderEngine = renderEngine
+        self.report = report
+        self.results = {}
+
+        # STATISTICHE DELLE CACHE DELL'ENGINE ALLA FINE DI OGNI GRUPPO DI CASI (FUORI DAL CONFRONTO DEI TEMPI)
+        self.cacheStats = {}
+
+    def add(self, name, function, digest=None, setup=None, repeat=None):
+        # DIGEST(RISULTATO) CALCOLA L'HASH DELL'ULTIMA ESECUZIONE, FUORI DAL TEMPO MISURATO
+        stats, result = measure(function, repeat or self.repeat, setup)
+        stats["hash"] = digest(result) if digest else None
+        self.results[name] = stats
+        self.report(f"{name:<40} {stats['median_ms']:>10.2f} ms  (min {stats['min_ms']:.2f})")
+
+    def runEngine(self, megapixels):
+        """
+        CARICAMENTO, ELABORAZIONE (ANTEPRIMA E PIENA RISOLUZIONE), RITAGLIO, FILE TEMPORANEO ED EXPORT
+        """
+        prefix = f"engine.{megapixels}mp"
+        path = os.path.join(self.workDir, f"synthetic_{megapixels}mp.png")
+        syntheticImage(megapixels).save(path, "PNG", compress_level=1)
+
+        engine = ImageEngine()
+        engine.renderEngine = self.renderEngine
+        self.add(f"{prefix}.load", lambda: engine.loadImage(path, render=False),
+                 digest=lambda ok: imageHash(engine.originalImage))
+
+        defaults = engine._defaultParams()
+        for comboName, changes in PARAM_COMBINATIONS.items():
+            params = dict(defaults, **changes)
+
+            def setup(params=params):
+                # OGNI ESECUZIONE PARTE A FREDDO: NIENTE INTERMEDI IN CACHE
+                engine.stageCache.clear()
+                engine.currentParams = dict(params)
+
+            self.add(f"{prefix}.preview.{comboName}", lambda: engine.applyProcessing(pushState=False),
+                     digest=lambda _: imageHash(engine.processedImage), setup=setup)
+            self.add(f"{prefix}.full.{comboName}", engine.renderFullResolution,
+                     digest=imageHash, setup=setup)
+
+        for ratioName, ratio in CROP_RATIOS.items():
+            def setup():
+                engine.currentCrop = None
+
+            def crop(ratio=ratio):
+                engine.cropFormat(ratio, render=False)
+                return engine.renderFullResolution()
+
+            self.add(f"{prefix}.crop.{ratioName}", crop, digest=imageHash, setup=setup)
+        engine.currentCrop = None
+        engine.history.reset(engine.currentParams, engine.currentCrop)
+
+        # VIEWPORT AL 100%: REGIONE VISIBILE A FREDDO E PAN CHE ESPONE UNA COLONNA DI TILE (GLI ALTRI IN CACHE)
+        # IL DISPLAY È LIMITATO A METÀ IMMAGINE: ANCHE LE IMMAGINI PIÙ PICCOLE DEL DISPLAY DI DEFAULT
+        # HANNO UN VIEWPORT INGRANDITO (ALTRIMENTI IL 100% COINCIDEREBBE CON L'IMMAGINE INTERA)
+        engine.currentParams = dict(defaults, **PARAM_COMBINATIONS["all"])
+        displaySize = engine.displaySize
+        engine.displaySize = (min(displaySize[0], engine.workingImage.width // 2),
+                              min(displaySize[1], engine.workingImage.height // 2))
+
+        def viewport():
+            return engine.renderViewport(engine.getViewport(), engine.currentParams)
+
+        def coldSetup():
+            engine.setViewport(engine.actualSizeZoom(), (0.5, 0.5))
+            engine.tileCache.clear()
+
+        def panSetup():
+            coldSetup()
+            viewport()
+            engine.panViewport(-TILE_SIZE, 0)
+
+        self.add(f"{prefix}.viewport.100", viewport, digest=imageHash, setup=coldSetup)
+        self.add(f"{prefix}.viewport.pan", viewport, digest=imageHash, setup=panSetup)
+        engine.setViewport(1.0)
+        engine.displaySize = displaySize
+
+        # SAVETEMPRESULT SCRIVE IN ASSETS/ RELATIVO ALLA CARTELLA CORRENTE: LA SPOSTA NELLA CARTELLA DI LAVORO
+        engine.currentParams = dict(defaults, **PARAM_COMBINATIONS["all"])
+        engine.applyProcessing(pushState=False)
+        currentDir = os.getcwd()
+        os.chdir(self.workDir)
+        try:
+            self.add(f"{prefix}.saveTempResult", engine.saveTempResult,
+                     digest=lambda tempPath: imageHash(Image.open(tempPath)))
+        finally:
+            os.chdir(currentDir)
+
+        # EXPORT: RENDER A PIENA RISOLUZIONE + CODIFICA CON LE OPZIONI DI DEFAULT DELL'APP (IN MEMORIA)
+        for extension, fmt in EXPORT_FORMATS.items():
+            def export(fmt=fmt):
+                buffer = BytesIO()
+                engine.renderFullResolution().save(buffer, fmt, **EXPORT_OPTIONS.get(fmt, {}))
+                return buffer.getvalue()
+
+            self.add(f"{prefix}.export{extension}", export, digest=dataHash)
+
+        for cacheName, cache in (("stage", engine.stageCache), ("tile", engine.tileCache)):
+            stats = cache.stats()
+            self.cacheStats[f"{prefix}.{cacheName}"] = stats
+            self.report(formatCacheStats(f"{prefix}.cache.{cacheName}", stats))
+
+        os.remove(path)
+
+    def runInterpreter(self):
+        """
+        PARSING DEL CORPUS DI PROMPT, A FREDDO (INTERPRETE NUOVO) E RIPETUTO IN SCALA
+        """
+        defaults = ImageEngine()._defaultParams()
+
+        def parseCorpus(rounds):
+            interpreter = NaturalLanguageInterpreter()
+            params = dict(defaults)
+            outputs = []
+            for _ in range(rounds):
+                for prompt in PROMPT_CORPUS:
+                    changes, keys = interpreter.parsePrompt(prompt, params)
+                    outputs.append((sorted(changes.items()), sorted(keys)))
+            return outputs[:len(PROMPT_CORPUS)]
+
+        self.add("interpreter.parse.corpus", lambda: parseCorpus(1), digest=dataHash)
+        self.add(f"interpreter.parse.{PARSE_ROUNDS}x", lambda: parseCorpus(PARSE_ROUNDS), digest=dataHash)
+
+    def runPresets(self):
+        """
+        SALVATAGGIO, LETTURA, ELENCO E CANCELLAZIONE DI MIGLIAIA DI PRESET, CON SCRITTURA FINALE SU DISCO
+        """
+        defaults = ImageEngine()._defaultParams()
+        presets = {
+            f"Preset {index:05d}": {key: round(1.0 + (index % 17) / 20, 2) for key in defaults}
+            for index in range(PRESET_COUNT)
+        }
+        presetPath = os.path.join(self.workDir, "presets_benchmark.json")
+
+        def setup():
+            if os.path.exists(presetPath):
+                os.remove(presetPath)
+
+        def savePresets():
+            utils = UtilsManager(presetPath)
+            for name, params in presets.items():
+                utils.savePreset(name, params)
+            utils.flushPresets()
+            with open(presetPath, "rb") as file:
+                return file.read()
+
+        self.add(f"presets.save.{PRESET_COUNT}", savePresets, digest=dataHash, setup=setup)
+
+        utils = UtilsManager(presetPath)
+        self.add(f"presets.load.{PRESET_COUNT}", lambda: [utils.loadPreset(name) for name in presets],
+                 digest=dataHash)
+        self.add(f"presets.names.{PRESET_COUNT}", lambda: [utils.getPresetNames() for _ in range(100)][-1],
+                 digest=dataHash)
+
+        def deletePresets():
+            for name in presets:
+                utils.deletePreset(name)
+            utils.flushPresets()
+            return utils.getPresetNames()
+
+        self.add(f"presets.delete.{PRESET_COUNT}", deletePresets, digest=dataHash, repeat=1)
+
+
+def environmentInfo(engine):
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "renderEngine": engine
+    }
+
+
+def compareResults(baseline, current, report=print):
+    """
+    CONFRONTA DUE FILE DI RISULTATI: RAPPORTO DEI TEMPI MEDIANI E HASH DIVERSI
+    RESTITUISCE IL NUMERO DI CASI CON OUTPUT CAMBIATO
+    """
+    changed = 0
+    report(f"\n{'caso':<40} {'prima':>10} {'dopo':>10} {'rapporto':>9}")
+    for name, stats in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            report(f"{name:<40} {'-':>10} {stats['median_ms']:>10.2f}      nuovo")
+            continue
+
+        ratio = stats["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        marker = ""
+        if before["hash"] != stats["hash"]:
+            changed += 1
+            marker = "  OUTPUT DIVERSO"
+        report(f"{name:<40} {before['median_ms']:>10.2f} {stats['median_ms']:>10.2f} {ratio:>8.2f}x{marker}")
+
+    if changed:
+        report(f"\nATTENZIONE: {changed} casi producono un risultato diverso dal riferimento")
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PromptVision: benchmark di engine, interprete e preset")
+    parser.add_argument("--sizes", type=float, nargs="+", default=list(DEFAULT_SIZES),
+                        help="dimensioni delle immagini sintetiche in megapixel (default: 1 4 12 24 50)")
+    parser.add_argument("--repeat", type=int, default=3, help="ripetizioni per caso (default: 3)")
+    parser.add_argument("--engine", default="numpy", choices=("numpy", "lut", "pil"), help="motore di rendering")
+    parser.add_argument("--skip", nargs="*", default=[], choices=("engine", "interpreter", "presets"),
+                        help="gruppi di casi da non eseguire")
+    parser.add_argument("--output", default=None, help="file JSON dei risultati")
+    parser.add_argument("--compare", default=None, help="file JSON di riferimento da confrontare")
+    args = parser.parse_args(argv)
+
+    workDir = tempfile.mkdtemp(prefix="promptvision_bench_")
+    suite = BenchmarkSuite(workDir, repeat=args.repeat, renderEngine=args.engine)
+
+    try:
+        if "engine" not in args.skip:
+            for megapixels in args.sizes:
+                suite.runEngine(int(megapixels) if float(megapixels).is_integer() else megapixels)
+        if "interpreter" not in args.skip:
+            suite.runInterpreter()
+        if "presets" not in args.skip:
+            suite.runPresets()
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    current = {"environment": environmentInfo(args.engine), "repeat": args.repeat, "results": suite.results,
+               "caches": suite.cacheStats}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(current, file, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if compareResults(baseline, current):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
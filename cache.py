@@ -0,0 +1,99 @@
+from collections import OrderedDict
+import threading
+
+
+class LRUCache:
+    """
+    CACHE LRU THREAD-SAFE CON BUDGET DI MEMORIA
+    OGNI VALORE HA UN COSTO CALCOLATO DA SIZEOF (DI DEFAULT 1, CIOÈ UN LIMITE SUL NUMERO DI ENTRY):
+    QUANDO IL TOTALE SUPERA MAXSIZE VENGONO ELIMINATE LE ENTRY USATE MENO DI RECENTE
+    """
+    def __init__(self, maxSize, sizeOf=None):
+        # BUDGET MASSIMO (BYTE O NUMERO DI ENTRY, A SECONDA DI SIZEOF)
+        self.maxSize = maxSize
+        self.sizeOf = sizeOf or (lambda value: 1)
+
+        # CHIAVE -> (VALORE, COSTO), DALLA MENO ALLA PIÙ RECENTE
+        self._entries = OrderedDict()
+        self.currentSize = 0
+
+        # STATISTICHE DI UTILIZZO
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        RESTITUISCE IL VALORE ASSOCIATO ALLA CHIAVE E LO SEGNA COME USATO DI RECENTE
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        INSERISCE O SOSTITUISCE UN VALORE, POI LIBERA SPAZIO FINO A RIENTRARE NEL BUDGET
+        UN VALORE PIÙ GRANDE DELL'INTERO BUDGET NON VIENE MEMORIZZATO
+        """
+        size = self.sizeOf(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.currentSize -= previous[1]
+
+            if size > self.maxSize:
+                return
+
+            self._entries[key] = (value, size)
+            self.currentSize += size
+
+            while self.currentSize > self.maxSize:
+                _, (_, evictedSize) = self._entries.popitem(last=False)
+                self.currentSize -= evictedSize
+
+    def discard(self, key):
+        """
+        RIMUOVE UNA CHIAVE SE PRESENTE
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.currentSize -= entry[1]
+
+    def clear(self):
+        """
+        SVUOTA LA CACHE (LE STATISTICHE RESTANO)
+        """
+        with self._lock:
+            self._entries.clear()
+            self.currentSize = 0
+
+    def stats(self):
+        """
+        RESTITUISCE HIT, MISS, PERCENTUALE DI HIT, NUMERO DI ENTRY E OCCUPAZIONE CORRENTE
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "size": self.currentSize,
+                "maxSize": self.maxSize
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
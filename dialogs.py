@@ -0,0 +1,504 @@
+from kivymd.uix.boxlayout import MDBoxLayout
+from kivymd.uix.dialog import MDDialog
+from kivymd.uix.button import MDRaisedButton, MDFlatButton
+from kivymd.uix.textfield import MDTextField
+from kivymd.uix.list import OneLineListItem, MDList
+from kivymd.uix.label import MDLabel
+from kivy.uix.scrollview import ScrollView
+from kivy.graphics.texture import Texture
+from kivy.uix.image import Image
+from kivymd.uix.gridlayout import MDGridLayout
+from kivymd.uix.progressbar import MDProgressBar
+from kivymd.uix.slider import MDSlider
+from kivymd.uix.selectioncontrol import MDCheckbox
+from kivy.metrics import dp
+from kivy.properties import NumericProperty, StringProperty
+from functools import partial
+import os
+import threading
+import time
+
+# DIALOGHI DELL'INTERFACCIA: MODULO IMPORTATO SOLO ALL'APERTURA DEL PRIMO DIALOGO (VEDI MAIN.PY),
+# COSÌ I WIDGET KIVYMD CHE USANO NON PESANO SULL'AVVIO
+from actions import (
+    applyCropAction, applyLutAction, closeDocumentAction, exportLutAction, importLutAction,
+    jumpToStateAction, loadPresetAction, savePresetAction, switchDocumentAction
+)
+from processor import EXPORT_OPTIONS, EXPORT_OPTION_RANGES, EXPORT_RENDER_SHARE, TIFF_COMPRESSIONS, RenderCancelled
+from tracing import tracer
+
+# ETICHETTE DELLE OPZIONI DEGLI ENCODER NEL DIALOGO DI EXPORT
+EXPORT_OPTION_LABELS = {
+    "quality": "Qualità",
+    "progressive": "JPEG progressivo",
+    "optimize": "Ottimizza dimensione",
+    "method": "Metodo (0 veloce - 6 compatto)",
+    "compress_level": "Livello di compressione",
+    "compression": "Compressione"
+}
+
+# DIALOGHI COSTRUITI UNA SOLA VOLTA E RIAPERTI CON DATI AGGIORNATI: NOME -> MDDIALOG
+_dialogCache = {}
+
+
+class FilterableList(MDBoxLayout):
+    """
+    LISTA VIRTUALIZZATA CON FILTRO INCREMENTALE PER NOME (LAYOUT IN PROMPTVISION.KV)
+    IL RECYCLEVIEW CREA WIDGET SOLO PER LE RIGHE VISIBILI E LI RIUSA DURANTE LO SCORRIMENTO,
+    QUINDI APERTURA E SCROLL COSTANO LO STESSO CON DIECI O DIECIMILA ELEMENTI
+    """
+    hint_text = StringProperty("Filtra per nome")
+    viewclass = StringProperty("OneLineListItem")
+    row_height = NumericProperty(dp(48))
+
+    def __init__(self, onSelect=None, **kwargs):
+        super().__init__(**kwargs)
+        # CALLBACK(VALORE) AL TOCCO DI UNA RIGA; NONE = RIGHE DI SOLA LETTURA
+        self.onSelect = onSelect
+
+        # ELEMENTI (TESTO, VALORE), TESTI IN MINUSCOLO PER IL FILTRO E INDICI DELLE RIGHE CHE LO SUPERANO
+        self.items = []
+        self._keys = []
+        self._visible = []
+
+        # ULTIMO FILTRO APPLICATO (NONE = DA RICALCOLARE SU TUTTI GLI ELEMENTI)
+        self._query = None
+
+    def setItems(self, items):
+        """
+        IMPOSTA GLI ELEMENTI (TESTO, VALORE) E RIAPPLICA IL FILTRO CORRENTE; NESSUN LAVORO SE NON SONO CAMBIATI
+        """
+        if items == self.items:
+            return
+
+        self.items = items
+        self._keys = [text.lower() for text, _ in items]
+        self._query = None
+        self.applyFilter(self.ids.filterField.text)
+
+    def applyFilter(self, text):
+        """
+        MOSTRA SOLO LE RIGHE CHE CONTENGONO IL TESTO (SENZA DISTINZIONE DI MAIUSCOLE)
+        """
+        query = text.strip().lower()
+
+        # FILTRO INCREMENTALE: SE IL TESTO SI È SOLO ALLUNGATO, BASTA RIFILTRARE LE RIGHE GIÀ VISIBILI
+        if self._query is not None and query.startswith(self._query):
+            candidates = self._visible
+        else:
+            candidates = range(len(self.items))
+
+        self._visible = [index for index in candidates if query in self._keys[index]]
+        self._query = query
+        self.ids.rv.data = [self._rowData(index) for index in self._visible]
+
+    def _rowData(self, index):
+        # PROPRIETÀ ASSEGNATE AL WIDGET DI RIGA RICICLATO (ON_RELEASE SOSTITUISCE IL GESTORE DELL'EVENTO)
+        text, value = self.items[index]
+        if self.onSelect is None:
+            return {"text": text}
+        return {"text": text, "on_release": partial(self.onSelect, value)}
+
+
+def showDocumentsDialogAction(app):
+    # MOSTRA I DOCUMENTI APERTI (QUELLO ATTIVO È EVIDENZIATO) E L'OCCUPAZIONE DI MEMORIA
+    layout = MDBoxLayout(orientation="vertical", size_hint_y=None, height="300dp", padding="12dp")
+    scroll = ScrollView()
+    listView = MDList()
+
+    for processor in app.documents.documents:
+        if not processor.sourcePath:
+            continue
+        name = os.path.basename(processor.sourcePath)
+        if processor.isDraft and not processor.loadingPath:
+            name += " (solo anteprima)"
+        text = f"> {name}" if processor is app.processor else name
+        listView.add_widget(OneLineListItem(text=text, on_release=lambda x, p=processor: switchDocumentAction(app, p)))
+
+    scroll.add_widget(listView)
+    layout.add_widget(scroll)
+
+    usage = app.documents.memoryUsage() / (1024 * 1024)
+    budget = app.documents.memoryBudget / (1024 * 1024)
+    app.dialog = MDDialog(
+        title=f"Documenti aperti ({usage:.0f} / {budget:.0f} MB)",
+        type="custom",
+        content_cls=layout,
+        buttons=[
+            MDFlatButton(text="CHIUDI DOCUMENTO", on_release=lambda x: closeDocumentAction(app)),
+            MDFlatButton(text="CHIUDI", on_release=lambda x: app.dialog.dismiss())
+        ]
+    )
+    app.dialog.open()
+
+
+def showExportOptionsDialogAction(app, targetPath, fmt):
+    # MOSTRA LE OPZIONI DELL'ENCODER PER IL FORMATO SCELTO (RICORDATE PER LA SESSIONE), POI AVVIA L'EXPORT
+    options = app.exportOptions.setdefault(fmt, dict(EXPORT_OPTIONS.get(fmt, {})))
+
+    content = MDBoxLayout(orientation="vertical", adaptive_height=True, spacing="8dp", padding="12dp")
+
+    for key, value in options.items():
+        row = MDBoxLayout(orientation="horizontal", size_hint_y=None, height="48dp", spacing="8dp")
+        label = MDLabel(text=EXPORT_OPTION_LABELS.get(key, key))
+        row.add_widget(label)
+
+        if isinstance(value, bool):
+            checkbox = MDCheckbox(active=value, size_hint_x=None, width="48dp")
+            checkbox.bind(active=lambda inst, active, k=key: options.__setitem__(k, active))
+            row.add_widget(checkbox)
+        elif key in EXPORT_OPTION_RANGES:
+            low, high = EXPORT_OPTION_RANGES[key]
+            label.text = f"{EXPORT_OPTION_LABELS.get(key, key)}: {value}"
+            slider = MDSlider(min=low, max=high, step=1, value=value, hint=False)
+
+            def onSlide(inst, sliderValue, k=key, lbl=label):
+                options[k] = int(sliderValue)
+                lbl.text = f"{EXPORT_OPTION_LABELS.get(k, k)}: {int(sliderValue)}"
+
+            slider.bind(value=onSlide)
+            row.add_widget(slider)
+        elif key == "compression":
+            # PULSANTE A ROTAZIONE TRA LE COMPRESSIONI TIFF DISPONIBILI
+            button = MDFlatButton(text=value)
+
+            def cycle(inst, k=key):
+                index = TIFF_COMPRESSIONS.index(options[k]) if options[k] in TIFF_COMPRESSIONS else -1
+                options[k] = TIFF_COMPRESSIONS[(index + 1) % len(TIFF_COMPRESSIONS)]
+                inst.text = options[k]
+
+            button.bind(on_release=cycle)
+            row.add_widget(button)
+
+        content.add_widget(row)
+
+    def start(*args):
+        app.dialog.dismiss()
+        startExportAction(app, targetPath, fmt, dict(options))
+
+    app.dialog = MDDialog(
+        title=f"Esporta {fmt}",
+        type="custom",
+        content_cls=content,
+        buttons=[
+            MDFlatButton(text="ANNULLA", on_release=lambda x: app.dialog.dismiss()),
+            MDRaisedButton(text="ESPORTA", on_release=start)
+        ]
+    )
+    app.dialog.open()
+
+
+def startExportAction(app, targetPath, fmt, options):
+    # ESPORTA IN BACKGROUND A PIENA RISOLUZIONE (L'ANTEPRIMA È UN PROXY) CON BARRA DI AVANZAMENTO E ANNULLAMENTO
+    # IL JOB RICEVE UNA COPIA DELLO STATO: L'UTENTE PUÒ CONTINUARE A MODIFICARE DURANTE L'EXPORT
+    processor = app.processor
+    source = processor.workingImage
+    params = dict(processor.currentParams)
+    crop = processor.currentCrop
+    fileName = os.path.basename(targetPath)
+
+    cancelled = threading.Event()
+    progressBar = MDProgressBar(value=0, max=100)
+    statusLabel = MDLabel(text="Elaborazione a piena risoluzione...", halign="left")
+
+    content = MDBoxLayout(orientation="vertical", size_hint_y=None, height="96dp", spacing="16dp", padding="12dp")
+    content.add_widget(statusLabel)
+    content.add_widget(progressBar)
+
+    dialog = MDDialog(
+        title=f"Esportazione di {fileName}",
+        type="custom",
+        content_cls=content,
+        auto_dismiss=False,
+        buttons=[MDFlatButton(text="ANNULLA", on_release=lambda x: cancelled.set())]
+    )
+    dialog.open()
+
+    # ULTIMA PERCENTUALE INVIATA ALLA UI: UN AGGIORNAMENTO PER PUNTO PERCENTUALE, NON UNO PER BANDA
+    lastPercent = [-1]
+
+    def setProgress(percent):
+        progressBar.value = percent
+        if percent >= EXPORT_RENDER_SHARE * 100:
+            statusLabel.text = f"Codifica {fmt}..."
+
+    def progress(fraction):
+        # ESEGUITA SUL THREAD DI EXPORT
+        if cancelled.is_set():
+            raise RenderCancelled()
+        percent = int(fraction * 100)
+        if percent != lastPercent[0]:
+            lastPercent[0] = percent
+            app.renderer.dispatch(lambda: setProgress(percent))
+
+    def job():
+        start = time.perf_counter()
+        try:
+            processor.exportImage(source, params, crop, targetPath, fmt, options, progress)
+            return "ok", time.perf_counter() - start
+        except RenderCancelled:
+            return "cancelled", time.perf_counter() - start
+        except Exception as e:
+            return str(e), time.perf_counter() - start
+
+    def done(result):
+        status, elapsed = result
+        dialog.dismiss()
+        if status == "ok":
+            app.utils.logAction(f"Immagine esportata: {fileName} ({fmt}, {elapsed * 1000:.0f} ms)")
+        elif status == "cancelled":
+            app.utils.logAction(f"Export annullato: {fileName}")
+        else:
+            app.utils.logAction(f"Errore durante l'export di {fileName}: {status}")
+
+    app.exporter.submit(job, done, channel="export")
+
+
+def showCropMenuAction(app):
+    # MOSTRA IL DIALOGO PER SCEGLIERE IL FORMATO DI RITAGLIO
+    if not app.processor.originalImage:
+        return
+
+    layout = MDBoxLayout(orientation="vertical", size_hint_y=None, height="240dp")
+    scroll = ScrollView()
+    listView = MDList()
+
+    cropFormats = [
+        ("Originale (Reset)", "original"),
+        ("1:1 Quadrato", 1.0),
+        ("16:9 Panoramico", 16 / 9),
+        ("4:5 Ritratto", 4 / 5),
+        ("3:2 Classico", 3 / 2)
+    ]
+
+    for label, ratio in cropFormats:
+        item = OneLineListItem(
+            text=label,
+            on_release=lambda x, r=ratio: applyCropAction(app, r)
+        )
+        listView.add_widget(item)
+
+    scroll.add_widget(listView)
+    layout.add_widget(scroll)
+
+    app.dialog = MDDialog(
+        title="Scegli Formato Ritaglio",
+        type="custom",
+        content_cls=layout,
+        buttons=[MDFlatButton(text="ANNULLA", on_release=lambda x: app.dialog.dismiss())]
+    )
+    app.dialog.open()
+
+
+def showSavePresetDialogAction(app):
+    # MOSTRA IL DIALOGO PER SALVARE UN NUOVO PRESET
+    if not app.processor.originalImage:
+        return
+
+    content = MDBoxLayout(
+        orientation="vertical",
+        spacing="12dp",
+        size_hint_y=None,
+        height="80dp"
+    )
+
+    app.presetField = MDTextField(hint_text="Nome preset (es. Vintage)")
+    content.add_widget(app.presetField)
+
+    app.dialog = MDDialog(
+        title="Salva Preset",
+        type="custom",
+        content_cls=content,
+        buttons=[
+            MDFlatButton(text="ANNULLA", on_release=lambda x: app.dialog.dismiss()),
+            MDRaisedButton(text="SALVA", on_release=lambda x: savePresetAction(app))
+        ]
+    )
+    app.dialog.open()
+
+
+def showLogDialogAction(app):
+    # MOSTRA IL LOG DELLE AZIONI IN UNA LISTA VIRTUALIZZATA E FILTRABILE (UNA RIGA PER AZIONE)
+    entries = app.utils.getLogEntries() or ["Nessuna azione registrata in questa sessione."]
+
+    dialog = _dialogCache.get("log")
+    if dialog is None:
+        dialog = MDDialog(
+            title="Cronologia Azioni",
+            type="custom",
+            content_cls=FilterableList(hint_text="Filtra le azioni", viewclass="LogRow", row_height=dp(28)),
+            buttons=[
+                MDFlatButton(text="MODIFICHE", on_release=lambda x: showEditHistoryDialogAction(app)),
+                MDFlatButton(text="PRESTAZIONI", on_release=lambda x: showPerformanceDialogAction(app)),
+                MDFlatButton(text="CHIUDI", on_release=lambda x: app.dialog.dismiss())
+            ]
+        )
+        _dialogCache["log"] = dialog
+
+    dialog.content_cls.setItems([(entry, entry) for entry in entries])
+    app.dialog = dialog
+    dialog.open()
+
+
+def showEditHistoryDialogAction(app):
+    # MOSTRA GLI STATI DELLA CRONOLOGIA DI MODIFICA: UN TOCCO RIPORTA L'IMMAGINE A QUELLO STATO
+    if app.dialog:
+        app.dialog.dismiss()
+
+    history = app.processor.history
+    layout = MDBoxLayout(orientation="vertical", size_hint_y=None, height="300dp")
+    scroll = ScrollView()
+    listView = MDList()
+
+    # DAL PIÙ RECENTE AL PIÙ VECCHIO; LO STATO CORRENTE È EVIDENZIATO
+    labels = history.entries()
+    for index in range(len(labels) - 1, -1, -1):
+        text = f"> {labels[index]}" if index == history.position else labels[index]
+        item = OneLineListItem(text=text, on_release=lambda x, i=index: jumpToStateAction(app, i))
+        listView.add_widget(item)
+
+    scroll.add_widget(listView)
+    layout.add_widget(scroll)
+
+    app.dialog = MDDialog(
+        title="Cronologia Modifiche",
+        type="custom",
+        content_cls=layout,
+        buttons=[MDFlatButton(text="CHIUDI", on_release=lambda x: app.dialog.dismiss())]
+    )
+    app.dialog.open()
+
+
+def showPerformanceDialogAction(app):
+    # MOSTRA I TEMPI DELLE OPERAZIONI REGISTRATE NELLA SESSIONE (CONTEGGIO, P50, P95, MASSIMO)
+    if app.dialog:
+        app.dialog.dismiss()
+
+    summary = tracer.formatSummary() or "Nessuna operazione misurata in questa sessione."
+
+    content = MDBoxLayout(orientation="vertical", size_hint_y=None, height="300dp", padding="12dp")
+    scroll = ScrollView(do_scroll_x=False)
+
+    label = MDLabel(text=summary, size_hint_y=None, halign="left", valign="top")
+    label.bind(texture_size=lambda inst, val: setattr(inst, "height", val[1]))
+    label.text_size = (400, None)
+
+    scroll.add_widget(label)
+    content.add_widget(scroll)
+
+    app.dialog = MDDialog(
+        title="Prestazioni",
+        type="custom",
+        content_cls=content,
+        buttons=[MDFlatButton(text="CHIUDI", on_release=lambda x: app.dialog.dismiss())]
+    )
+    app.dialog.open()
+
+
+def showLoadPresetDialogAction(app):
+    # MOSTRA LA LISTA DEI PRESET DISPONIBILI E PERMETTE DI CARICARLI
+    presets = app.utils.getPresetNames()
+
+    if not presets:
+        app.utils.logAction("Nessun preset disponibile")
+        return
+
+    # IL DIALOGO È COSTRUITO UNA SOLA VOLTA; A OGNI APERTURA CAMBIANO SOLO I DATI DELLA LISTA
+    dialog = _dialogCache.get("presets")
+    if dialog is None:
+        dialog = MDDialog(
+            title="Carica Preset",
+            type="custom",
+            content_cls=FilterableList(
+                onSelect=lambda name: loadPresetAction(app, name), hint_text="Filtra i preset per nome"
+            ),
+            buttons=[
+                MDFlatButton(text="GALLERIA", on_release=lambda x: showPresetGalleryAction(app)),
+                MDFlatButton(text="CHIUDI", on_release=lambda x: app.dialog.dismiss())
+            ]
+        )
+        _dialogCache["presets"] = dialog
+
+    dialog.content_cls.setItems([(name, name) for name in presets])
+    app.dialog = dialog
+    dialog.open()
+
+
+def _textureFromImage(image):
+    # CREA UNA TEXTURE KIVY DAI PIXEL DI UN'IMMAGINE PIL (RGB)
+    texture = Texture.create(size=image.size, colorfmt="rgb")
+    texture.flip_vertical()
+    texture.blit_buffer(image.tobytes(), colorfmt="rgb", bufferfmt="ubyte")
+    return texture
+
+
+def showPresetGalleryAction(app):
+    # MOSTRA I PRESET COME MINIATURE DELL'IMMAGINE CORRENTE, RIEMPITE MAN MANO CHE IL POOL LE ELABORA
+    if app.dialog:
+        app.dialog.dismiss()
+
+    presets = {name: app.utils.loadPreset(name) for name in app.utils.getPresetNames()}
+    presets = {name: params for name, params in presets.items() if params}
+    if not presets or not app.processor.originalImage:
+        return
+
+    layout = MDBoxLayout(orientation="vertical", size_hint_y=None, height="400dp", padding="12dp")
+    scroll = ScrollView(do_scroll_x=False)
+    grid = MDGridLayout(cols=3, spacing="8dp", adaptive_height=True)
+
+    thumbnails = {}
+    for name in presets:
+        tile = MDBoxLayout(orientation="vertical", size_hint_y=None, height="150dp")
+        thumbnail = Image(allow_stretch=True, keep_ratio=True)
+        tile.add_widget(thumbnail)
+        tile.add_widget(MDFlatButton(text=name, on_release=lambda x, n=name: loadPresetAction(app, n)))
+        thumbnails[name] = thumbnail
+        grid.add_widget(tile)
+
+    scroll.add_widget(grid)
+    layout.add_widget(scroll)
+
+    def onThumbnail(name, image):
+        # ESEGUITA SUL THREAD PRINCIPALE PER OGNI MINIATURA PRONTA
+        if name in thumbnails:
+            thumbnails[name].texture = _textureFromImage(image)
+
+    app.dialog = MDDialog(
+        title="Galleria Preset",
+        type="custom",
+        content_cls=layout,
+        buttons=[MDFlatButton(text="CHIUDI", on_release=lambda x: app.dialog.dismiss())]
+    )
+    app.dialog.bind(on_dismiss=lambda x: app.presetGallery.cancel())
+    app.dialog.open()
+
+    # LE MINIATURE TORNANO SUL THREAD PRINCIPALE CON LO STESSO DISPATCHER DEL RENDER DI ANTEPRIMA
+    app.presetGallery.render(app.processor, presets, onThumbnail, dispatch=app.renderer.dispatch)
+
+
+def showLutDialogAction(app):
+    # MOSTRA LE LUT 3D SALVATE (UN TOCCO LE APPLICA COME LOOK) CON IMPORTAZIONE ED ESPORTAZIONE .CUBE
+    layout = MDBoxLayout(orientation="vertical", size_hint_y=None, height="300dp", padding="12dp")
+    scroll = ScrollView()
+    listView = MDList()
+
+    look = app.processor.currentLook
+    listView.add_widget(OneLineListItem(text="Nessun LUT", on_release=lambda x: applyLutAction(app, None)))
+    for name in app.utils.getLutNames():
+        text = f"> {name}" if look and look[0] == name else name
+        listView.add_widget(OneLineListItem(text=text, on_release=lambda x, n=name: applyLutAction(app, n)))
+
+    scroll.add_widget(listView)
+    layout.add_widget(scroll)
+
+    app.dialog = MDDialog(
+        title="LUT 3D",
+        type="custom",
+        content_cls=layout,
+        buttons=[
+            MDFlatButton(text="IMPORTA", on_release=lambda x: importLutAction(app)),
+            MDFlatButton(text="ESPORTA", on_release=lambda x: exportLutAction(app)),
+            MDFlatButton(text="CHIUDI", on_release=lambda x: app.dialog.dismiss())
+        ]
+    )
+    app.dialog.open()
@@ -0,0 +1,131 @@
+# MEMORIA MASSIMA DEI PIXEL DI TUTTI I DOCUMENTI APERTI (BYTE); OLTRE, I DOCUMENTI INATTIVI VENGONO SCARICATI
+DOCUMENT_MEMORY_BUDGET = 1536 * 1024 * 1024
+
+
+class DocumentManager:
+    """
+    GESTISCE PIÙ IMMAGINI APERTE, OGNUNA CON IL SUO IMAGEENGINE (PARAMETRI, RITAGLIO, CRONOLOGIA, PROXY)
+    TIENE IL CONTO DEI BYTE OCCUPATI DA TUTTI GLI ENGINE: SOPRA IL BUDGET LIBERA LA PIENA RISOLUZIONE
+    DEI DOCUMENTI INATTIVI USATI MENO DI RECENTE, CHE RESTANO VISIBILI E MODIFICABILI SUI LORO PROXY
+    IL PRIMO ENGINE (E CON LUI NUMPY E LA PIPELINE DI ELABORAZIONE) VIENE CREATO SOLO QUANDO SERVE
+    """
+    def __init__(self, memoryBudget=DOCUMENT_MEMORY_BUDGET):
+        self.memoryBudget = memoryBudget
+
+        # DOCUMENTI NELL'ORDINE DI APERTURA E DOCUMENTO ATTIVO (NONE FINCHÉ NON SERVE UN ENGINE)
+        self.documents = []
+        self._active = None
+
+        # AREA DI ANTEPRIMA E MOTORE DI RENDERING DA DARE AGLI ENGINE CREATI SENZA UN DOCUMENTO ATTIVO
+        self.displaySize = None
+        self.renderEngine = None
+
+        # ULTIMO UTILIZZO DI OGNI DOCUMENTO (CONTATORE MONOTONO), PER SCEGLIERE COSA SCARICARE
+        self._lastUsed = {}
+        self._clock = 0
+
+    @property
+    def active(self):
+        """
+        ENGINE DEL DOCUMENTO ATTIVO; IL PRIMO ACCESSO CREA UN DOCUMENTO VUOTO
+        """
+        if self._active is None:
+            engine = self._newEngine()
+            self.documents.append(engine)
+            self.activate(engine)
+        return self._active
+
+    @property
+    def started(self):
+        # TRUE SE ESISTE GIÀ UN ENGINE (SENZA CREARLO)
+        return self._active is not None
+
+    def open(self, path):
+        """
+        RESTITUISCE (ENGINE, NUOVO) PER IL FILE INDICATO E LO RENDE ATTIVO
+        UN FILE GIÀ APERTO NON VIENE RICARICATO; UN DOCUMENTO ATTIVO ANCORA VUOTO VIENE RIUSATO
+        """
+        for engine in self.documents:
+            if engine.sourcePath == path:
+                return self.activate(engine), False
+
+        if self.active.sourcePath is None:
+            return self.active, True
+
+        engine = self._newEngine()
+        self.documents.append(engine)
+        return self.activate(engine), True
+
+    def activate(self, engine):
+        """
+        RENDE ATTIVO UN DOCUMENTO APERTO E LO RESTITUISCE
+        """
+        self._clock += 1
+        self._lastUsed[id(engine)] = self._clock
+        self._active = engine
+        return engine
+
+    def close(self, engine):
+        """
+        CHIUDE UN DOCUMENTO; SE ERA ATTIVO DIVENTA ATTIVO QUELLO USATO PIÙ DI RECENTE (O UNO NUOVO VUOTO)
+        RESTITUISCE IL DOCUMENTO ATTIVO
+        """
+        if engine in self.documents:
+            self.documents.remove(engine)
+            self._lastUsed.pop(id(engine), None)
+
+        if not self.documents:
+            # IL DOCUMENTO VUOTO CHE LO SOSTITUISCE EREDITA AREA DI ANTEPRIMA E MOTORE
+            self.displaySize, self.renderEngine = engine.displaySize, engine.renderEngine
+            self._active = None
+            return self.active
+
+        if self._active is engine or self._active not in self.documents:
+            return self.activate(max(self.documents, key=lambda item: self._lastUsed.get(id(item), 0)))
+        return self._active
+
+    def memoryUsage(self):
+        """
+        BYTE DI PIXEL OCCUPATI DA TUTTI I DOCUMENTI
+        """
+        return sum(engine.memoryBytes() for engine in self.documents)
+
+    def enforceBudget(self):
+        """
+        SE IL TOTALE SUPERA IL BUDGET, SCARICA LA PIENA RISOLUZIONE E LA CACHE DEGLI STADI
+        DEI DOCUMENTI INATTIVI, DAL MENO RECENTE; RESTITUISCE I BYTE LIBERATI
+        """
+        usage = self.memoryUsage()
+        freed = 0
+        inactive = sorted(
+            (engine for engine in self.documents if engine is not self._active),
+            key=lambda item: self._lastUsed.get(id(item), 0)
+        )
+
+        for engine in inactive:
+            if usage - freed <= self.memoryBudget:
+                break
+            released = engine.stageCache.currentSize
+            engine.stageCache.clear()
+            released += engine.releaseFullResolution()
+            freed += released
+        return freed
+
+    def __len__(self):
+        return len(self.documents)
+
+    # --- METODI PRIVATI ---
+
+    def _newEngine(self):
+        # IL NUOVO DOCUMENTO EREDITA AREA DI ANTEPRIMA E MOTORE DI RENDERING DA QUELLO ATTIVO (O DALLA UI)
+        from processor import ImageEngine
+
+        engine = ImageEngine()
+        template = self._active
+        displaySize = template.displaySize if template is not None else self.displaySize
+        renderEngine = template.renderEngine if template is not None else self.renderEngine
+        if displaySize:
+            engine.displaySize = displaySize
+        if renderEngine:
+            engine.renderEngine = renderEngine
+        return engine
@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from cache import LRUCache
+from tracing import tracer
+
+# LATO LUNGO DELLE MINIATURE DEI PRESET (PIXEL)
+THUMBNAIL_SIDE = 160
+
+# NUMERO MASSIMO DI MINIATURE TENUTE IN CACHE
+THUMBNAIL_CACHE_ENTRIES = 1024
+
+
+def presetHash(params):
+    # IMPRONTA DEI PARAMETRI DI UN PRESET: CAMBIA SE IL PRESET VIENE MODIFICATO
+    return hash(tuple(sorted(params.items())))
+
+
+class PresetGallery:
+    """
+    GENERA LE MINIATURE DEI PRESET APPLICATI ALL'IMMAGINE CORRENTE
+    OGNI PRESET VIENE ELABORATO SU UNA COPIA MINUSCOLA DEL PROXY, IN PARALLELO SU UN POOL DI THREAD;
+    I RISULTATI SONO IN CACHE PER IMMAGINE, RITAGLIO, LOOK, MOTORE E IMPRONTA DEL PRESET
+    """
+    def __init__(self, maxWorkers=None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=maxWorkers or min(4, os.cpu_count() or 1),
+            thread_name_prefix="PresetGallery"
+        )
+        self.cache = LRUCache(THUMBNAIL_CACHE_ENTRIES)
+        tracer.watchCache("thumbnail", self.cache)
+
+        # SORGENTE RIDOTTA DELL'ULTIMA IMMAGINE USATA: (CHIAVE IMMAGINE, MINIATURA)
+        self._source = (None, None)
+
+        # RENDER ANCORA IN CODA DELL'ULTIMA RICHIESTA
+        self._futures = []
+
+        # GENERAZIONE DELL'ULTIMA RICHIESTA: CAMBIA A OGNI RENDER O CANCEL, COSÌ LE MINIATURE DI RENDER
+        # GIÀ IN ESECUZIONE (NON ANNULLABILI) NON ARRIVANO AI WIDGET DI UN DIALOGO CHIUSO O RICOSTRUITO
+        self._generation = 0
+
+    def render(self, engine, presets, onThumbnail, dispatch):
+        """
+        ELABORA LE MINIATURE DI TUTTI I PRESET (NOME -> PARAMETRI) SULL'IMMAGINE DELL'ENGINE
+        ONTHUMBNAIL(NOME, IMMAGINE) VIENE CHIAMATA SUL THREAD PRINCIPALE TRAMITE DISPATCH
+        MAN MANO CHE LE MINIATURE SONO PRONTE (SUBITO PER QUELLE IN CACHE)
+        """
+        self.cancel()
+        generation = self._generation
+
+        imageKey = (id(engine), engine.imageVersion, engine.currentCrop)
+        source = self._thumbnailSource(engine, imageKey)
+
+        # LE MINIATURE DIPENDONO ANCHE DAL LOOK ATTIVO E DAL MOTORE DI RENDER (NON SOLO DALL'IMMAGINE):
+        # LETTI QUI UNA VOLTA E PASSATI AI RENDER, CHE NON RILEGGONO LO STATO DELL'ENGINE
+        look = engine.currentLook
+        renderEngine = engine.renderEngine
+        renderKey = (imageKey, renderEngine, (look[0], engine._lookVersion) if look is not None else None)
+        defaults = engine._defaultParams()
+
+        for name, params in presets.items():
+            key = (renderKey, presetHash(params))
+            cached = self.cache.get(key)
+            if cached is not None:
+                onThumbnail(name, cached)
+                continue
+
+            fullParams = dict(defaults)
+            fullParams.update({param: value for param, value in params.items() if param in defaults})
+
+            future = self.executor.submit(self._renderOne, engine, source, fullParams, renderEngine, look, key)
+            future.add_done_callback(
+                lambda done, presetName=name: self._deliver(done, presetName, onThumbnail, dispatch, generation)
+            )
+            self._futures.append(future)
+
+    def cancel(self):
+        """
+        ANNULLA LE MINIATURE ANCORA IN CODA (ES. ALLA CHIUSURA DEL DIALOGO)
+        QUELLE GIÀ IN ELABORAZIONE FINISCONO IN CACHE MA NON VENGONO PIÙ CONSEGNATE
+        """
+        self._generation += 1
+        for future in self._futures:
+            future.cancel()
+        self._futures = []
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+    # --- METODI PRIVATI ---
+
+    def _thumbnailSource(self, engine, imageKey):
+        # RIDUCE UNA SOLA VOLTA IL PROXY PIÙ PICCOLO DELLA PIRAMIDE ALLA DIMENSIONE DELLE MINIATURE
+        if self._source[0] != imageKey:
+            source = engine.getPreviewSource(maxSide=THUMBNAIL_SIDE).copy()
+            source.thumbnail((THUMBNAIL_SIDE, THUMBNAIL_SIDE))
+            self._source = (imageKey, source)
+        return self._source[1]
+
+    def _renderOne(self, engine, source, params, renderEngine, look, key):
+        # ESEGUITO NEL POOL: RENDER SENZA STATO (L'IMMAGINE NON APPARTIENE ALLA PIRAMIDE, NESSUNA CACHE DEGLI STADI)
+        # CON MOTORE E LOOK DELLA RICHIESTA, COERENTI CON LA CHIAVE DI CACHE
+        image = engine.renderWith(source, params, renderEngine, look)
+        self.cache.put(key, image)
+        return image
+
+    def _deliver(self, future, name, onThumbnail, dispatch, generation):
+        if future.cancelled() or future.exception() is not None or generation != self._generation:
+            return
+        image = future.result()
+
+        # RICONTROLLATA SUL THREAD PRINCIPALE: IL DIALOGO PUÒ ESSERE CHIUSO PRIMA CHE LA CONSEGNA VENGA ESEGUITA
+        def deliver():
+            if generation == self._generation:
+                onThumbnail(name, image)
+        dispatch(deliver)
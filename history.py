@@ -0,0 +1,195 @@
+from array import array
+import math
+import time
+
+# NUMERO MASSIMO DI STATI CONSERVATI NELLA CRONOLOGIA (I PIÙ VECCHI VENGONO SOVRASCRITTI)
+HISTORY_LIMIT = 500
+
+# MODIFICHE CONSECUTIVE DELLO STESSO CONTROLLO ENTRO QUESTO INTERVALLO DIVENTANO UN SOLO PASSO (SECONDI)
+# UN GESTO CONCLUSO (ENDCOALESCING, ES. RILASCIO DELLO SLIDER) CHIUDE IL PASSO ANCHE PRIMA
+HISTORY_COALESCE_WINDOW = 1.0
+
+
+class EditHistory:
+    """
+    CRONOLOGIA LINEARE DEGLI STATI DI MODIFICA (PARAMETRI E RITAGLIO) CON CURSORE SULLO STATO CORRENTE
+    OGNI STATO È UN RECORD A LAYOUT FISSO DI DOUBLE (ISTANTE, PARAMETRI NELL'ORDINE DI FIELDS, RITAGLIO)
+    IN UN UNICO ARRAY CIRCOLARE PREALLOCATO: MEMORIA COSTANTE, UNDO/REDO E SALTI A QUALSIASI PUNTO IN O(1)
+    """
+    def __init__(self, fields, capacity=HISTORY_LIMIT, coalesceWindow=HISTORY_COALESCE_WINDOW):
+        # NOMI DEI PARAMETRI, NELL'ORDINE IN CUI COMPAIONO NEL RECORD
+        self.fields = tuple(fields)
+        self.capacity = max(2, capacity)
+        self.coalesceWindow = coalesceWindow
+
+        # RECORD: [ISTANTE, PARAMETRI..., LEFT, TOP, RIGHT, BOTTOM] (LEFT = NAN SE NESSUN RITAGLIO)
+        self.recordSize = 1 + len(self.fields) + 4
+        self._data = array("d", bytes(8 * self.recordSize * self.capacity))
+
+        # DESCRIZIONE E CHIAVE DI ACCORPAMENTO DI OGNI STATO (STESSA POSIZIONE DEL RECORD)
+        self._labels = [None] * self.capacity
+        self._keys = [None] * self.capacity
+
+        # SLOT FISICO DEL PRIMO STATO, NUMERO DI STATI E INDICE LOGICO DELLO STATO CORRENTE
+        self._start = 0
+        self._count = 0
+        self.position = -1
+
+    def reset(self, params, crop, label="Apertura"):
+        """
+        SVUOTA LA CRONOLOGIA E REGISTRA LO STATO INIZIALE
+        """
+        self._start = 0
+        self._count = 0
+        self.position = -1
+        self.record(params, crop, label)
+
+    def record(self, params, crop, label, coalesceKey=None):
+        """
+        REGISTRA LO STATO RISULTANTE DA UN'AZIONE UTENTE; GLI STATI ANNULLATI (REDO) VENGONO SCARTATI
+        CON UNA COALESCEKEY UGUALE A QUELLA DELL'ULTIMO STATO, REGISTRATO DA MENO DI COALESCEWINDOW,
+        LO STATO SOSTITUISCE L'ULTIMO INVECE DI AGGIUNGERNE UNO (ES. PIÙ RITOCCHI DELLO STESSO SLIDER)
+        """
+        now = time.monotonic()
+        atEnd = self.position == self._count - 1
+
+        if (coalesceKey is not None and atEnd and self.position > 0
+                and self._keys[self._slot(self.position)] == coalesceKey
+                and now - self._data[self._slot(self.position) * self.recordSize] <= self.coalesceWindow):
+            self._write(self._slot(self.position), now, params, crop, label, coalesceKey)
+            return
+
+        # UN NUOVO RAMO CANCELLA GLI STATI SUCCESSIVI AL CURSORE
+        self._count = self.position + 1
+
+        if self._count == self.capacity:
+            # PIENO: LO STATO PIÙ VECCHIO ESCE DAL BUFFER
+            self._start = (self._start + 1) % self.capacity
+            self._count -= 1
+
+        self._count += 1
+        self.position = self._count - 1
+        self._write(self._slot(self.position), now, params, crop, label, coalesceKey)
+
+    def endCoalescing(self):
+        """
+        CHIUDE IL PASSO CORRENTE: LA PROSSIMA MODIFICA NE APRE UNO NUOVO ANCHE CON LA STESSA COALESCEKEY
+        """
+        if self._count:
+            self._keys[self._slot(self.position)] = None
+
+    def undo(self):
+        """
+        RESTITUISCE LO STATO PRECEDENTE (PARAMETRI, RITAGLIO) O NONE
+        """
+        if not self.canUndo:
+            return None
+        return self.jump(self.position - 1)
+
+    def redo(self):
+        """
+        RESTITUISCE LO STATO SUCCESSIVO (PARAMETRI, RITAGLIO) O NONE
+        """
+        if not self.canRedo:
+            return None
+        return self.jump(self.position + 1)
+
+    def jump(self, index):
+        """
+        SPOSTA IL CURSORE SULLO STATO INDICATO (0 = PIÙ VECCHIO) E LO RESTITUISCE, SENZA PERDERE GLI ALTRI
+        """
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+
+        self.position = index
+        return self._read(self._slot(index))
+
+    def entries(self):
+        """
+        DESCRIZIONI DEGLI STATI DAL PIÙ VECCHIO AL PIÙ RECENTE
+        """
+        return [self._labels[self._slot(index)] for index in range(self._count)]
+
+    def snapshot(self):
+        """
+        STATO COMPLETO PER IL SALVATAGGIO DI SESSIONE: CAMPI, RECORD IN ORDINE LOGICO (BYTE DELL'ARRAY),
+        DESCRIZIONI E CURSORE. LE CHIAVI DI ACCORPAMENTO NON VENGONO CONSERVATE
+        """
+        records = array("d")
+        for index in range(self._count):
+            offset = self._slot(index) * self.recordSize
+            records.extend(self._data[offset:offset + self.recordSize])
+
+        return {
+            "fields": list(self.fields),
+            "records": records.tobytes(),
+            "labels": self.entries(),
+            "position": self.position
+        }
+
+    def restore(self, snapshot):
+        """
+        SOSTITUISCE LA CRONOLOGIA CON UNA SALVATA DA SNAPSHOT E RESTITUISCE LO STATO CORRENTE
+        SE LA CAPACITÀ È MINORE DEGLI STATI SALVATI SI TENGONO I PIÙ RECENTI
+        SOLLEVA VALUEERROR SE I CAMPI NON CORRISPONDONO O I DATI NON SONO COERENTI
+        """
+        if tuple(snapshot["fields"]) != self.fields:
+            raise ValueError("cronologia salvata con parametri diversi")
+
+        records = array("d")
+        records.frombytes(snapshot["records"])
+        count = len(records) // self.recordSize
+        labels = list(snapshot["labels"])
+        position = snapshot["position"]
+        if count == 0 or len(records) != count * self.recordSize or len(labels) != count or not 0 <= position < count:
+            raise ValueError("cronologia salvata non valida")
+
+        # STATI IN ECCESSO: ESCONO I PIÙ VECCHI, COME SE IL BUFFER SI FOSSE RIEMPITO
+        skipped = max(0, count - self.capacity)
+        count -= skipped
+        self._data[:count * self.recordSize] = records[skipped * self.recordSize:]
+        self._labels[:count] = labels[skipped:]
+        self._keys = [None] * self.capacity
+
+        self._start = 0
+        self._count = count
+        return self.jump(max(0, position - skipped))
+
+    @property
+    def canUndo(self):
+        return self.position > 0
+
+    @property
+    def canRedo(self):
+        return self.position < self._count - 1
+
+    def __len__(self):
+        return self._count
+
+    # --- METODI PRIVATI ---
+
+    def _slot(self, index):
+        # SLOT FISICO DELLO STATO CON INDICE LOGICO INDEX
+        return (self._start + index) % self.capacity
+
+    def _write(self, slot, timestamp, params, crop, label, coalesceKey):
+        offset = slot * self.recordSize
+        data = self._data
+        data[offset] = timestamp
+        for index, field in enumerate(self.fields, start=offset + 1):
+            data[index] = params[field]
+
+        cropOffset = offset + 1 + len(self.fields)
+        data[cropOffset:cropOffset + 4] = array("d", crop if crop is not None else (math.nan, 0.0, 0.0, 0.0))
+
+        self._labels[slot] = label
+        self._keys[slot] = coalesceKey
+
+    def _read(self, slot):
+        offset = slot * self.recordSize
+        data = self._data
+        params = {field: data[offset + 1 + index] for index, field in enumerate(self.fields)}
+
+        cropOffset = offset + 1 + len(self.fields)
+        crop = tuple(data[cropOffset:cropOffset + 4])
+        return params, (None if math.isnan(crop[0]) else crop)
@@ -0,0 +1,170 @@
+from cache import LRUCache
+from renderer import RenderScheduler
+from tracing import tracer
+
+# LATO LUNGO MASSIMO DEL PROXY SU CUI SI CALCOLANO LE STATISTICHE (PIXEL)
+STATS_SIDE = 256
+
+# NUMERO MASSIMO DI STATISTICHE TENUTE IN CACHE (UNA PER IMMAGINE E RITAGLIO)
+STATS_CACHE_ENTRIES = 64
+
+# SOGLIE DI CLIPPING: LIVELLI CONSIDERATI OMBRE CHIUSE E LUCI BRUCIATE
+CLIP_SHADOW_LEVEL = 2
+CLIP_HIGHLIGHT_LEVEL = 253
+
+# OBIETTIVI DEI COMANDI AUTOMATICI: LUMINANZA MEDIA E AMPIEZZA TRA IL PERCENTILE 1 E 99
+AUTO_TARGET_MEAN = 118.0
+AUTO_TARGET_RANGE = 215.0
+
+# INTERVALLI ENTRO CUI RESTANO I PARAMETRI CALCOLATI DAI COMANDI AUTOMATICI
+AUTO_LIMITS = {
+    "brightness": (0.5, 2.0),
+    "contrast": (0.7, 1.6),
+    "warmth": (0.7, 1.3)
+}
+
+
+def _percentile(histogram, total, percent):
+    # PRIMO LIVELLO IN CUI L'ISTOGRAMMA CUMULATIVO RAGGIUNGE LA PERCENTUALE INDICATA
+    threshold = total * percent / 100.0
+    cumulative = 0
+    for level, count in enumerate(histogram):
+        cumulative += count
+        if cumulative >= threshold:
+            return level
+    return 255
+
+
+def _mean(histogram, total):
+    return sum(level * count for level, count in enumerate(histogram)) / total
+
+
+def computeStatistics(image):
+    """
+    STATISTICHE DI UN'IMMAGINE RGB SU UNA COPIA RIDOTTA A STATS_SIDE: ISTOGRAMMI (R, G, B, LUMINANZA),
+    MEDIE, PERCENTILI DELLA LUMINANZA, PERCENTUALI DI CLIPPING E STIMA DEL BILANCIAMENTO DEL BIANCO
+    """
+    with tracer.span("stats", size=image.size):
+        factor = max(image.size) // STATS_SIDE
+        if factor > 1:
+            image = image.reduce(factor)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        total = image.size[0] * image.size[1]
+        channels = image.histogram()
+        histograms = {
+            "r": channels[0:256],
+            "g": channels[256:512],
+            "b": channels[512:768],
+            "l": image.convert("L").histogram()
+        }
+        means = {name: _mean(values, total) for name, values in histograms.items()}
+        luminance = histograms["l"]
+
+        # GRAY WORLD: IN UNA SCENA NEUTRA LE MEDIE DEI CANALI COINCIDONO
+        return {
+            "size": image.size,
+            "histograms": histograms,
+            "mean": means,
+            "percentiles": {percent: _percentile(luminance, total, percent) for percent in (1, 50, 99)},
+            "clipping": {
+                "shadows": 100.0 * sum(luminance[:CLIP_SHADOW_LEVEL + 1]) / total,
+                "highlights": 100.0 * sum(luminance[CLIP_HIGHLIGHT_LEVEL:]) / total
+            },
+            "whiteBalance": {
+                "redBlue": means["r"] / max(means["b"], 1.0),
+                "greenMagenta": means["g"] / max((means["r"] + means["b"]) / 2.0, 1.0)
+            }
+        }
+
+
+def suggestParams(stats, names=tuple(AUTO_LIMITS)):
+    """
+    PARAMETRI CHE CORREGGONO ESPOSIZIONE, CONTRASTO E DOMINANTE DELL'IMMAGINE ORIGINALE DESCRITTA DA STATS
+    I VALORI SONO ASSOLUTI (NON DIPENDONO DAI PARAMETRI CORRENTI): RIPETERE IL COMANDO NON LI CAMBIA
+    """
+    mean = max(stats["mean"]["l"], 1.0)
+    low, high = stats["percentiles"][1], stats["percentiles"][99]
+
+    # IL CONTRASTO ALLARGA (O STRINGE) L'ISTOGRAMMA ATTORNO ALLA MEDIA, CHE RESTA INVARIATA
+    contrast = AUTO_TARGET_RANGE / max(high - low, 1)
+
+    # LA LUMINOSITÀ PORTA LA MEDIA ALL'OBIETTIVO SENZA SPINGERE OLTRE 255 LE LUCI DOPO IL CONTRASTO
+    # (SE SONO GIÀ BRUCIATE PUÒ SOLO SCURIRE)
+    brightness = AUTO_TARGET_MEAN / mean
+    highlights = mean + contrast * (high - mean)
+    if highlights > 0:
+        brightness = min(brightness, max(1.0, 255.0 / highlights))
+
+    # LA TEMPERATURA SCALA IL ROSSO PER W E IL BLU PER 2 - W: R * W = B * (2 - W) -> W = 2B / (R + B)
+    red, blue = stats["mean"]["r"], stats["mean"]["b"]
+    warmth = 2.0 * blue / (red + blue) if red + blue > 0 else 1.0
+
+    values = {"brightness": brightness, "contrast": contrast, "warmth": warmth}
+    result = {}
+    for name in names:
+        lower, upper = AUTO_LIMITS[name]
+        result[name] = round(max(lower, min(upper, values[name])), 2)
+    return result
+
+
+class StatisticsService:
+    """
+    STATISTICHE DELLE IMMAGINI APERTE, CALCOLATE SU UN THREAD DI LAVORO DEDICATO
+    QUELLE DELL'ORIGINALE SONO IN CACHE PER IMMAGINE E RITAGLIO (SERVONO AI COMANDI AUTOMATICI DEL PROMPT);
+    QUELLE DELL'ANTEPRIMA ELABORATA ALIMENTANO L'ISTOGRAMMA LIVE (LATEST-WINS, NESSUNA CACHE)
+    """
+    def __init__(self, dispatch):
+        self.worker = RenderScheduler(dispatch)
+        self.cache = LRUCache(STATS_CACHE_ENTRIES)
+
+    def forEngine(self, engine):
+        """
+        STATISTICHE DELL'IMMAGINE ORIGINALE (RITAGLIATA) DELL'ENGINE, O NONE SE NON C'È UN'IMMAGINE
+        SE NON SONO IN CACHE LE CALCOLA SUBITO: SUL PROXY PIÙ PICCOLO BASTANO POCHI MILLISECONDI
+        """
+        if not engine.workingImage:
+            return None
+
+        key = self._key(engine)
+        stats = self.cache.get(key)
+        if stats is None:
+            stats = computeStatistics(engine.getPreviewSource(maxSide=STATS_SIDE))
+            self.cache.put(key, stats)
+        return stats
+
+    def prefetch(self, engine):
+        """
+        CALCOLA IN BACKGROUND LE STATISTICHE DELL'ORIGINALE, COSÌ IL PRIMO COMANDO AUTOMATICO LE TROVA IN CACHE
+        """
+        if not engine.workingImage:
+            return
+
+        key = self._key(engine)
+        if self.cache.get(key) is not None:
+            return
+
+        # IL PROXY SI OTTIENE SUL THREAD PRINCIPALE (LA PIRAMIDE MEMORIZZA I LIVELLI RITAGLIATI)
+        source = engine.getPreviewSource(maxSide=STATS_SIDE)
+        self.worker.submit(
+            lambda: computeStatistics(source),
+            lambda stats: self.cache.put(key, stats),
+            channel=("source", id(engine))
+        )
+
+    def requestPreview(self, image, onDone):
+        """
+        CALCOLA IN BACKGROUND LE STATISTICHE DI UN'ANTEPRIMA ELABORATA
+        ONDONE(STATS) ARRIVA SUL THREAD PRINCIPALE SOLO PER L'ULTIMA ANTEPRIMA RICHIESTA
+        """
+        self.worker.submit(lambda: computeStatistics(image), onDone, channel="preview")
+
+    def stop(self):
+        self.worker.stop()
+
+    # --- METODI PRIVATI ---
+
+    def _key(self, engine):
+        # STESSA IMPRONTA DELLE MINIATURE DEI PRESET: CAMBIA CON L'IMMAGINE (ANCHE BOZZA -> PIENA) E CON IL RITAGLIO
+        return (id(engine), engine.imageVersion, engine.currentCrop)
@@ -1,7 +1,16 @@
+from bisect import bisect_right
+import json
 import re
 
+from cache import LRUCache
+from imagestats import AUTO_LIMITS, suggestParams
+from tracing import traced
+
+# NUMERO DI PROMPT NORMALIZZATI DI CUI SI MEMORIZZA L'ANALISI
+PARSE_CACHE_SIZE = 4096
+
 class NaturalLanguageInterpreter:
-    def __init__(self):
+    def __init__(self, vocabularyFile=None):
         # MEMORIA DELLE ULTIME MODIFICHE PER SUPPORTARE COMANDI RELATIVI COME "ANCORA", "DI PIÙ", "DI MENO"
         self.lastAttributes = []
 
@@ -41,7 +50,7 @@ class NaturalLanguageInterpreter:
             "morb": -1, "piatt": -1, "lavat": -1,
             "spent": -1, "grig": -1, "desatur": -1,
             "fredd": -1, "blu": -1, "ghiac": -1,
-            "azzurr": -1, "sfoc": -1
+            "azzurr": -1, "sfoc": -1, "morbidezz": -1
         }
 
         # MODIFICATORI DI INTENSITÀ CHE SCALANO L'EFFETTO BASE
@@ -62,9 +71,180 @@ class NaturalLanguageInterpreter:
         self.moreWords = ["più", "aumenta", "aumenti", "alza", "incrementa"]
         self.lessWords = ["meno", "riduci", "abbassa", "diminuisci", "togli"]
 
-    def parsePrompt(self, text, currentParams):
-        # NORMALIZZA IL TESTO IN INGRESSO
-        text = text.lower()
+        # COMANDI SPECIALI: RESET COMPLETO E CONVERSIONE IN BIANCO E NERO (SERVONO ENTRAMBE LE PAROLE)
+        self.resetWords = ["reset", "originale", "predefinito"]
+        self.monochromeWords = ["bianco", "nero"]
+
+        # COMANDI AUTOMATICI: I PARAMETRI CITATI (O, SE NESSUNO, TUTTI QUELLI CORREGGIBILI)
+        # VENGONO CALCOLATI DALLE STATISTICHE DELL'IMMAGINE INVECE CHE CON UN DELTA FISSO
+        # AUTOWORDS SONO PAROLE INTERE, AUTOSTEMS RADICI A INIZIO PAROLA (NESSUN FALSO POSITIVO COME "AUTORE")
+        self.autoWords = ["auto", "automatico", "automatica", "automatici", "automatiche"]
+        self.autoStems = ["corregg", "correzion", "ottimizz"]
+
+        # PAROLE CHE INDICANO UN PARAMETRO SOLO NEI SEGMENTI AUTOMATICI ("CORREGGI LA DOMINANTE"):
+        # ALTROVE NON HANNO UNA DIREZIONE NATURALE E VENGONO IGNORATE
+        self.autoVocabulary = {"bilanciament": "warmth", "dominant": "warmth"}
+
+        # ANALISI GIÀ CALCOLATE: PROMPT NORMALIZZATO -> COMANDI (INDIPENDENTI DAI PARAMETRI CORRENTI)
+        self._parseCache = LRUCache(PARSE_CACHE_SIZE)
+
+        if vocabularyFile:
+            self.loadVocabulary(vocabularyFile)
+        else:
+            self._compile()
+
+    def loadVocabulary(self, path):
+        """
+        CARICA DA UN FILE JSON UN VOCABOLARIO ESTERNO E RICOMPILA IL MATCHER
+        CHIAVI RICONOSCIUTE (TUTTE OPZIONALI, SOSTITUISCONO QUELLE PREDEFINITE):
+        "vocabulary", "defaultDirections", "intensifiers", "moreWords", "lessWords", "autoWords", "autoStems",
+        "autoVocabulary"
+        """
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+
+        self.vocabulary = data.get("vocabulary", self.vocabulary)
+        self.defaultDirections = data.get("defaultDirections", self.defaultDirections)
+        self.intensifiers = data.get("intensifiers", self.intensifiers)
+        self.moreWords = data.get("moreWords", self.moreWords)
+        self.lessWords = data.get("lessWords", self.lessWords)
+        self.autoWords = data.get("autoWords", self.autoWords)
+        self.autoStems = data.get("autoStems", self.autoStems)
+        self.autoVocabulary = data.get("autoVocabulary", self.autoVocabulary)
+        self._compile()
+
+    def _compile(self):
+        # COMPILA TUTTE LE PAROLE NOTE IN UN'UNICA REGEX: UNA SOLA SCANSIONE DEL TESTO TROVA TUTTE
+        # LE CORRISPONDENZE E LE LORO POSIZIONI, QUALUNQUE SIA LA DIMENSIONE DEL VOCABOLARIO
+        # VA RICHIAMATO DOPO OGNI MODIFICA DI VOCABOLARIO, DIREZIONI O INTENSIFICATORI
+        self._tokenKinds = {}
+        for word in self.resetWords:
+            self._tokenKinds[word] = ("reset", word)
+        for word in self.monochromeWords:
+            self._tokenKinds[word] = ("monochrome", word)
+        for word in self.autoWords + self.autoStems:
+            self._tokenKinds[word] = ("auto", word)
+        for word in self.moreWords:
+            self._tokenKinds[word] = ("more", word)
+        for word in self.lessWords:
+            self._tokenKinds[word] = ("less", word)
+        for keyword in self.autoVocabulary:
+            self._tokenKinds[keyword] = ("autoParam", keyword)
+        for keyword in self.vocabulary:
+            self._tokenKinds[keyword] = ("param", keyword)
+
+        # PATTERN DI OGNI PAROLA: SOTTOSTRINGA, TRANNE I COMANDI AUTOMATICI CHE RICHIEDONO I CONFINI DI PAROLA
+        patterns = {token: re.escape(token) for token in self._tokenKinds}
+        for word in self.autoWords:
+            patterns[word] = r"\b" + re.escape(word) + r"\b"
+        for stem in self.autoStems:
+            patterns[stem] = r"\b" + re.escape(stem)
+
+        # LE PAROLE PIÙ LUNGHE HANNO PRECEDENZA (ES. "DESATUR" PRIMA DI "SATUR")
+        tokens = sorted(patterns, key=len, reverse=True)
+        self._matcher = re.compile(
+            r"(?P<separator>\b(?:e|ma)\b|,)|(?P<token>" + "|".join(patterns[token] for token in tokens) + ")"
+        )
+
+        # GLI INTENSIFICATORI POSSONO SOVRAPPORSI ("UN POCO" CONTIENE "UN PO" E "POCO"): SI CERCANO CON UN
+        # LOOKAHEAD, CHE NON CONSUMA TESTO, E A PARITÀ DI SEGMENTO VINCE QUELLO CHE VIENE PRIMA NEL DIZIONARIO
+        self._intensityRanks = {word: rank for rank, word in enumerate(self.intensifiers)}
+        intensifiers = sorted(self.intensifiers, key=len, reverse=True)
+        self._intensityMatcher = re.compile("(?=(" + "|".join(re.escape(word) for word in intensifiers) + "))")
+        self._intensityValues = list(self.intensifiers.values())
+        self._parseCache.clear()
+
+    def _analyze(self, text):
+        # SCANSIONE UNICA DEL TESTO NORMALIZZATO: RESTITUISCE IL COMANDO E, PER OGNI SEGMENTO
+        # ("E", "MA", ","), TUTTI I PARAMETRI CITATI CON DIREZIONE E INTENSITÀ
+        # I PARAMETRI DEI SEGMENTI AUTOMATICI HANNO DIREZIONE 0 E INTENSITÀ NONE
+        # IL RISULTATO NON DIPENDE DAI PARAMETRI CORRENTI, QUINDI È MEMORIZZATO NELLA CACHE LRU
+        analysis = self._parseCache.get(text)
+        if analysis is not None:
+            return analysis
+
+        segments = [[]]
+        separators = []
+        found = set()
+        for match in self._matcher.finditer(text):
+            if match.group("separator"):
+                segments.append([])
+                separators.append(match.start())
+                continue
+
+            kind, value = self._tokenKinds[match.group("token")]
+            found.add((kind, value))
+            segments[-1].append((kind, value))
+
+        # OGNI INTENSIFICATORE VA NEL SEGMENTO IN CUI CADE LA SUA POSIZIONE
+        for match in self._intensityMatcher.finditer(text):
+            rank = self._intensityRanks[match.group(1)]
+            found.add(("intensity", rank))
+            segments[bisect_right(separators, match.start())].append(("intensity", rank))
+
+        if any(kind == "reset" for kind, _ in found):
+            analysis = ("reset", (), False)
+        elif all(("monochrome", word) in found for word in self.monochromeWords):
+            analysis = ("monochrome", (), False)
+        else:
+            commands = []
+            autoSegment = False
+            for segment in segments:
+                # UN SEGMENTO È AUTOMATICO SE CONTIENE UNA PAROLA AUTOMATICA, OPPURE SE SEGUE UN SEGMENTO
+                # AUTOMATICO SENZA INDICARE UNA DIREZIONE (ES. "CORREGGI ESPOSIZIONE E CONTRASTO")
+                kinds = {kind for kind, _ in segment}
+                autoSegment = "auto" in kinds or (autoSegment and not kinds & {"more", "less", "intensity"})
+                if autoSegment:
+                    autoParams = [self.vocabulary[keyword] if kind == "param" else self.autoVocabulary[keyword]
+                                  for kind, keyword in segment if kind in ("param", "autoParam")]
+                    autoParams = [param for param in autoParams if param in AUTO_LIMITS] or list(AUTO_LIMITS)
+                    for param in dict.fromkeys(autoParams):
+                        commands.append((param, 0, None))
+                    continue
+
+                # CALCOLO DELL'INTENSITÀ LOCALE
+                ranks = [value for kind, value in segment if kind == "intensity"]
+                intensityMultiplier = self._intensityValues[min(ranks)] if ranks else 1.0
+
+                # RILEVA DIREZIONE LOCALE
+                hasLess = any(kind == "less" for kind, _ in segment)
+
+                # TUTTI I PARAMETRI DEL SEGMENTO, CIASCUNO UNA SOLA VOLTA (PRIMA OCCORRENZA)
+                seenParams = set()
+                for kind, keyword in segment:
+                    if kind != "param":
+                        continue
+                    param = self.vocabulary[keyword]
+                    if param in seenParams:
+                        continue
+                    seenParams.add(param)
+
+                    # DIREZIONE BASE DEL TERMINE, INVERTITA SE PRESENTE UN COMANDO DI DIMINUZIONE
+                    direction = self.defaultDirections.get(keyword, 1)
+                    if hasLess:
+                        direction *= -1
+                    commands.append((param, direction, intensityMultiplier))
+
+            hasLess = any(kind == "less" for kind, _ in found)
+            analysis = ("adjust", tuple(commands), hasLess)
+
+        self._parseCache.put(text, analysis)
+        return analysis
+
+    def hasAutoCommand(self, text):
+        """
+        TRUE SE IL PROMPT CONTIENE UN COMANDO AUTOMATICO: I SUOI PARAMETRI DIPENDONO DALLE STATISTICHE DELL'IMMAGINE
+        """
+        command, commands, _ = self._analyze(" ".join(text.lower().split()))
+        return command == "adjust" and any(intensityMultiplier is None for _, _, intensityMultiplier in commands)
+
+    @traced("parse")
+    def parsePrompt(self, text, currentParams, remember=True, statistics=None):
+        # CON REMEMBER=FALSE NON AGGIORNA LA MEMORIA DEI COMANDI RELATIVI (ANALISI SPECULATIVA DURANTE LA DIGITAZIONE)
+        # STATISTICS: FUNZIONE SENZA ARGOMENTI CHE RESTITUISCE LE STATISTICHE DELL'IMMAGINE (O NONE),
+        # CHIAMATA SOLO SE IL PROMPT CONTIENE UN COMANDO AUTOMATICO
+        # NORMALIZZA IL TESTO IN INGRESSO (MINUSCOLO, SPAZI COMPATTATI)
+        text = " ".join(text.lower().split())
 
         # DIZIONARIO FINALE DELLE MODIFICHE DA APPLICARE
         changes = {}
@@ -78,60 +258,46 @@ class NaturalLanguageInterpreter:
         # DELTA BASE DI MODIFICA PER OGNI COMANDO
         baseDelta = 0.25
 
+        command, commands, hasLess = self._analyze(text)
+
         # COMANDO DI RESET COMPLETO
-        if any(word in text for word in ["reset", "originale", "predefinito"]):
+        if command == "reset":
             resetParams = {key: 1.0 for key in currentParams}
             return resetParams, list(resetParams.keys())
 
         # CONVERSIONE IN BIANCO E NERO
-        if "bianco" in text and "nero" in text:
+        if command == "monochrome":
             return {"saturation": 0.0}, ["saturation"]
 
-        # DIVIDE IL TESTO IN SEGMENTI LOGICI ("E", "MA", ",")
-        segments = re.split(r"\b(e|ma|,)\b", text)
+        # PARAMETRI DEI COMANDI AUTOMATICI, CALCOLATI UNA SOLA VOLTA DALLE STATISTICHE
+        autoParams = [param for param, _, intensityMultiplier in commands if intensityMultiplier is None]
+        suggested = {}
+        if autoParams:
+            stats = statistics() if statistics else None
+            if stats:
+                suggested = suggestParams(stats, autoParams)
 
-        for segment in segments:
-            segment = segment.strip()
-            if not segment:
+        for param, direction, intensityMultiplier in commands:
+            if intensityMultiplier is None:
+                # VALORE ASSOLUTO CALCOLATO DALL'IMMAGINE (SENZA STATISTICHE NESSUNA MODIFICA)
+                if param in suggested and param not in changes:
+                    changes[param] = suggested[param]
+                    processedParams.append(param)
                 continue
 
-            # CALCOLO DELL'INTENSITÀ LOCALE
-            intensityMultiplier = 1.0
-            for key, value in self.intensifiers.items():
-                if key in segment:
-                    intensityMultiplier = value
-                    break
-
-            # RILEVA DIREZIONE LOCALE
-            hasMore = any(word in segment for word in self.moreWords)
-            hasLess = any(word in segment for word in self.lessWords)
-
-            for keyword, param in self.vocabulary.items():
-                if keyword in segment:
-                    # DIREZIONE BASE DEL TERMINE
-                    direction = self.defaultDirections.get(keyword, 1)
-
-                    # SE PRESENTE UN COMANDO DI DIMINUZIONE, INVERTE IL SIGNIFICATO
-                    if hasLess:
-                        direction *= -1
+            # CALCOLO DEL NUOVO VALORE PARTENDO DALLO STATO CORRENTE
+            currentValue = currentParams.get(param, 1.0)
+            newValue = self._clamp(
+                currentValue + baseDelta * direction * intensityMultiplier
+            )
 
-                    # CALCOLO DEL NUOVO VALORE PARTENDO DALLO STATO CORRENTE
-                    currentValue = currentParams.get(param, 1.0)
-                    newValue = self._clamp(
-                        currentValue + baseDelta * direction * intensityMultiplier
-                    )
-
-                    # REGISTRA LA MODIFICA
-                    changes[param] = newValue
-                    processedParams.append(param)
-                    localHistory.append((param, direction))
-                    break
+            # REGISTRA LA MODIFICA
+            changes[param] = newValue
+            processedParams.append(param)
+            localHistory.append((param, direction))
 
         # GESTIONE DELLA MEMORIA PER COMANDI RELATIVI SENZA PARAMETRO ESPLICITO
-        if not changes and self.lastAttributes:
-            hasMore = any(word in text for word in self.moreWords)
-            hasLess = any(word in text for word in self.lessWords)
-
+        if not changes and not autoParams and self.lastAttributes:
             for param, lastDirection in self.lastAttributes:
                 direction = lastDirection
                 if hasLess:
@@ -144,7 +310,7 @@ class NaturalLanguageInterpreter:
                 processedParams.append(param)
 
         # AGGIORNA LA MEMORIA SOLO SE CI SONO NUOVE MODIFICHE ESPLICITE
-        if localHistory:
+        if localHistory and remember:
             self.lastAttributes = localHistory
 
         return changes, processedParams
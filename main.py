@@ -1,18 +1,46 @@
-from kivymd.app import MDApp
-from kivymd.uix.boxlayout import MDBoxLayout
-from kivy.properties import StringProperty
-
-# IMPORTAZIONE AZIONI UI E LOGICA DI BUSINESS (SEPARAZIONE MVC)
-from actions import (
-    undoAction, redoAction, openFileAction, manualUpdateAction,
-    processPromptAction, saveFinalImageAction, showCropMenuAction,
-    showSavePresetDialogAction, showLoadPresetDialogAction, showLogDialogAction
-)
-
-# IMPORTAZIONE MOTORI: NLP, PROCESSING IMMAGINI E UTILITY
-from interpreter import NaturalLanguageInterpreter
-from processor import ImageEngine
-from utils import UtilsManager
+import os
+import sys
+import time
+
+from tracing import tracer, traced
+
+# ISTANTE DI AVVIO DEL PROCESSO: LE FASI DI STARTUP SONO MISURATE A PARTIRE DA QUI
+STARTUP_TIME = time.perf_counter()
+
+# CON PROMPTVISION_STARTUP_PROFILE=1 A PRIMO FRAME DISEGNATO VIENE STAMPATO IL TEMPO DI OGNI FASE DI AVVIO
+STARTUP_PROFILE = bool(os.environ.get("PROMPTVISION_STARTUP_PROFILE"))
+
+with tracer.span("startup.import.kivy"):
+    from kivymd.app import MDApp
+    from kivymd.uix.boxlayout import MDBoxLayout
+    from kivy.uix.widget import Widget
+    from kivy.uix.image import Image
+    from kivy.graphics import Color, Line
+    from kivy.properties import StringProperty
+    from kivy.clock import Clock
+    from kivy.core.window import Window
+
+with tracer.span("startup.import.app"):
+    # IMPORTAZIONE AZIONI UI E LOGICA DI BUSINESS (SEPARAZIONE MVC)
+    # I DIALOGHI (DIALOGS.PY) E I MOTORI NON NECESSARI AL PRIMO FRAME SI IMPORTANO AL PRIMO UTILIZZO
+    from actions import (
+        undoAction, redoAction, openFileAction, manualUpdateAction,
+        processPromptAction, saveFinalImageAction,
+        resizePreviewAction, livePreviewAction, promptTextChangedAction, speculatePromptAction,
+        saveSessionAction, restoreSessionAction, zoomViewAction, toggleZoomAction, panViewAction
+    )
+
+    # IMPORTAZIONE MOTORI: PROCESSING IMMAGINI E UTILITY (IMAGEENGINE E NUMPY SOLO ALLA PRIMA IMMAGINE)
+    from documents import DocumentManager
+    from utils import UtilsManager
+    from renderer import RenderScheduler
+    from session import SESSION_FILE
+
+# FREQUENZA MASSIMA DEI RENDER DI ANTEPRIMA DURANTE IL TRASCINAMENTO DI UNO SLIDER
+LIVE_PREVIEW_FPS = 15
+
+# ATTESA DOPO L'ULTIMO TASTO PRIMA DI PRE-CALCOLARE IL RISULTATO DEL PROMPT (SECONDI)
+SPECULATION_DEBOUNCE = 0.35
 
 
 class ControlRow(MDBoxLayout):
@@ -24,10 +52,17 @@ class ControlRow(MDBoxLayout):
 class ManualEditMenu(MDBoxLayout):
     """GESTORE DEGLI SLIDER: COSTRUZIONE DINAMICA E SINCRONIZZAZIONE"""
     
-    def __init__(self, updateCallback, **kwargs):
+    def __init__(self, updateCallback, liveCallback=None, **kwargs):
         super().__init__(**kwargs)
         self.updateCallback = updateCallback
         self.sliders = {}  # CACHE PER AGGIORNAMENTI FUTURI
+
+        # MODALITÀ LIVE: RENDER DI ANTEPRIMA DURANTE IL TRASCINAMENTO, LIMITATI A LIVE_PREVIEW_FPS
+        self.liveCallback = liveCallback
+        self.liveMode = liveCallback is not None
+        self._dragKey = None
+        self._liveTrigger = Clock.create_trigger(self._flushLive, 1.0 / LIVE_PREVIEW_FPS)
+
         self._buildControls()
 
     def _buildControls(self):
@@ -49,8 +84,10 @@ class ManualEditMenu(MDBoxLayout):
             slider = row.ids.slider
             valueLabel = row.ids.valLabel
 
-            # BINDING: AGGIORNA LABEL LIVE, APPLICA MODIFICA SOLO AL RILASCIO (ON_TOUCH_UP)
-            slider.bind(value=lambda inst, val, lbl=valueLabel: self._updateLabel(val, lbl))
+            # BINDING: AGGIORNA LABEL (E ANTEPRIMA LIVE) DURANTE IL TRASCINAMENTO,
+            # APPLICA LA MODIFICA DEFINITIVA SOLO AL RILASCIO (ON_TOUCH_UP)
+            slider.bind(value=lambda inst, val, lbl=valueLabel, k=key: self._onValue(val, lbl, k))
+            slider.bind(on_touch_down=lambda inst, touch, k=key: self._onPress(inst, touch, k))
             slider.bind(on_touch_up=lambda inst, touch, k=key: self._onRelease(inst, touch, k))
 
             self.sliders[key] = {"slider": slider, "label": valueLabel}
@@ -60,11 +97,35 @@ class ManualEditMenu(MDBoxLayout):
         # AGGIORNAMENTO VISIVO DEL VALORE (INT)
         label.text = str(int(value))
 
-    def _onRelease(self, slider, touch, paramKey):
-        # APPLICA LA MODIFICA AL PROCESSORE SOLO SE IL TOUCH È SULLO SLIDER
+    def _onValue(self, value, label, paramKey):
+        # AGGIORNA LA LABEL E, SE LO SLIDER È TRASCINATO, PROGRAMMA UN RENDER LIVE
+        # IL TRIGGER NON SI RIACCODA SE GIÀ PROGRAMMATO: AL MASSIMO UN RENDER OGNI 1/LIVE_PREVIEW_FPS
+        self._updateLabel(value, label)
+        if self.liveMode and self._dragKey == paramKey:
+            self._liveTrigger()
+
+    def _flushLive(self, dt):
+        # INVIA IL VALORE PIÙ RECENTE DELLO SLIDER TRASCINATO (NON MODIFICA LO STATO NÉ LA CRONOLOGIA)
+        if self._dragKey:
+            slider = self.sliders[self._dragKey]["slider"]
+            self.liveCallback(self._dragKey, slider.value / 50.0)
+
+    def _onPress(self, slider, touch, paramKey):
+        # INIZIO DEL GESTO SULLO SLIDER
         if slider.collide_point(*touch.pos):
-            # NORMALIZZAZIONE VALORE (0-150 -> 0.0-3.0) E CALLBACK
-            self.updateCallback(paramKey, slider.value / 50.0)
+            self._dragKey = paramKey
+
+    def _onRelease(self, slider, touch, paramKey):
+        # APPLICA LA MODIFICA AL PROCESSORE UNA SOLA VOLTA PER GESTO: IL TOUCH_UP ARRIVA
+        # ANCHE COME EVENTO "GRABBED" ALLO SLIDER CHE HA CATTURATO IL TOCCO
+        if touch.grab_current is not slider:
+            return
+
+        self._dragKey = None
+        self._liveTrigger.cancel()
+
+        # NORMALIZZAZIONE VALORE (0-150 -> 0.0-3.0) E CALLBACK
+        self.updateCallback(paramKey, slider.value / 50.0)
 
     def syncSliders(self, params):
         # SINCRONIZZA GUI CON I PARAMETRI REALI (ES. DOPO UN PRESET O UNDO)
@@ -75,30 +136,255 @@ class ManualEditMenu(MDBoxLayout):
                 self.sliders[key]["label"].text = str(sliderValue)
 
 
+class HistogramWidget(Widget):
+    """ISTOGRAMMA LIVE DELL'ANTEPRIMA: LUMINANZA E CANALI RGB SOVRAPPOSTI"""
+
+    # CURVE NELL'ORDINE DI DISEGNO: (CANALE, COLORE RGBA)
+    CURVES = (
+        ("l", (1.0, 1.0, 1.0, 0.35)),
+        ("r", (1.0, 0.35, 0.35, 0.8)),
+        ("g", (0.35, 1.0, 0.35, 0.8)),
+        ("b", (0.4, 0.55, 1.0, 0.8))
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = None
+        self.bind(pos=self._redraw, size=self._redraw)
+
+    def setStatistics(self, stats):
+        # NUOVE STATISTICHE (O NONE PER SVUOTARE)
+        self.stats = stats
+        self._redraw()
+
+    def _redraw(self, *args):
+        self.canvas.clear()
+        if not self.stats:
+            return
+
+        histograms = self.stats["histograms"]
+
+        # SCALA COMUNE A TUTTE LE CURVE, SENZA I PICCHI DEI LIVELLI ESTREMI (CLIPPING) CHE SCHIACCEREBBERO IL RESTO
+        peak = max(max(values[1:-1]) for values in histograms.values()) or 1
+        stepX = self.width / 255.0
+
+        with self.canvas:
+            for channel, rgba in self.CURVES:
+                Color(*rgba)
+                points = []
+                for level, count in enumerate(histograms[channel]):
+                    points += [self.x + level * stepX, self.y + self.height * min(1.0, count / peak)]
+                Line(points=points, width=1)
+
+
+class ZoomableImage(Image):
+    """ANTEPRIMA CON ZOOM (ROTELLA, DOPPIO TOCCO) E PAN (TRASCINAMENTO) INOLTRATI ALL'APP"""
+
+    # FATTORE DI INGRANDIMENTO PER OGNI SCATTO DELLA ROTELLA
+    WHEEL_STEP = 1.25
+
+    def on_touch_down(self, touch):
+        if not self.collide_point(*touch.pos):
+            return super().on_touch_down(touch)
+
+        app = MDApp.get_running_app()
+        if touch.is_mouse_scrolling:
+            if touch.button in ("scrolldown", "scrollup"):
+                factor = self.WHEEL_STEP if touch.button == "scrolldown" else 1.0 / self.WHEEL_STEP
+                app.zoomView(factor, self._anchor(touch))
+            return True
+
+        if touch.is_double_tap:
+            app.toggleZoom(self._anchor(touch))
+            return True
+
+        touch.grab(self)
+        return True
+
+    def on_touch_move(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_move(touch)
+
+        # Y DI KIVY VERSO L'ALTO, DELL'IMMAGINE VERSO IL BASSO
+        MDApp.get_running_app().panView(touch.dx, -touch.dy)
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_up(touch)
+
+        touch.ungrab(self)
+        return True
+
+    def _anchor(self, touch):
+        # POSIZIONE DEL TOCCO COME FRAZIONE DELL'IMMAGINE MOSTRATA (X VERSO DESTRA, Y VERSO IL BASSO)
+        width, height = self.norm_image_size
+        if not width or not height:
+            return (0.5, 0.5)
+
+        left = self.center_x - width / 2
+        top = self.center_y + height / 2
+        return (min(1.0, max(0.0, (touch.x - left) / width)), min(1.0, max(0.0, (top - touch.y) / height)))
+
+
 class PromptVisionApp(MDApp):
     """CONTROLLER PRINCIPALE: INIZIALIZZAZIONE E ROUTING EVENTI"""
     dialog = None
 
+    # TEXTURE DI ANTEPRIMA RIUSATA TRA UNA MODIFICA E L'ALTRA
+    previewTexture = None
+
+    # MODALITÀ SPECULATIVA (OPZIONALE): PRE-CALCOLA IL PROMPT MENTRE L'UTENTE SCRIVE
+    speculativePrompt = False
+    speculation = None
+
+    # SERVIZI CREATI AL PRIMO UTILIZZO (VEDI LE PROPERTY OMONIME SENZA UNDERSCORE)
+    _interpreter = None
+    _exporter = None
+    _presetGallery = None
+    _statistics = None
+
+    # MENU DEGLI SLIDER, COSTRUITO DOPO IL PRIMO FRAME
+    manualMenu = None
+
+    def load_kv(self, filename=None):
+        # IL FILE .KV VIENE CARICATO AUTOMATICAMENTE PRIMA DI BUILD: È UNA FASE DI AVVIO A SÉ
+        with tracer.span("startup.kv"):
+            return super().load_kv(filename)
+
+    @traced("startup.build")
     def build(self):
         # SETUP TEMA (DARK/PURPLE) E INIZIALIZZAZIONE CORE LOGICO
         self.theme_cls.theme_style = "Dark"
         self.theme_cls.primary_palette = "DeepPurple"
         self.theme_cls.accent_palette = "Amber"
 
-        self.processor = ImageEngine()
-        self.interpreter = NaturalLanguageInterpreter()
+        # DOCUMENTI APERTI CON BUDGET DI MEMORIA CONDIVISO; SELF.PROCESSOR È SEMPRE L'ENGINE DEL DOCUMENTO ATTIVO,
+        # CREATO AL PRIMO UTILIZZO
+        self.documents = DocumentManager()
         self.utils = UtilsManager()
 
+        # SESSIONE SALVATA ALLA CHIUSURA E RIPRESA AL LANCIO, ACCANTO AL FILE DEI PRESET
+        self.sessionFile = os.path.join(os.path.dirname(self.utils.presetFile), SESSION_FILE)
+
+        # RENDER IN BACKGROUND: I RISULTATI TORNANO SUL THREAD PRINCIPALE TRAMITE CLOCK
+        self.renderer = RenderScheduler(dispatch=lambda callback: Clock.schedule_once(lambda dt: callback()))
+
+        # DECODIFICA DEI FILE A PIENA RISOLUZIONE SU UN THREAD SEPARATO (NON BLOCCA I RENDER DELLA BOZZA)
+        self.loader = RenderScheduler(dispatch=self.renderer.dispatch)
+
+        # OPZIONI DEGLI ENCODER SCELTE NELLA SESSIONE (FORMATO -> OPZIONI)
+        self.exportOptions = {}
+        self.speculationTrigger = Clock.create_trigger(lambda dt: speculatePromptAction(self), SPECULATION_DEBOUNCE)
+
+        # TRACCIA STRUTTURATA SU FILE JSON LINES SE RICHIESTA DALL'AMBIENTE (ES. PROMPTVISION_TRACE_FILE=trace.jsonl)
+        traceFile = os.environ.get("PROMPTVISION_TRACE_FILE")
+        if traceFile:
+            tracer.setSink(traceFile)
+
         return self.root
 
+    @traced("startup.on_start")
     def on_start(self):
-        # INIEZIONE DEL MENU MANUALE NELLA GUI AL LANCIO
-        self.manualMenu = ManualEditMenu(updateCallback=self._manualUpdate)
+        # IL PROXY DI ANTEPRIMA SEGUE LE DIMENSIONI DEL WIDGET IMMAGINE
+        imageWidget = self.root.ids.main_image
+        imageWidget.bind(size=lambda inst, size: resizePreviewAction(self, size))
+        resizePreviewAction(self, imageWidget.size)
+
+        # IL RESTO DELL'INTERFACCIA SI COSTRUISCE DOPO IL PRIMO FRAME: LA FINESTRA APPARE SUBITO
+        Window.bind(on_flip=self._onFirstFrame)
+
+    def _onFirstFrame(self, *args):
+        # PRIMO FRAME A SCHERMO: COMPLETA L'AVVIO UNA SOLA VOLTA
+        Window.unbind(on_flip=self._onFirstFrame)
+        tracer.record("startup.first_frame", (time.perf_counter() - STARTUP_TIME) * 1000.0)
+        self._buildDeferredUI()
+
+        if STARTUP_PROFILE:
+            self._reportStartup()
+
+    @traced("startup.deferred")
+    def _buildDeferredUI(self):
+        # INIEZIONE DEL MENU MANUALE NELLA GUI
+        self.manualMenu = ManualEditMenu(updateCallback=self._manualUpdate, liveCallback=self._livePreview)
         if 'sideScroll' in self.root.ids:
             self.root.ids.sideScroll.add_widget(self.manualMenu)
 
+        # RIPRENDE I DOCUMENTI DELLA SESSIONE PRECEDENTE (PROXY SUBITO, ORIGINALE IN BACKGROUND)
+        restoreSessionAction(self)
+
+    def _reportStartup(self):
+        # STAMPA LE FASI DI AVVIO NELL'ORDINE IN CUI SONO TERMINATE (MODALITÀ PROMPTVISION_STARTUP_PROFILE)
+        lines = [f"{event['op']:<24} {event['ms']:>8.1f} ms" for event in tracer.events if event["op"].startswith("startup.")]
+        lines.append(f"{'moduli importati':<24} {len(sys.modules):>8}")
+        print("AVVIO PROMPTVISION\n" + "\n".join(lines))
+        self.utils.logAction(f"Avvio completato in {(time.perf_counter() - STARTUP_TIME) * 1000.0:.0f} ms")
+
+    # --- SERVIZI CREATI AL PRIMO UTILIZZO ---
+
+    @property
+    def processor(self):
+        # ENGINE DEL DOCUMENTO ATTIVO: IL PRIMO ACCESSO IMPORTA LA PIPELINE (NUMPY) E CREA UN DOCUMENTO VUOTO
+        return self.documents.active
+
+    @processor.setter
+    def processor(self, engine):
+        if engine is not self.documents.active:
+            self.documents.activate(engine)
+
+    @property
+    def interpreter(self):
+        # VOCABOLARIO E REGEX COMPILATA SERVONO SOLO AL PRIMO PROMPT
+        if self._interpreter is None:
+            from interpreter import NaturalLanguageInterpreter
+            self._interpreter = NaturalLanguageInterpreter()
+        return self._interpreter
+
+    @property
+    def exporter(self):
+        # THREAD DI EXPORT A PIENA RISOLUZIONE, AVVIATO AL PRIMO EXPORT
+        if self._exporter is None:
+            self._exporter = RenderScheduler(dispatch=self.renderer.dispatch)
+        return self._exporter
+
+    @property
+    def presetGallery(self):
+        # POOL DELLE MINIATURE DEI PRESET, CREATO ALLA PRIMA APERTURA DELLA GALLERIA
+        if self._presetGallery is None:
+            from gallery import PresetGallery
+            self._presetGallery = PresetGallery()
+        return self._presetGallery
+
+    @property
+    def statistics(self):
+        # STATISTICHE DELLE IMMAGINI (ISTOGRAMMA LIVE E COMANDI AUTOMATICI DEL PROMPT) SU UN THREAD DEDICATO
+        if self._statistics is None:
+            from imagestats import StatisticsService
+            self._statistics = StatisticsService(dispatch=self.renderer.dispatch)
+        return self._statistics
+
     # --- WRAPPER EVENTI UI -> ACTIONS ---
 
+    def on_pause(self):
+        # SU MOBILE L'APP IN PAUSA PUÒ ESSERE CHIUSA DAL SISTEMA SENZA ON_STOP: LA SESSIONE VA SALVATA ORA
+        saveSessionAction(self)
+        return True
+
+    def on_stop(self):
+        # SALVA LA SESSIONE E FERMA I THREAD DI RENDER ALLA CHIUSURA
+        saveSessionAction(self)
+        self.renderer.stop()
+        self.loader.stop()
+
+        # I SERVIZI MAI USATI NON VENGONO CREATI SOLO PER ESSERE FERMATI
+        if self._exporter:
+            self._exporter.stop()
+        if self._presetGallery:
+            self._presetGallery.shutdown()
+        if self._statistics:
+            self._statistics.stop()
+        tracer.setSink(None)
+
     def openFileManager(self):
         # APERTURA FILE CHOOSER
         openFileAction(self)
@@ -107,28 +393,71 @@ class PromptVisionApp(MDApp):
         # PONTE TRA SLIDER E PROCESSORE
         manualUpdateAction(self, paramKey, value)
 
+    def _livePreview(self, paramKey, value):
+        # ANTEPRIMA DURANTE IL TRASCINAMENTO DI UNO SLIDER
+        livePreviewAction(self, paramKey, value)
+
+    def zoomView(self, factor, anchor):
+        # ROTELLA SULL'ANTEPRIMA
+        zoomViewAction(self, factor, anchor)
+
+    def toggleZoom(self, anchor):
+        # DOPPIO TOCCO SULL'ANTEPRIMA: IMMAGINE INTERA <-> 100%
+        toggleZoomAction(self, anchor)
+
+    def panView(self, dx, dy):
+        # TRASCINAMENTO DELL'ANTEPRIMA INGRANDITA
+        panViewAction(self, dx, dy)
+
     def processPrompt(self):
         # ELABORAZIONE TESTO UTENTE (NLP)
         processPromptAction(self)
 
+    def onPromptTextChanged(self):
+        # DIGITAZIONE NEL CAMPO PROMPT
+        promptTextChangedAction(self)
+
+    def toggleSpeculativePrompt(self):
+        # ATTIVA/DISATTIVA IL PRE-CALCOLO DEL PROMPT DURANTE LA DIGITAZIONE
+        self.speculativePrompt = not self.speculativePrompt
+        self.utils.logAction(f"Anteprima prompt durante la digitazione: {'attiva' if self.speculativePrompt else 'disattiva'}")
+        if self.speculativePrompt:
+            self.speculationTrigger()
+
     def saveFinalImage(self):
         # SALVATAGGIO SU DISCO
         saveFinalImageAction(self)
 
+    # I DIALOGHI SI IMPORTANO AL PRIMO UTILIZZO (IL MODULO RESTA POI IN SYS.MODULES)
+
     def showCropMenu(self):
         # ATTIVAZIONE MODALITÀ RITAGLIO
+        from dialogs import showCropMenuAction
         showCropMenuAction(self)
 
     def showSavePresetDialog(self):
         # DIALOGO SALVATAGGIO PRESET
+        from dialogs import showSavePresetDialogAction
         showSavePresetDialogAction(self)
 
     def showLoadPresetDialog(self):
         # DIALOGO CARICAMENTO PRESET
+        from dialogs import showLoadPresetDialogAction
         showLoadPresetDialogAction(self)
 
+    def showDocumentsDialog(self):
+        # DIALOGO DOCUMENTI APERTI
+        from dialogs import showDocumentsDialogAction
+        showDocumentsDialogAction(self)
+
+    def showLutDialog(self):
+        # DIALOGO LUT 3D (LOOK, IMPORT/EXPORT .CUBE)
+        from dialogs import showLutDialogAction
+        showLutDialogAction(self)
+
     def showLogDialog(self):
         # VISUALIZZAZIONE STORICO OPERAZIONI
+        from dialogs import showLogDialogAction
         showLogDialogAction(self)
 
     def undo(self):
@@ -1,13 +1,103 @@
-from PIL import Image, ImageEnhance
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps
+from functools import partial
+import math
+import numpy as np
 import os
-import copy
+import threading
+
+from cache import LRUCache
+from history import EditHistory, HISTORY_LIMIT
+from tracing import tracer
+
+# PESI ITU-R 601 IN VIRGOLA FISSA (16 BIT) USATI DA PIL PER LA CONVERSIONE RGB -> L, CON ARROTONDAMENTO
+LUMA_WEIGHTS = np.array([19595, 38470, 7471], dtype=np.float32)
+LUMA_ROUNDING = 0x8000
+LUMA_SCALE = 65536.0
+
+# ALTEZZA DELLE BANDE ELABORATE DAL MOTORE NUMPY (ABBASTANZA PICCOLE DA RESTARE IN CACHE)
+BAND_ROWS = 64
+
+# LATO MINIMO DEL LIVELLO PIÙ PICCOLO DELLA PIRAMIDE DI ANTEPRIMA
+MIN_PROXY_SIDE = 256
+
+# BUDGET DI MEMORIA DELLA CACHE DEGLI STADI INTERMEDI DELLA PIPELINE
+STAGE_CACHE_BYTES = 256 * 1024 * 1024
+
+# LATO DEI TILE DEL VIEWPORT INGRANDITO E BUDGET DI MEMORIA DELLA LORO CACHE
+TILE_SIZE = 256
+TILE_CACHE_BYTES = 192 * 1024 * 1024
+
+# MARGINE ELABORATO ATTORNO A OGNI TILE E POI SCARTATO (KERNEL 3X3 DELLA NITIDEZZA)
+TILE_MARGIN = 1
+
+# INGRANDIMENTO MASSIMO DEL VIEWPORT: PIXEL DI SCHERMO PER PIXEL DELL'IMMAGINE
+MAX_VIEW_SCALE = 4.0
+
+# LATO DEL CUBO DELLE LUT 3D (33 NODI PER CANALE, INTERPOLAZIONE TRILINEARE) E NUMERO DI LUT IN CACHE
+LUT_SIZE = 33
+LUT_CACHE_ENTRIES = 64
+
+# SCARTO MASSIMO (LIVELLI) TRA UNA LUT E IL MOTORE NUMPY, MISURATO DA LUTERROR AL CENTRO DELLE CELLE DEL CUBO:
+# OLTRE, IL RENDER USA IL MOTORE NUMPY (L'INTERPOLAZIONE TRILINEARE SMUSSA I CLIP DEI PARAMETRI ESTREMI)
+LUT_MAX_ERROR = 2
+
+# SCARTO MASSIMO REALE DEL MOTORE LUT DALLA CATENA PIL (IL MOTORE NUMPY COINCIDE ESATTAMENTE):
+# TRA I CENTRI CAMPIONATI I TRONCAMENTI E I GOMITI DEI CLIP AGGIUNGONO FINO A QUALCHE LIVELLO
+# (MISURATO FINO A 6 CON PARAMETRI CASUALI IN [0, 3], DI NORMA ENTRO 2)
+LUT_TOLERANCE = 8
+
+# INTERVALLO AMMESSO PER OGNI PARAMETRO (QUELLO DEGLI SLIDER: 0-150 -> 0.0-3.0)
+PARAM_MIN = 0.0
+PARAM_MAX = 3.0
+
+# PASSI DEL MOTORE NUMPY NELL'ORDINE DELLA PIPELINE
+NUMPY_STEPS = ("color", "sharpness", "warmth")
+
+# ESTENSIONI SUPPORTATE IN EXPORT E RELATIVO FORMATO PIL
+EXPORT_FORMATS = {
+    ".png": "PNG",
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".webp": "WEBP",
+    ".tiff": "TIFF"
+}
+
+# OPZIONI DI DEFAULT DEGLI ENCODER PIL PER OGNI FORMATO DI EXPORT (MODIFICABILI DALL'UTENTE)
+EXPORT_OPTIONS = {
+    "PNG": {"compress_level": 6, "optimize": False},
+    "JPEG": {"quality": 92, "progressive": True, "optimize": True},
+    "WEBP": {"quality": 90, "method": 4},
+    "TIFF": {"compression": "tiff_deflate"}
+}
+
+# INTERVALLI DELLE OPZIONI NUMERICHE E VALORI AMMESSI PER LA COMPRESSIONE TIFF
+EXPORT_OPTION_RANGES = {"quality": (1, 100), "method": (0, 6), "compress_level": (0, 9)}
+TIFF_COMPRESSIONS = ("tiff_deflate", "tiff_lzw", "raw")
+
+# QUOTA DELL'AVANZAMENTO DI UN EXPORT ATTRIBUITA AL RENDER (IL RESTO È LA CODIFICA DEL FILE)
+EXPORT_RENDER_SHARE = 0.8
+
+# FORMATI CHE PIL SA DECODIFICARE GIÀ RIDOTTI (DRAFT): PER GLI ALTRI LA DECODIFICA È SOLO COMPLETA
+DRAFT_FORMATS = ("JPEG",)
+
+
+def imageBytes(image):
+    # MEMORIA OCCUPATA DAI PIXEL DI UN'IMMAGINE PIL (8 BIT PER CANALE)
+    return image.width * image.height * len(image.getbands())
+
+
+class RenderCancelled(Exception):
+    """
+    SOLLEVATA DALLA CALLBACK DI AVANZAMENTO PER INTERROMPERE UN RENDER O UN EXPORT IN CORSO
+    """
+
 
 class ImageEngine:
-    def __init__(self):
+    def __init__(self, historyLimit=HISTORY_LIMIT):
         # IMMAGINE ORIGINALE CARICATA DALL'UTENTE
         self.originalImage = None
 
-        # IMMAGINE IN LAVORAZIONE SU CUI APPLICARE LE MODIFICHE
+        # IMMAGINE IN LAVORAZIONE SU CUI APPLICARE LE MODIFICHE (NON RITAGLIATA: IL RITAGLIO È GEOMETRIA)
         self.workingImage = None
 
         # IMMAGINE ELABORATA CON TUTTI GLI EFFETTI APPLICATI
@@ -16,12 +106,71 @@ class ImageEngine:
         # RIFERIMENTO ALL'IMMAGINE ATTUALE MOSTRATA IN UI
         self.currentImage = None
 
+        # PIRAMIDE DI PROXY RIDOTTI DI WORKINGIMAGE, DAL PIÙ GRANDE (ADATTO AL DISPLAY) AL PIÙ PICCOLO
+        # LE MODIFICHE INTERATTIVE ELABORANO SOLO IL PROXY, LA RISOLUZIONE PIENA SERVE SOLO ALL'EXPORT
+        self.previewPyramid = []
+
+        # RITAGLI DEI LIVELLI DELLA PIRAMIDE GIÀ CALCOLATI: (INDICE LIVELLO, RITAGLIO) -> IMMAGINE
+        # SOLO PER L'ULTIMO RITAGLIO USATO; LETTI DAL THREAD DI RENDER E SCRITTI DA QUELLO DELLA UI, SOTTO LOCK
+        self._croppedLevels = {}
+        self._croppedLock = threading.Lock()
+
+        # AREA IN PIXEL DEL WIDGET DI ANTEPRIMA (AGGIORNATA DALLA UI CON SETDISPLAYSIZE)
+        self.displaySize = (1600, 1200)
+
+        # VERSIONE DELLA PIRAMIDE: IDENTIFICA LA SORGENTE NELLE CHIAVI DELLA CACHE DEGLI STADI
+        self._sourceVersion = 0
+
+        # VERSIONE DELL'IMMAGINE CARICATA (INCREMENTATA A OGNI LOADIMAGE), USATA DALLE CACHE ESTERNE
+        self.imageVersion = 0
+
+        # RISULTATI INTERMEDI DELLA PIPELINE SUI PROXY, CHIAVE = SORGENTE + PARAMETRI DEGLI STADI FINO A QUELLO
+        self.stageCache = LRUCache(STAGE_CACHE_BYTES, sizeOf=imageBytes)
+
+        # LUT 3D COMPILATE DAI PARAMETRI COLORE (MOTORE "lut" ED EXPORT .CUBE)
+        self.lutCache = LRUCache(LUT_CACHE_ENTRIES)
+
+        # VIEWPORT: INGRANDIMENTO RISPETTO ALL'IMMAGINE INTERA (1 = ADATTATA AL DISPLAY) E CENTRO NORMALIZZATO
+        # SULL'IMMAGINE RITAGLIATA. È STATO DI VISUALIZZAZIONE: NON ENTRA NELLA CRONOLOGIA
+        self.viewZoom = 1.0
+        self.viewCenter = (0.5, 0.5)
+
+        # TILE ELABORATI DEL VIEWPORT INGRANDITO, CHIAVE = IMMAGINE, RITAGLIO, RIDUZIONE, PARAMETRI, COORDINATE DEL TILE
+        self.tileCache = LRUCache(TILE_CACHE_BYTES, sizeOf=imageBytes)
+
+        # PERCENTUALI DI HIT VISIBILI NEL RIEPILOGO DELLE PRESTAZIONI
+        tracer.watchCache("stage", self.stageCache)
+        tracer.watchCache("lut", self.lutCache)
+        tracer.watchCache("tile", self.tileCache)
+
+        # MEDIA DEL CONTRASTO DELL'IMMAGINE INTERA USATA DAI TILE: (CHIAVE, MEDIA)
+        self._viewMean = None
+
         # PARAMETRI CORRENTI DI ELABORAZIONE (BRIGHTNESS, CONTRAST, ETC.)
         self.currentParams = self._defaultParams()
 
-        # STACK PER GESTIONE UNDO/REDO
-        self.undoStack = []
-        self.redoStack = []
+        # RITAGLIO CORRENTE COME RETTANGOLO NORMALIZZATO (LEFT, TOP, RIGHT, BOTTOM) IN [0, 1]
+        # RISPETTO ALL'IMMAGINE ORIGINALE; NONE = NESSUN RITAGLIO. È APPLICATO SOLO IN RENDERING
+        self.currentCrop = None
+
+        # CRONOLOGIA UNDO/REDO: UN RECORD COMPATTO PER AZIONE UTENTE, LIMITATA A HISTORYLIMIT STATI
+        self.history = EditHistory(self.currentParams.keys(), capacity=historyLimit)
+        self.history.reset(self.currentParams, self.currentCrop)
+
+        # FILE DA CUI PROVIENE L'IMMAGINE (PER RICARICARE LA PIENA RISOLUZIONE DOPO UNO SCARICAMENTO)
+        self.sourcePath = None
+
+        # CARICAMENTO IN DUE TEMPI: FILE LA CUI DECODIFICA COMPLETA È IN CORSO E BOZZA RIDOTTA INSTALLATA
+        self.loadingPath = None
+        self.isDraft = False
+
+        # MOTORE DI RENDERING: "numpy" (PASSATA UNICA VETTORIALE), "lut" (LUT 3D NATIVA DI PIL) O "pil" (CATENA IMAGEENHANCE)
+        self.renderEngine = "numpy"
+
+        # LOOK OPZIONALE (LUT 3D IMPORTATA DA UN FILE .CUBE) APPLICATO IN CODA ALLA PIPELINE: (NOME, LUT) O NONE
+        # NON FA PARTE DELLA CRONOLOGIA DEI PARAMETRI
+        self.currentLook = None
+        self._lookVersion = 0
 
     def _defaultParams(self):
         # RESTITUISCE I PARAMETRI DI DEFAULT (VALORE NEUTRO = 1.0)
@@ -33,120 +182,892 @@ class ImageEngine:
             "warmth": 1.0
         }
 
-    def _pushState(self):
-        # MEMORIZZA LO STATO CORRENTE NELLO STACK UNDO E RESETTA REDO
-        self.undoStack.append(copy.deepcopy(self.currentParams))
-        self.redoStack.clear()
+    def _commitState(self, label, coalesceKey=None):
+        # REGISTRA IN CRONOLOGIA LO STATO RISULTANTE DA UN'AZIONE UTENTE (UNA SOLA ENTRY PER AZIONE)
+        self.history.record(self.currentParams, self.currentCrop, label, coalesceKey)
 
-    def undo(self):
-        # ESEGUE UN UNDO DEI PARAMETRI E APPLICA ELABORAZIONE
-        if not self.undoStack:
-            return False
+    def _restoreState(self, state):
+        # RIPRISTINA PARAMETRI E RITAGLIO DA UNO STATO DELLA CRONOLOGIA
+        self.currentParams, self.currentCrop = state
 
-        self.redoStack.append(copy.deepcopy(self.currentParams))
-        self.currentParams = self.undoStack.pop()
-        self.applyProcessing(pushState=False)
-        return True
+    def undo(self, render=True):
+        # ESEGUE UN UNDO DEI PARAMETRI E APPLICA ELABORAZIONE (SE RENDER È FALSE L'ELABORAZIONE È A CARICO DEL CHIAMANTE)
+        return self.jumpToState(self.history.position - 1, render) if self.history.canUndo else False
+
+    def redo(self, render=True):
+        # ESEGUE UN REDO DEI PARAMETRI E APPLICA ELABORAZIONE (SE RENDER È FALSE L'ELABORAZIONE È A CARICO DEL CHIAMANTE)
+        return self.jumpToState(self.history.position + 1, render) if self.history.canRedo else False
 
-    def redo(self):
-        # ESEGUE UN REDO DEI PARAMETRI E APPLICA ELABORAZIONE
-        if not self.redoStack:
+    def jumpToState(self, index, render=True):
+        # RIPORTA LE MODIFICHE A UN QUALSIASI STATO DELLA CRONOLOGIA (0 = APERTURA), SENZA PERDERE GLI ALTRI
+        if not 0 <= index < len(self.history):
             return False
 
-        self.undoStack.append(copy.deepcopy(self.currentParams))
-        self.currentParams = self.redoStack.pop()
-        self.applyProcessing(pushState=False)
+        self._restoreState(self.history.jump(index))
+        if render:
+            self.applyProcessing(pushState=False)
         return True
 
-    def loadImage(self, path):
+    def loadImage(self, path, render=True, preview=True):
         # CARICA L'IMMAGINE DAL DISCO E INIZIALIZZA LE IMMAGINI INTERNE
+        # SENZA PREVIEW NON COSTRUISCE LA PIRAMIDE DI PROXY (USO HEADLESS, SOLO EXPORT)
         if not os.path.exists(path):
             return False
 
         try:
-            self.originalImage = Image.open(path).convert("RGB")
-            self.workingImage = self.originalImage.copy()
-            self.currentImage = self.originalImage.copy()
-            self.currentParams = self._defaultParams()
-
-            self.undoStack.clear()
-            self.redoStack.clear()
+            image = self.decodeImage(path)
+        except Exception as e:
+            print(e)
+            return False
 
+        self.sourcePath = path
+        self.loadingPath = None
+        self._installImage(image, resetState=True, preview=preview)
+        if render:
             self.applyProcessing(pushState=False)
-            return True
+        return True
+
+    def beginLoad(self, path):
+        # PRIMA FASE DEL CARICAMENTO IN DUE TEMPI (UI): SE IL FORMATO LO PERMETTE DECODIFICA SUBITO
+        # UNA VERSIONE RIDOTTA (JPEG CON SCALA DCT) E LA INSTALLA COME BOZZA MODIFICABILE
+        # RESTITUISCE TRUE SE C'È UN'IMMAGINE DA MOSTRARE; SE LOADINGPATH RESTA IMPOSTATO,
+        # LA DECODIFICA COMPLETA (DECODEIMAGE) VA ESEGUITA IN BACKGROUND E CONSEGNATA A FINISHLOAD
+        if not os.path.exists(path):
+            return False
+
+        self.sourcePath = path
+        self.loadingPath = path
+        try:
+            # OPEN LEGGE SOLO L'INTESTAZIONE: I FORMATI SENZA DECODIFICA RIDOTTA NON VENGONO TOCCATI QUI
+            with Image.open(path) as probe:
+                if probe.format not in DRAFT_FORMATS:
+                    return False
+                # BASTA LA RISOLUZIONE DEL PRIMO LIVELLO DELLA PIRAMIDE
+                draftSize = self._fitToDisplay(probe.size)
+
+            with tracer.span("load.draft", file=os.path.basename(path)) as fields:
+                image, reduced = self._decode(path, draftSize=draftSize)
+                fields["size"] = image.size
         except Exception as e:
             print(e)
+            self.loadingPath = None
             return False
 
-    def updateParam(self, key, value):
-        # AGGIORNA IL SINGOLO PARAMETRO E MEMORIZZA LO STATO PRECEDENTE
+        if reduced:
+            self._installImage(image, resetState=True)
+            self.isDraft = True
+        else:
+            # FILE GIÀ PICCOLO: LA DECODIFICA È COMPLETA, NON SERVE UNA SECONDA FASE
+            self.loadingPath = None
+            self._installImage(image, resetState=True)
+        return True
+
+    def decodeImage(self, path):
+        # DECODIFICA COMPLETA IN RGB CON ORIENTAMENTO EXIF; NON TOCCA LO STATO (PUÒ GIRARE SU UN THREAD DI LAVORO)
+        # PATH PUÒ ESSERE ANCHE UN FILE GIÀ APERTO O UN BUFFER IN MEMORIA (ES. IMMAGINE RICEVUTA DAL SERVER)
+        name = os.path.basename(path) if isinstance(path, str) else "<memoria>"
+        with tracer.span("load", file=name) as fields:
+            image, _ = self._decode(path)
+            fields["size"] = image.size
+        return image
+
+    def finishLoad(self, path, image):
+        # SECONDA FASE: SOSTITUISCE LA BOZZA CON L'IMMAGINE A PIENA RISOLUZIONE
+        # LE MODIFICHE FATTE SULLA BOZZA (PARAMETRI, RITAGLIO NORMALIZZATO, CRONOLOGIA) RESTANO VALIDE
+        # RESTITUISCE FALSE SE NEL FRATTEMPO È STATO APERTO UN ALTRO FILE
+        if path != self.loadingPath:
+            return False
+
+        self.loadingPath = None
+        self._installImage(image, resetState=not self.isDraft)
+        return True
+
+    def releaseFullResolution(self):
+        # LIBERA IL BUFFER A PIENA RISOLUZIONE (DOCUMENTO INATTIVO) TENENDO PIRAMIDE, ANTEPRIMA E STATO DI MODIFICA
+        # L'ENGINE TORNA UNA BOZZA COSTRUITA SUL PRIMO PROXY: SI PUÒ MOSTRARE E MODIFICARE SUBITO,
+        # LA PIENA RISOLUZIONE SI RICARICA CON BEGINRELOAD + DECODEIMAGE + FINISHLOAD
+        # RESTITUISCE I BYTE LIBERATI
+        if self.isDraft or self.loadingPath or not self.previewPyramid or not self.sourcePath:
+            return 0
+
+        freed = imageBytes(self.originalImage)
+        self.originalImage = self.previewPyramid[0]
+        self.workingImage = self.originalImage
+        self.currentImage = self.processedImage or self.originalImage
+        self.isDraft = True
+        self.stageCache.clear()
+        self.tileCache.clear()
+        return freed
+
+    def resumeDraft(self, path, proxy, historySnapshot):
+        # RIPRESA DI UNA SESSIONE SALVATA: IL PROXY SALVATO DIVENTA LA BOZZA (NESSUNA DECODIFICA DEL FILE)
+        # E CRONOLOGIA, PARAMETRI E RITAGLIO TORNANO COME ALLA CHIUSURA
+        # LA PIENA RISOLUZIONE SI CARICA COME PER UN DOCUMENTO SCARICATO (BEGINRELOAD + DECODEIMAGE + FINISHLOAD)
+        # SOLLEVA VALUEERROR SE LA CRONOLOGIA NON È VALIDA (IN QUEL CASO L'ENGINE NON VIENE TOCCATO)
+        state = self.history.restore(historySnapshot)
+
+        self.sourcePath = path
+        self.loadingPath = None
+        self._installImage(proxy, resetState=False)
+        self.isDraft = True
+        self._restoreState(state)
+
+    def beginReload(self):
+        # PREPARA LA RICARICA DELLA PIENA RISOLUZIONE DI UN DOCUMENTO SCARICATO
+        # RESTITUISCE IL FILE DA DECODIFICARE (NONE SE NON SERVE O È GIÀ IN CORSO)
+        if not self.isDraft or self.loadingPath or not self.sourcePath:
+            return None
+
+        self.loadingPath = self.sourcePath
+        return self.loadingPath
+
+    def memoryBytes(self):
+        # BYTE DI PIXEL TENUTI DALL'ENGINE: IMMAGINI (CONTATE UNA VOLTA SOLA), PIRAMIDE, RITAGLI E CACHE DEGLI STADI
+        images = [self.originalImage, self.workingImage, self.currentImage, self.processedImage]
+        with self._croppedLock:
+            images += self.previewPyramid + list(self._croppedLevels.values())
+        unique = {id(image): image for image in images if image is not None}
+        return (sum(imageBytes(image) for image in unique.values())
+                + self.stageCache.currentSize + self.tileCache.currentSize)
+
+    def _decode(self, path, draftSize=None):
+        # RESTITUISCE (IMMAGINE RGB, RIDOTTA) SENZA COPIE OLTRE ALLA EVENTUALE CONVERSIONE DI MODO
+        # CON DRAFTSIZE IL DECODER JPEG SCALA GIÀ IN DCT (1/2, 1/4, 1/8) RESTANDO ALMENO A QUELLA DIMENSIONE
+        image = Image.open(path)
+        headerSize = image.size
+        if draftSize:
+            image.draft("RGB", draftSize)
+        reduced = image.size != headerSize
+
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        else:
+            image.load()
+
+        # RUOTA SECONDO IL TAG EXIF ORIENTATION (NESSUNA COPIA SE L'IMMAGINE È GIÀ DRITTA)
+        ImageOps.exif_transpose(image, in_place=True)
+        return image, reduced
+
+    def _installImage(self, image, resetState=True, preview=True):
+        # RENDE IMAGE L'IMMAGINE DI LAVORO; CON RESETSTATE AZZERA PARAMETRI, RITAGLIO E CRONOLOGIA
+        self.originalImage = image
+        self.workingImage = self.originalImage
+        self.currentImage = self.originalImage
+        self.isDraft = False
+        self.imageVersion += 1
+
+        if resetState:
+            self.currentParams = self._defaultParams()
+            self.currentCrop = None
+            self.history.reset(self.currentParams, self.currentCrop)
+            self.viewZoom = 1.0
+            self.viewCenter = (0.5, 0.5)
+
+        self.stageCache.clear()
+        self.tileCache.clear()
+        if preview:
+            self._buildPreviewPyramid()
+        else:
+            self.previewPyramid = []
+            self._croppedLevels = {}
+
+    def updateParam(self, key, value, gestureEnd=False):
+        # AGGIORNA IL SINGOLO PARAMETRO E LO REGISTRA IN CRONOLOGIA
+        # RITOCCHI RAVVICINATI DELLO STESSO PARAMETRO DIVENTANO UN SOLO PASSO DI UNDO,
+        # MA CON GESTUREEND (RILASCIO DELLO SLIDER) IL PASSO SI CHIUDE: IL GESTO SUCCESSIVO NE APRE UNO NUOVO
         if key in self.currentParams:
-            self._pushState()
             self.currentParams[key] = value
+            self._commitState(f"{key} = {value:.2f}", coalesceKey=key)
+            if gestureEnd:
+                self.history.endCoalescing()
 
-    def cropFormat(self, ratio):
-        # APPLICA IL RITAGLIO DELL'IMMAGINE IN BASE AL RAPPORTO SPECIFICATO
+    def cropFormat(self, ratio, render=True):
+        # APPLICA IL RITAGLIO CENTRATO CON IL RAPPORTO SPECIFICATO ALL'AREA ATTUALMENTE VISIBILE
+        # MODIFICA SOLO LA GEOMETRIA NELLO STATO: I PIXEL VENGONO RITAGLIATI IN RENDERING
         if not self.workingImage:
             return
 
-        self._pushState()
-
-        width, height = self.workingImage.size
+        imageWidth, imageHeight = self.workingImage.size
+        left, top, right, bottom = self.currentCrop or (0.0, 0.0, 1.0, 1.0)
+        width = (right - left) * imageWidth
+        height = (bottom - top) * imageHeight
         currentRatio = width / height
 
         if currentRatio > ratio:
             # RITAGLIO ORIZZONTALE
-            newWidth = int(height * ratio)
-            offset = (width - newWidth) // 2
-            cropBox = (offset, 0, width - offset, height)
+            inset = (width - height * ratio) / 2 / imageWidth
+            left, right = left + inset, right - inset
         else:
             # RITAGLIO VERTICALE
-            newHeight = int(width / ratio)
-            offset = (height - newHeight) // 2
-            cropBox = (0, offset, width, height - offset)
+            inset = (height - width / ratio) / 2 / imageHeight
+            top, bottom = top + inset, bottom - inset
 
-        self.workingImage = self.workingImage.crop(cropBox)
-        self.applyProcessing(pushState=False)
+        self.currentCrop = (left, top, right, bottom)
+        self._commitState(f"Ritaglio {ratio:.2f}")
+        if render:
+            self.applyProcessing(pushState=False)
 
-    def applyProcessing(self, pushState=True):
-        # APPLICA TUTTI GLI EFFETTI SUI PARAMETRI CORRENTI
+    def resetCrop(self, render=True):
+        # RIMUOVE IL RITAGLIO (OPERAZIONE ANNULLABILE COME LE ALTRE)
+        if not self.workingImage or self.currentCrop is None:
+            return
+
+        self.currentCrop = None
+        self._commitState("Ritaglio rimosso")
+        if render:
+            self.applyProcessing(pushState=False)
+
+    def _cropBox(self, size, crop):
+        # CONVERTE IL RITAGLIO NORMALIZZATO IN UN BOX IN PIXEL ALLA RISOLUZIONE INDICATA
+        width, height = size
+        left, top, right, bottom = crop
+        box = (round(left * width), round(top * height), round(right * width), round(bottom * height))
+        # ALMENO UN PIXEL PER LATO ANCHE SUI PROXY PIÙ PICCOLI
+        return (box[0], box[1], max(box[2], box[0] + 1), max(box[3], box[1] + 1))
+
+    def _applyCrop(self, image, crop):
+        # RITAGLIA L'IMMAGINE INDICATA ALLA SUA RISOLUZIONE (NESSUNA COPIA SENZA RITAGLIO)
+        if crop is None:
+            return image
+        return image.crop(self._cropBox(image.size, crop))
+
+    def setDisplaySize(self, width, height):
+        # AGGIORNA L'AREA DI ANTEPRIMA; RICOSTRUISCE LA PIRAMIDE SOLO SE IL PROXY ATTUALE
+        # È TROPPO PICCOLO PER IL NUOVO DISPLAY O PIÙ DEL DOPPIO DEL NECESSARIO
+        # RESTITUISCE TRUE SE L'ANTEPRIMA VA RIELABORATA
+        self.displaySize = (max(1, int(width)), max(1, int(height)))
+        if not self.previewPyramid:
+            return False
+
+        proxySide = max(self.previewPyramid[0].size)
+        targetSide = max(self._fitToDisplay(self.workingImage.size))
+        if targetSide <= proxySide < targetSide * 2:
+            return False
+
+        self._buildPreviewPyramid()
+        return True
+
+    def _fitToDisplay(self, size):
+        # DIMENSIONI DELL'IMMAGINE RIDIMENSIONATA PER ENTRARE NEL DISPLAY (MAI INGRANDITA)
+        width, height = size
+        scale = min(1.0, self.displaySize[0] / width, self.displaySize[1] / height)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def _buildPreviewPyramid(self):
+        # COSTRUISCE I PROXY: IL PRIMO LIVELLO È GRANDE QUANTO IL DISPLAY,
+        # I SUCCESSIVI DIMEZZANO IL PRECEDENTE FINO A MIN_PROXY_SIDE
+        self.previewPyramid = []
+        self._croppedLevels = {}
+        self._sourceVersion += 1
         if not self.workingImage:
             return
 
-        image = self.workingImage.copy()
+        level = self.workingImage
+        targetSize = self._fitToDisplay(level.size)
+        if targetSize != level.size:
+            # REDUCE (MEDIA A BLOCCHI INTERI) È MOLTO PIÙ ECONOMICO DEL RESAMPLING SULL'IMMAGINE PIENA
+            factor = min(level.size[0] // targetSize[0], level.size[1] // targetSize[1])
+            if factor > 1:
+                level = level.reduce(factor)
+            if level.size != targetSize:
+                level = level.resize(targetSize, Image.Resampling.BILINEAR)
+
+        self.previewPyramid.append(level)
+        while min(level.size) // 2 >= MIN_PROXY_SIDE:
+            level = level.reduce(2)
+            self.previewPyramid.append(level)
+
+    def getPreviewSource(self, maxSide=None):
+        # RESTITUISCE IL PROXY PIÙ PICCOLO CHE HA ALMENO MAXSIDE PIXEL SUL LATO LUNGO, GIÀ RITAGLIATO
+        # SENZA MAXSIDE RESTITUISCE IL LIVELLO ADATTO AL DISPLAY
+        if not self.previewPyramid:
+            return self._applyCrop(self.workingImage, self.currentCrop)
+
+        index = 0
+        if maxSide is not None:
+            for candidate in range(len(self.previewPyramid) - 1, -1, -1):
+                if max(self.previewPyramid[candidate].size) >= maxSide:
+                    index = candidate
+                    break
+
+        return self._croppedLevel(index, self.currentCrop)
+
+    def _croppedLevel(self, index, crop):
+        # RITAGLIA UN LIVELLO DELLA PIRAMIDE ALLA SUA RISOLUZIONE, MEMORIZZANDO IL RISULTATO
+        # COSÌ LA STESSA COMBINAZIONE LIVELLO/RITAGLIO HA SEMPRE LA STESSA IDENTITÀ PER LA CACHE DEGLI STADI
+        level = self.previewPyramid[index]
+        if crop is None:
+            return level
 
-        image = self._applySaturation(image)
-        image = self._applyContrast(image)
-        image = self._applyBrightness(image)
-        image = self._applySharpness(image)
-        image = self._applyWarmth(image)
+        key = (index, crop)
+        with self._croppedLock:
+            cropped = self._croppedLevels.get(key)
+            if cropped is None:
+                # UN RITAGLIO NUOVO SOSTITUISCE I PRECEDENTI: LA MEMORIA RESTA LIMITATA A UN RITAGLIO PER LIVELLO
+                if any(existing != crop for _, existing in self._croppedLevels):
+                    self._croppedLevels = {}
+                cropped = self._applyCrop(level, crop)
+                self._croppedLevels[key] = cropped
+        return cropped
 
+    def setViewport(self, zoom, center=None):
+        # IMPOSTA INGRANDIMENTO (1 = IMMAGINE INTERA) E CENTRO NORMALIZZATO, LIMITATI IN MODO CHE LA REGIONE
+        # VISIBILE RESTI DENTRO L'IMMAGINE; RESTITUISCE TRUE SE IL VIEWPORT È CAMBIATO
+        if not self.workingImage:
+            return False
+
+        zoom = self._clampZoom(zoom)
+        center = (0.5, 0.5) if zoom == 1.0 else self._viewGeometry(zoom, center or self.viewCenter)[3]
+        changed = (zoom, center) != (self.viewZoom, self.viewCenter)
+        self.viewZoom, self.viewCenter = zoom, center
+        return changed
+
+    def zoomViewport(self, factor, anchor=(0.5, 0.5)):
+        # MOLTIPLICA L'INGRANDIMENTO TENENDO FERMO IL PUNTO DELL'IMMAGINE SOTTO ANCHOR
+        # (FRAZIONE DELLA REGIONE VISIBILE, X VERSO DESTRA E Y VERSO IL BASSO, ES. LA POSIZIONE DEL PUNTATORE)
+        if not self.workingImage:
+            return False
+
+        cropBox, _, region, _ = self._viewGeometry(self.viewZoom, self.viewCenter)
+        pointX = region[0] + anchor[0] * (region[2] - region[0])
+        pointY = region[1] + anchor[1] * (region[3] - region[1])
+
+        # LE DIMENSIONI DELLA NUOVA REGIONE NON DIPENDONO DAL CENTRO
+        zoom = self._clampZoom(self.viewZoom * factor)
+        _, _, region, _ = self._viewGeometry(zoom, self.viewCenter)
+        visibleWidth, visibleHeight = region[2] - region[0], region[3] - region[1]
+        center = (
+            (pointX + (0.5 - anchor[0]) * visibleWidth) / (cropBox[2] - cropBox[0]),
+            (pointY + (0.5 - anchor[1]) * visibleHeight) / (cropBox[3] - cropBox[1])
+        )
+        return self.setViewport(zoom, center)
+
+    def panViewport(self, dx, dy):
+        # SPOSTA IL CONTENUTO DI (DX, DY) PIXEL DI SCHERMO (X VERSO DESTRA, Y VERSO IL BASSO) COME UN TRASCINAMENTO
+        if not self.workingImage or self.viewZoom == 1.0:
+            return False
+
+        cropBox, scale, _, center = self._viewGeometry(self.viewZoom, self.viewCenter)
+        return self.setViewport(self.viewZoom, (
+            center[0] - dx / scale / (cropBox[2] - cropBox[0]),
+            center[1] - dy / scale / (cropBox[3] - cropBox[1])
+        ))
+
+    def actualSizeZoom(self):
+        # INGRANDIMENTO CHE MOSTRA L'IMMAGINE AL 100% (UN PIXEL DELL'IMMAGINE PER PIXEL DI SCHERMO)
+        if not self.workingImage:
+            return 1.0
+        return self._clampZoom(1.0 / self._viewGeometry(1.0, self.viewCenter)[1])
+
+    def getViewport(self):
+        # DESCRIVE LA REGIONE VISIBILE DA ELABORARE A TILE, O NONE SE L'IMMAGINE È MOSTRATA INTERA
+        # VA CHIAMATA SUL THREAD PRINCIPALE: IL RISULTATO SI PASSA A RENDERVIEWPORT, ANCHE SU UN THREAD DI LAVORO
+        if not self.workingImage or self.viewZoom == 1.0:
+            return None
+
+        cropBox, scale, region, _ = self._viewGeometry(self.viewZoom, self.viewCenter)
+
+        # RIDUZIONE: LA POTENZA DI 2 PIÙ GRANDE CHE LASCIA ALMENO UN PIXEL ELABORATO PER PIXEL DI SCHERMO
+        factor = 1
+        while factor * 2 * scale <= 1.0:
+            factor *= 2
+
+        width, height = cropBox[2] - cropBox[0], cropBox[3] - cropBox[1]
+        return {
+            "image": self.workingImage,
+            "key": (self.imageVersion, self.currentCrop),
+            "cropBox": cropBox,
+            "factor": factor,
+            # DIMENSIONI DELL'IMMAGINE RITAGLIATA RIDOTTA E REGIONE VISIBILE IN QUELLE COORDINATE
+            "size": (-(-width // factor), -(-height // factor)),
+            "box": (int(region[0] // factor), int(region[1] // factor),
+                    math.ceil(region[2] / factor), math.ceil(region[3] / factor)),
+            # PROXY DELL'IMMAGINE INTERA PER LA MEDIA DEL CONTRASTO (STESSA DELL'ANTEPRIMA NON INGRANDITA)
+            "meanSource": self.getPreviewSource(),
+            "meanKey": (self._sourceVersion, self.currentCrop)
+        }
+
+    def renderViewport(self, view, params):
+        # COMPONE LA REGIONE VISIBILE DAI TILE: SOLO QUELLI NON IN CACHE (ES. ESPOSTI DA UN PAN) VENGONO ELABORATI
+        # I TILE USANO IL MOTORE NUMPY A BANDE (CHE RIPRODUCE LA CATENA PIL) CON LA MEDIA DEL CONTRASTO
+        # DELL'IMMAGINE INTERA, COSÌ TILE ADIACENTI NON MOSTRANO GIUNTE
+        # NON TOCCA GLI ATTRIBUTI DELL'ENGINE: PUÒ GIRARE SU UN THREAD DI LAVORO CON UNA COPIA DEI PARAMETRI
+        # SENZA VIEWPORT (IMMAGINE MOSTRATA INTERA, VEDI GETVIEWPORT) RESTITUISCE NONE
+        if view is None:
+            return None
+
+        left, top, right, bottom = view["box"]
+        mean = self._viewportMean(view, params)
+        look = self.currentLook
+        baseKey = (view["key"], view["factor"], tuple(sorted(params.items())), mean,
+                   self._lookVersion if look is not None else None)
+
+        result = Image.new("RGB", (right - left, bottom - top))
+        with tracer.span("viewport", size=result.size) as fields:
+            rendered = 0
+            for tileY in range(top // TILE_SIZE, (bottom - 1) // TILE_SIZE + 1):
+                for tileX in range(left // TILE_SIZE, (right - 1) // TILE_SIZE + 1):
+                    key = baseKey + ((tileX, tileY),)
+                    tile = self.tileCache.get(key)
+                    if tile is None:
+                        tile = self._renderTile(view, tileX, tileY, params, mean, look)
+                        self.tileCache.put(key, tile)
+                        rendered += 1
+                    result.paste(tile, (tileX * TILE_SIZE - left, tileY * TILE_SIZE - top))
+            fields["tiles"] = rendered
+        return result
+
+    def _clampZoom(self, zoom):
+        # DA 1 (IMMAGINE INTERA) FINO A MAX_VIEW_SCALE PIXEL DI SCHERMO PER PIXEL DELL'IMMAGINE
+        fit = self._viewGeometry(1.0, self.viewCenter)[1]
+        return max(1.0, min(zoom, max(1.0, MAX_VIEW_SCALE / fit)))
+
+    def _viewGeometry(self, zoom, center):
+        # GEOMETRIA DEL VIEWPORT SULL'IMMAGINE DI LAVORO RITAGLIATA: (BOX DEL RITAGLIO IN PIXEL,
+        # PIXEL DI SCHERMO PER PIXEL DELL'IMMAGINE, REGIONE VISIBILE IN PIXEL, CENTRO NORMALIZZATO CORRETTO)
+        size = self.workingImage.size
+        cropBox = self._cropBox(size, self.currentCrop) if self.currentCrop else (0, 0) + size
+        width, height = cropBox[2] - cropBox[0], cropBox[3] - cropBox[1]
+
+        scale = min(self.displaySize[0] / width, self.displaySize[1] / height) * zoom
+        visibleWidth = min(width, self.displaySize[0] / scale)
+        visibleHeight = min(height, self.displaySize[1] / scale)
+
+        # IL CENTRO NON PUÒ PORTARE LA REGIONE FUORI DALL'IMMAGINE
+        centerX = min(max(center[0] * width, visibleWidth / 2), width - visibleWidth / 2)
+        centerY = min(max(center[1] * height, visibleHeight / 2), height - visibleHeight / 2)
+        region = (centerX - visibleWidth / 2, centerY - visibleHeight / 2,
+                  centerX + visibleWidth / 2, centerY + visibleHeight / 2)
+        return cropBox, scale, region, (centerX / width, centerY / height)
+
+    def _viewportMean(self, view, params):
+        # MEDIA DEL CONTRASTO SUL PROXY DELL'IMMAGINE INTERA, RICALCOLATA SOLO SE CAMBIANO SORGENTE O SATURAZIONE
+        if params["contrast"] == 1.0:
+            return 0
+
+        key = (view["meanKey"], params["saturation"])
+        memo = self._viewMean
+        if memo is None or memo[0] != key:
+            memo = (key, self._numpyContrastMean(np.asarray(view["meanSource"]), params))
+            self._viewMean = memo
+        return memo[1]
+
+    def _renderTile(self, view, tileX, tileY, params, mean, look):
+        # ELABORA UN TILE CON UN MARGINE PER IL KERNEL DELLA NITIDEZZA E POI LO SCARTA
+        # AI BORDI DELL'IMMAGINE IL MARGINE MANCA: I PIXEL DI BORDO RESTANO INVARIATI COME NEL RENDER COMPLETO
+        factor = view["factor"]
+        width, height = view["size"]
+        left, top = tileX * TILE_SIZE, tileY * TILE_SIZE
+        right, bottom = min(width, left + TILE_SIZE), min(height, top + TILE_SIZE)
+
+        margin = TILE_MARGIN if params["sharpness"] != 1.0 else 0
+        marginLeft, marginTop = max(0, left - margin), max(0, top - margin)
+        marginRight, marginBottom = min(width, right + margin), min(height, bottom + margin)
+
+        # BOX ALLINEATO AI BLOCCHI DI REDUCE: IL TILE COINCIDE CON LA STESSA ZONA DELL'IMMAGINE INTERA RIDOTTA
+        cropLeft, cropTop, cropRight, cropBottom = view["cropBox"]
+        source = view["image"].crop((
+            cropLeft + marginLeft * factor, cropTop + marginTop * factor,
+            min(cropRight, cropLeft + marginRight * factor), min(cropBottom, cropTop + marginBottom * factor)
+        ))
+        if factor > 1:
+            source = source.reduce(factor)
+
+        tile = self._processNumpy(source, params, mean=mean)
+        tile = tile.crop((left - marginLeft, top - marginTop, right - marginLeft, bottom - marginTop))
+        if look is not None:
+            tile = tile.filter(look[1])
+        return tile
+
+    def applyProcessing(self, pushState=True):
+        # APPLICA TUTTI GLI EFFETTI SUI PARAMETRI CORRENTI AL PROXY DI ANTEPRIMA
+        if not self.workingImage:
+            return
+
+        self.commitPreview(self.renderImage(self.getPreviewSource(), self.currentParams))
+
+    def commitPreview(self, image):
+        # REGISTRA COME ANTEPRIMA CORRENTE UN'IMMAGINE ELABORATA (ANCHE IN BACKGROUND CON RENDERIMAGE)
         self.processedImage = image
         self.currentImage = image
 
-    def _applySaturation(self, image):
+    def renderFullResolution(self):
+        # ELABORA L'IMMAGINE DI LAVORO A PIENA RISOLUZIONE (UNA SOLA VOLTA, AL MOMENTO DELL'EXPORT)
+        # IL RITAGLIO VIENE APPLICATO QUI, ALLA RISOLUZIONE PIENA
+        # LA BOZZA RIDOTTA NON VA MAI ESPORTATA: BISOGNA ATTENDERE LA DECODIFICA COMPLETA
+        if not self.workingImage or self.isDraft:
+            return None
+
+        source = self._applyCrop(self.workingImage, self.currentCrop)
+        return self.renderImage(source, self.currentParams)
+
+    def renderImage(self, image, params, progress=None):
+        # APPLICA I PARAMETRI ALL'IMMAGINE INDICATA CON IL MOTORE SELEZIONATO, SENZA MODIFICARE LO STATO
+        # NON TOCCA GLI ATTRIBUTI DELL'ENGINE: PUÒ GIRARE SU UN THREAD DI LAVORO CON UNA COPIA DEI PARAMETRI
+        # PROGRESS(FRAZIONE) È CHIAMATA DURANTE I RENDER A PIENA RISOLUZIONE E PUÒ SOLLEVARE RENDERCANCELLED
+        sourceKey = self._sourceKey(image)
+        if sourceKey is not None:
+            return self._renderStaged(image, params, sourceKey)
+
+        # RISOLUZIONE PIENA (EXPORT): UNA SOLA ESECUZIONE, NESSUN INTERMEDIO DA RIUSARE
+        return self.renderWith(image, params, self.renderEngine, self.currentLook, progress)
+
+    def renderWith(self, image, params, renderEngine, look, progress=None):
+        # COME RENDERIMAGE FUORI DALLA PIRAMIDE, MA CON MOTORE E LOOK (NOME, LUT) O NONE PASSATI DAL CHIAMANTE:
+        # UN LAVORO IN BACKGROUND USA LO STATO LETTO QUANDO È STATO PROGRAMMATO, NON QUELLO DEL MOMENTO IN CUI GIRA
+        with tracer.span("render." + renderEngine, size=image.size):
+            if renderEngine == "numpy":
+                result = self._processNumpy(image, params, progress=progress)
+            elif renderEngine == "lut":
+                result = self._processLut(image, params, progress=progress)
+            else:
+                result = self._processPil(image, params, progress=progress)
+
+        if look is not None:
+            with tracer.span("look", size=image.size):
+                result = result.filter(look[1])
+        return result
+
+    def setLook(self, name, lut):
+        # IMPOSTA (O CON LUT=NONE RIMUOVE) IL LOOK APPLICATO DOPO GLI ALTRI EFFETTI
+        self.currentLook = (name, lut) if lut is not None else None
+        self._lookVersion += 1
+
+    def colorLut(self, params, mean, includeWarmth=True, size=LUT_SIZE):
+        # COMPILA SATURAZIONE, CONTRASTO (VERSO LA MEDIA DATA), LUMINOSITÀ E TEMPERATURA IN UNA LUT 3D
+        # I NODI DEL CUBO PASSANO DALLE STESSE FUNZIONI DEL MOTORE NUMPY: STESSI ARROTONDAMENTI E CLIP
+        # TRA UN NODO E L'ALTRO LA LUT INTERPOLA: CON PARAMETRI CHE PORTANO MOLTI COLORI AL CLIP LO SCARTO
+        # DAL RIFERIMENTO CRESCE (DECINE DI LIVELLI CON TUTTI I PARAMETRI AL MASSIMO), VEDI LUTERROR E LUT_TOLERANCE
+        values = (params["saturation"], params["contrast"], params["brightness"])
+        warmth = params["warmth"] if includeWarmth else 1.0
+        key = (values, warmth, mean, size)
+
+        lut = self.lutCache.get(key)
+        if lut is None:
+            axis = np.linspace(0.0, 255.0, size, dtype=np.float32)
+            # ORDINE DEI NODI RICHIESTO DA COLOR3DLUT: IL ROSSO VARIA PIÙ VELOCEMENTE, POI VERDE, POI BLU
+            blue, green, red = np.meshgrid(axis, axis, axis, indexing="ij")
+            nodes = np.stack([red, green, blue], axis=-1).reshape(-1, 3)
+
+            self._numpyColor(nodes, params, mean)
+            self._numpyWarmth(nodes, warmth)
+            lut = ImageFilter.Color3DLUT(size, nodes / 255.0, channels=3)
+            self.lutCache.put(key, lut)
+        return lut
+
+    def lutError(self, params, mean, includeWarmth=True, size=LUT_SIZE):
+        # SCARTO MASSIMO (LIVELLI) TRA LA LUT DEI PARAMETRI E IL MOTORE NUMPY, MISURATO AL CENTRO DELLE CELLE
+        # DEL CUBO (DOVE L'INTERPOLAZIONE SBAGLIA DI PIÙ); MEMORIZZATO INSIEME ALLE LUT
+        warmth = params["warmth"] if includeWarmth else 1.0
+        key = ("error", (params["saturation"], params["contrast"], params["brightness"]), warmth, mean, size)
+
+        error = self.lutCache.get(key)
+        if error is None:
+            centers = np.rint((np.arange(size - 1, dtype=np.float32) + 0.5) * 255.0 / (size - 1))
+            blue, green, red = np.meshgrid(centers, centers, centers, indexing="ij")
+            points = np.stack([red, green, blue], axis=-1).reshape(1, -1, 3)
+
+            sample = Image.fromarray(points.astype(np.uint8), "RGB")
+            interpolated = np.asarray(sample.filter(self.colorLut(params, mean, includeWarmth, size)), dtype=np.float32)
+
+            reference = points.reshape(-1, 3).copy()
+            self._numpyColor(reference, params, mean)
+            self._numpyWarmth(reference, warmth)
+            np.trunc(reference, out=reference)
+
+            error = int(np.abs(interpolated.reshape(-1, 3) - reference).max())
+            self.lutCache.put(key, error)
+        return error
+
+    def luminanceMean(self, image, saturation=1.0):
+        # MEDIA DELLA LUMINANZA ARROTONDATA COME IN IMAGEENHANCE.CONTRAST, SULL'IMMAGINE GIÀ SATURATA
+        # (I TRONCAMENTI DELLA SATURAZIONE SPOSTANO LA MEDIA DI UN LIVELLO: SERVE L'IMMAGINE VERA)
+        if saturation != 1.0:
+            image = ImageEnhance.Color(image).enhance(saturation)
+        histogram = image.convert("L").histogram()
+        total = sum(histogram)
+        return int(sum(level * count for level, count in enumerate(histogram)) / total + 0.5) if total else 0
+
+    def exportImage(self, source, params, crop, path, fmt, options=None, progress=None):
+        # RENDER A PIENA RISOLUZIONE E CODIFICA SU FILE; RICEVE UNA COPIA DELLO STATO E NON LO MODIFICA,
+        # QUINDI PUÒ GIRARE IN BACKGROUND MENTRE L'UTENTE CONTINUA A LAVORARE
+        # IL FILE VIENE SCRITTO IN UN TEMPORANEO E RINOMINATO SOLO A CODIFICA COMPLETA (MAI FILE TRONCATI)
+        report = progress or (lambda fraction: None)
+
+        with tracer.span("export", format=fmt) as fields:
+            image = self.renderImage(
+                self._applyCrop(source, crop), params,
+                progress=lambda fraction: report(fraction * EXPORT_RENDER_SHARE)
+            )
+            fields["size"] = image.size
+            report(EXPORT_RENDER_SHARE)
+
+            # TEMPORANEO NASCOSTO NELLA STESSA CARTELLA (STESSO FILESYSTEM PER IL RENAME, PERMESSI DI DEFAULT)
+            directory, name = os.path.split(os.path.abspath(path))
+            tempPath = os.path.join(directory, f".{name}.part{os.path.splitext(name)[1]}")
+            try:
+                with tracer.span("export.encode", format=fmt):
+                    image.save(tempPath, fmt, **(options or EXPORT_OPTIONS.get(fmt, {})))
+                # ULTIMA OCCASIONE DI ANNULLARE: LA CODIFICA PIL NON È INTERROMPIBILE
+                report(1.0)
+                os.replace(tempPath, path)
+            except BaseException:
+                if os.path.exists(tempPath):
+                    os.remove(tempPath)
+                raise
+        return path
+
+    def _sourceKey(self, image):
+        # IDENTIFICA UN LIVELLO DELLA PIRAMIDE (VERSIONE, INDICE, RITAGLIO); NONE PER IMMAGINI FUORI DALLA PIRAMIDE
+        for index, level in enumerate(self.previewPyramid):
+            if level is image:
+                return (self._sourceVersion, index, None)
+
+        with self._croppedLock:
+            croppedLevels = list(self._croppedLevels.items())
+        for (index, crop), level in croppedLevels:
+            if level is image:
+                return (self._sourceVersion, index, crop)
+        return None
+
+    def _pipelineStages(self):
+        # STADI DEL MOTORE CORRENTE: (NOME, PARAMETRI LETTI, FUNZIONE(IMMAGINE, PARAMETRI))
+        if self.renderEngine == "numpy":
+            return [
+                ("color", ("saturation", "contrast", "brightness"), partial(self._processNumpy, steps=("color",))),
+                ("sharpness", ("sharpness",), partial(self._processNumpy, steps=("sharpness",))),
+                ("warmth", ("warmth",), partial(self._processNumpy, steps=("warmth",)))
+            ]
+        if self.renderEngine == "lut":
+            return [
+                ("color", ("saturation", "contrast", "brightness"), self._applyColorLut),
+                ("sharpness", ("sharpness",), self._applySharpness),
+                ("warmth", ("warmth",), self._applyWarmth)
+            ]
+        return [
+            ("saturation", ("saturation",), self._applySaturation),
+            ("contrast", ("contrast",), self._applyContrast),
+            ("brightness", ("brightness",), self._applyBrightness),
+            ("sharpness", ("sharpness",), self._applySharpness),
+            ("warmth", ("warmth",), self._applyWarmth)
+        ]
+
+    def _renderStaged(self, image, params, sourceKey):
+        # ESEGUE LA PIPELINE STADIO PER STADIO RIUSANDO GLI INTERMEDI IN CACHE
+        # LA CHIAVE DI OGNI STADIO CONTIENE LA SORGENTE E I PARAMETRI DI TUTTI GLI STADI FINO A QUELLO:
+        # SE CAMBIA SOLO L'ULTIMO PARAMETRO, SI RIESEGUE SOLO L'ULTIMO STADIO
+        # GLI STADI NEUTRI (PARAMETRI A 1.0) SONO SALTATI E NON ENTRANO NELLA CHIAVE
+        stageKey = (sourceKey, self.renderEngine)
+        activeStages = []
+        for name, keys, function in self._pipelineStages():
+            values = tuple(params[key] for key in keys)
+            if all(value == 1.0 for value in values):
+                continue
+            stageKey = stageKey + ((name, values),)
+            activeStages.append((stageKey, function))
+
+        look = self.currentLook
+        if look is not None:
+            stageKey = stageKey + (("look", self._lookVersion),)
+            activeStages.append((stageKey, lambda result, params: result.filter(look[1])))
+
+        # RIPARTE DAL PREFISSO PIÙ LUNGO GIÀ PRESENTE IN CACHE
+        result = image
+        start = 0
+        for index in range(len(activeStages) - 1, -1, -1):
+            if activeStages[index][0] in self.stageCache:
+                cached = self.stageCache.get(activeStages[index][0])
+                if cached is not None:
+                    result, start = cached, index + 1
+                break
+
+        for stageKey, function in activeStages[start:]:
+            cached = self.stageCache.get(stageKey)
+            if cached is None:
+                with tracer.span("stage." + stageKey[-1][0], size=image.size):
+                    cached = function(result, params)
+                self.stageCache.put(stageKey, cached)
+            result = cached
+
+        return result
+
+    def _processPil(self, image, params, progress=None):
+        # CATENA DI RIFERIMENTO: UNA NUOVA IMMAGINE 8-BIT PER OGNI EFFETTO
+        steps = (self._applySaturation, self._applyContrast, self._applyBrightness,
+                 self._applySharpness, self._applyWarmth)
+        for index, step in enumerate(steps):
+            image = step(image, params)
+            if progress:
+                progress((index + 1) / len(steps))
+        return image
+
+    def _processLut(self, image, params, progress=None):
+        # SENZA NITIDEZZA TUTTA LA CATENA È UNA SOLA LUT (UNA PASSATA NATIVA); ALTRIMENTI LA NITIDEZZA
+        # VA APPLICATA TRA I COLORI E LA TEMPERATURA, COME NELLA CATENA DI RIFERIMENTO
+        if params["sharpness"] == 1.0:
+            image = self._applyColorLut(image, params, includeWarmth=True)
+            if progress:
+                progress(1.0)
+            return image
+
+        steps = (self._applyColorLut, self._applySharpness, self._applyWarmth)
+        for index, step in enumerate(steps):
+            image = step(image, params)
+            if progress:
+                progress((index + 1) / len(steps))
+        return image
+
+    def _applyColorLut(self, image, params, includeWarmth=False):
+        # SATURAZIONE, CONTRASTO E LUMINOSITÀ (PIÙ LA TEMPERATURA, SE RICHIESTA) IN UNA SOLA PASSATA COLOR3DLUT
+        if all(params[key] == 1.0 for key in ("saturation", "contrast", "brightness")) and (
+                not includeWarmth or params["warmth"] == 1.0):
+            return image
+
+        mean = self.luminanceMean(image, params["saturation"]) if params["contrast"] != 1.0 else 0
+
+        # NITIDEZZA E TEMPERATURA APPLICATE DOPO LA LUT AMPLIFICANO IL SUO SCARTO: LA SOGLIA SI RIDUCE DI CONSEGUENZA
+        gain = max(1.0, 2.0 * params["sharpness"] - 1.0)
+        if not includeWarmth:
+            gain *= max(1.0, params["warmth"], 2.0 - params["warmth"])
+        if self.lutError(params, mean, includeWarmth) * gain > LUT_MAX_ERROR:
+            # LUT TROPPO LONTANA DAL RIFERIMENTO PER QUESTI PARAMETRI: STESSO STADIO CON IL MOTORE NUMPY
+            return self._processNumpy(image, params, steps=("color", "warmth") if includeWarmth else ("color",))
+        return image.filter(self.colorLut(params, mean, includeWarmth))
+
+    def _processNumpy(self, image, params, steps=NUMPY_STEPS, progress=None, mean=None):
+        # CONVERTE L'IMMAGINE IN ARRAY UNA SOLA VOLTA E APPLICA TUTTI GLI EFFETTI IN UN'UNICA PASSATA
+        # LAVORA A BANDE ORIZZONTALI IN FLOAT32 PER RESTARE IN CACHE E NON ALLOCARE IMMAGINI INTERMEDIE
+        # RIPRODUCE LA CATENA PIL (SATURAZIONE, CONTRASTO, LUMINOSITÀ, NITIDEZZA, TEMPERATURA) PIXEL PER PIXEL
+        # STEPS LIMITA LA PASSATA AD ALCUNI STADI (USATO DALLA PIPELINE A STADI CON CACHE)
+        # MEAN IMPONE LA MEDIA DEL CONTRASTO (TILE DEL VIEWPORT: QUELLA DELL'IMMAGINE INTERA)
+        source = np.asarray(image)
+        output = np.empty_like(source)
+        height = source.shape[0]
+
+        # LA MEDIA DEL CONTRASTO È GLOBALE: VA CALCOLATA PRIMA DI ELABORARE LE BANDE
+        if mean is None:
+            mean = self._numpyContrastMean(source, params) if "color" in steps else 0
+
+        for top in range(0, height, BAND_ROWS):
+            bottom = min(height, top + BAND_ROWS)
+
+            # UNA RIGA DI MARGINE SOPRA E SOTTO PER IL KERNEL 3X3 DELLA NITIDEZZA
+            marginTop = max(0, top - 1)
+            marginBottom = min(height, bottom + 1)
+
+            band = source[marginTop:marginBottom].astype(np.float32)
+            if "color" in steps:
+                self._numpyColor(band, params, mean)
+            if "sharpness" in steps:
+                self._numpySharpness(band, params["sharpness"])
+            if "warmth" in steps:
+                self._numpyWarmth(band, params["warmth"])
+
+            offset = top - marginTop
+            output[top:bottom] = band[offset:offset + bottom - top]
+
+            if progress:
+                progress(bottom / height)
+
+        return Image.fromarray(output, "RGB")
+
+    def _numpyContrastMean(self, source, params):
+        # MEDIA DELLA LUMINANZA DOPO LA SATURAZIONE, ARROTONDATA COME IN IMAGEENHANCE.CONTRAST
+        if params["contrast"] == 1.0:
+            return 0
+
+        total = 0.0
+        for top in range(0, source.shape[0], BAND_ROWS):
+            band = source[top:top + BAND_ROWS].astype(np.float32)
+            self._numpySaturation(band, params["saturation"])
+            total += float(self._numpyLuma(band).sum())
+
+        return int(total / (source.shape[0] * source.shape[1]) + 0.5)
+
+    def _numpyLuma(self, band):
+        # LUMINANZA INTERA COME LA CONVERSIONE "L" DI PIL: (PESI . P + 0X8000) >> 16
+        # I PRODOTTI RESTANO SOTTO 2^24, QUINDI IL CALCOLO IN FLOAT32 È ESATTO
+        luma = band @ LUMA_WEIGHTS
+        luma += LUMA_ROUNDING
+        luma /= LUMA_SCALE
+        return np.floor(luma, out=luma)
+
+    def _numpyBlend(self, band, degenerate, factor):
+        # IMAGE.BLEND DI PIL: DEGENERATE + FACTOR * (P - DEGENERATE) IN FLOAT32, CLIP E TRONCAMENTO A INTERO
+        band -= degenerate
+        band *= np.float32(factor)
+        band += degenerate
+        np.clip(band, 0.0, 255.0, out=band)
+        np.trunc(band, out=band)
+
+    def _numpySaturation(self, band, saturation):
+        # IMAGEENHANCE.COLOR: BLEND DALLA VERSIONE IN SCALA DI GRIGI (LUMINANZA INTERA) VERSO L'ORIGINALE
+        if saturation == 1.0:
+            return
+
+        self._numpyBlend(band, self._numpyLuma(band)[..., np.newaxis], saturation)
+
+    def _numpyColor(self, band, params, mean):
+        # SATURAZIONE, CONTRASTO (BLEND VERSO LA MEDIA) E LUMINOSITÀ (BLEND DAL NERO) IN SEQUENZA:
+        # OGNI STADIO TRONCA A INTERO COME I BLEND DI PIL, COSÌ IL RISULTATO COINCIDE CON LA CATENA DI RIFERIMENTO
+        self._numpySaturation(band, params["saturation"])
+
+        if params["contrast"] != 1.0:
+            self._numpyBlend(band, np.float32(mean), params["contrast"])
+
+        if params["brightness"] != 1.0:
+            self._numpyBlend(band, np.float32(0.0), params["brightness"])
+
+    def _numpySharpness(self, band, sharpness):
+        # FILTRO SMOOTH 3X3 (PESO CENTRALE 5, TOTALE 13) SUI SOLI PIXEL INTERNI, BORDI INVARIATI COME IN PIL
+        if sharpness == 1.0 or band.shape[0] < 3 or band.shape[1] < 3:
+            return
+
+        rows = band[:-2] + band[1:-1] + band[2:]
+        smooth = rows[:, :-2] + rows[:, 1:-1] + rows[:, 2:]
+        inner = band[1:-1, 1:-1]
+        smooth += 4.0 * inner
+        smooth /= 13.0
+        np.rint(smooth, out=smooth)
+
+        inner -= smooth
+        inner *= np.float32(sharpness)
+        inner += smooth
+        np.clip(band, 0.0, 255.0, out=band)
+        np.trunc(band, out=band)
+
+    def _numpyWarmth(self, band, warmth):
+        # TEMPERATURA: SCALA IL ROSSO E COMPENSA IL BLU, IN DOPPIA PRECISIONE E TRONCANDO COME INT() IN _APPLYWARMTH
+        if warmth == 1.0:
+            return
+
+        for channel, factor in ((0, warmth), (2, 2.0 - warmth)):
+            band[..., channel] = np.trunc(band[..., channel] * np.float64(factor))
+        np.clip(band, 0.0, 255.0, out=band)
+
+    def _applySaturation(self, image, params):
         # APPLICA SATURAZIONE SULL'IMMAGINE
-        value = self.currentParams["saturation"]
+        value = params["saturation"]
         return ImageEnhance.Color(image).enhance(value)
 
-    def _applyContrast(self, image):
+    def _applyContrast(self, image, params):
         # APPLICA CONTRASTO SULL'IMMAGINE
-        value = self.currentParams["contrast"]
+        value = params["contrast"]
         return ImageEnhance.Contrast(image).enhance(value)
 
-    def _applyBrightness(self, image):
+    def _applyBrightness(self, image, params):
         # APPLICA LUMINOSITÀ SULL'IMMAGINE
-        value = self.currentParams["brightness"]
+        value = params["brightness"]
         return ImageEnhance.Brightness(image).enhance(value)
 
-    def _applySharpness(self, image):
+    def _applySharpness(self, image, params):
         # APPLICA NITIDEZZA SULL'IMMAGINE
-        value = self.currentParams["sharpness"]
+        value = params["sharpness"]
         return ImageEnhance.Sharpness(image).enhance(value)
 
-    def _applyWarmth(self, image):
+    def _applyWarmth(self, image, params):
         # APPLICA TEMPERATURA CALDA/FREDDA SULL'IMMAGINE
-        value = self.currentParams["warmth"]
+        value = params["warmth"]
         if value == 1.0:
             return image
 
@@ -163,13 +1084,12 @@ class ImageEngine:
             self.processedImage.save(path, "PNG")
         return path
 
-    def updateParamsBatch(self, changes: dict):
-        # AGGIORNA MULTIPLI PARAMETRI IN BLOCCO E MEMORIZZA STATO PRECEDENTE
+    def updateParamsBatch(self, changes: dict, label="Modifica"):
+        # AGGIORNA MULTIPLI PARAMETRI IN BLOCCO (PROMPT, PRESET) COME UN UNICO PASSO DI CRONOLOGIA
         if not changes:
             return
 
-        self._pushState()
-
         for key, value in changes.items():
             if key in self.currentParams:
                 self.currentParams[key] = value
+        self._commitState(label)
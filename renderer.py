@@ -0,0 +1,86 @@
+from functools import partial
+import threading
+
+
+class RenderScheduler:
+    """
+    ESEGUE I RENDER SU UN THREAD DI LAVORO DEDICATO PER NON BLOCCARE LA UI
+    PER OGNI CANALE TIENE SOLO LA RICHIESTA PIÙ RECENTE: QUELLE ANCORA IN ATTESA VENGONO
+    SOSTITUITE (LATEST-WINS) E I RISULTATI GIÀ SUPERATI NON VENGONO CONSEGNATI
+    """
+    def __init__(self, dispatch):
+        # FUNZIONE CHE ESEGUE UNA CALLBACK SUL THREAD PRINCIPALE (NELLA UI: CLOCK.SCHEDULE_ONCE)
+        self.dispatch = dispatch
+
+        # RICHIESTE IN ATTESA: CANALE -> (GENERAZIONE, JOB, CALLBACK)
+        self._pending = {}
+
+        # ULTIMA GENERAZIONE RICHIESTA PER OGNI CANALE (I RISULTATI PIÙ VECCHI SONO SCARTATI)
+        self._latest = {}
+
+        self._generation = 0
+        self._stopped = False
+        self._condition = threading.Condition()
+
+        self._thread = threading.Thread(target=self._run, name="RenderWorker", daemon=True)
+        self._thread.start()
+
+    def submit(self, job, onDone, channel="preview"):
+        """
+        ACCODA UN JOB SUL CANALE INDICATO, SOSTITUENDO L'EVENTUALE RICHIESTA IN ATTESA
+        ONDONE(RISULTATO) VIENE CHIAMATA SUL THREAD PRINCIPALE SOLO SE NEL FRATTEMPO
+        NON È ARRIVATA UNA RICHIESTA PIÙ RECENTE SULLO STESSO CANALE
+        """
+        with self._condition:
+            self._generation += 1
+            self._latest[channel] = self._generation
+            self._pending[channel] = (self._generation, job, onDone)
+            self._condition.notify()
+            return self._generation
+
+    def cancel(self, channel="preview"):
+        """
+        ANNULLA LA RICHIESTA IN ATTESA E SCARTA IL RISULTATO DI QUELLA IN CORSO SUL CANALE
+        """
+        with self._condition:
+            self._pending.pop(channel, None)
+            self._generation += 1
+            self._latest[channel] = self._generation
+
+    def stop(self):
+        """
+        FERMA IL THREAD DI LAVORO (LE RICHIESTE IN ATTESA VENGONO SCARTATE)
+        """
+        with self._condition:
+            self._stopped = True
+            self._pending.clear()
+            self._condition.notify()
+
+    # --- METODI PRIVATI ---
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+
+                # I CANALI VENGONO SERVITI NELL'ORDINE IN CUI SONO STATI RICHIESTI
+                channel = next(iter(self._pending))
+                generation, job, onDone = self._pending.pop(channel)
+
+            try:
+                result = job()
+            except Exception as e:
+                print(f"ERRORE NEL RENDER IN BACKGROUND: {e}")
+                continue
+
+            self.dispatch(partial(self._deliver, channel, generation, result, onDone))
+
+    def _deliver(self, channel, generation, result, onDone):
+        # ESEGUITA SUL THREAD PRINCIPALE: CONSEGNA SOLO IL RISULTATO DELLA RICHIESTA PIÙ RECENTE
+        with self._condition:
+            if self._latest.get(channel) != generation:
+                return
+        onDone(result)
@@ -0,0 +1,401 @@
+"""
+SERVIZIO DI RENDER LOCALE SENZA INTERFACCIA GRAFICA (NESSUN IMPORT DI KIVY)
+RICEVE UN'IMMAGINE CON UN PROMPT, UN PRESET O DEI PARAMETRI E RESTITUISCE L'IMMAGINE ELABORATA
+IL LAVORO GIRA SU UN POOL DI PROCESSI GIÀ INIZIALIZZATI (ENGINE, INTERPRETER E PRESET PRONTI)
+
+ESEMPI:
+    python server.py --port 8765 --workers 4
+    python server.py --socket /tmp/promptvision.sock
+
+    curl --data-binary @foto.jpg "http://127.0.0.1:8765/render?prompt=più%20luminosa&format=jpg" -o out.jpg
+    curl --data-binary @foto.jpg "http://127.0.0.1:8765/render?preset=Vintage&contrast=1.2" -o out.png
+    curl --unix-socket /tmp/promptvision.sock "http://localhost/metrics"
+
+API:
+    POST /render    CORPO: BYTE DELL'IMMAGINE; QUERY: prompt, preset, format (default png) E I NOMI DEI
+                    PARAMETRI (brightness=1.2 ...). I PARAMETRI ESPLICITI SI APPLICANO DOPO IL PRESET E PRIMA DEL PROMPT
+                    RISPOSTA: IMMAGINE, CON I TEMPI DELLE FASI NELL'INTESTAZIONE SERVER-TIMING
+    GET  /metrics   CONTATORI E TEMPI (P50/P95/MAX) DELLE ULTIME RICHIESTE, IN JSON
+    GET  /health    STATO DEL SERVIZIO
+"""
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+from PIL import Image
+
+from batch import parseParamValue, resolveParams
+from imagestats import computeStatistics
+from interpreter import NaturalLanguageInterpreter
+from processor import ImageEngine, EXPORT_FORMATS, EXPORT_OPTIONS
+from tracing import tracer
+from utils import UtilsManager
+
+# PORTA DI DEFAULT (IL SERVIZIO ASCOLTA SOLO SU 127.0.0.1)
+DEFAULT_PORT = 8765
+
+# RICHIESTE CHE POSSONO ATTENDERE UN PROCESSO LIBERO OLTRE A QUELLE IN LAVORAZIONE (POI RISPOSTA 503)
+DEFAULT_QUEUE_SIZE = 8
+
+# DIMENSIONE MASSIMA DELL'IMMAGINE RICEVUTA (BYTE)
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+
+# BLOCCHI IN CUI SI SCARTA IL CORPO DI UNA RICHIESTA RIFIUTATA (BYTE)
+DISCARD_CHUNK_BYTES = 64 * 1024
+
+# TEMPO MASSIMO DI UNA RICHIESTA, ATTESA IN CODA COMPRESA (SECONDI)
+DEFAULT_TIMEOUT = 60.0
+
+# ATTESA MASSIMA PERCHÉ TUTTI I PROCESSI SI PRESENTINO AL RISCALDAMENTO (SECONDI)
+WARM_UP_TIMEOUT = 60.0
+
+# TIPI MIME DEI FORMATI DI USCITA
+CONTENT_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "TIFF": "image/tiff"
+}
+
+# OGGETTI RIUSATI DA TUTTE LE RICHIESTE SERVITE DALLO STESSO PROCESSO DI LAVORO
+_workerEngine = None
+_workerInterpreter = None
+_workerUtils = None
+_workerBarrier = None
+
+
+def _initWorker(presetFile, barrier):
+    # INIZIALIZZA UNA SOLA VOLTA PER PROCESSO ENGINE, INTERPRETER (REGEX COMPILATA) E ARCHIVIO DEI PRESET
+    global _workerEngine, _workerInterpreter, _workerUtils, _workerBarrier
+    _workerEngine = ImageEngine()
+    _workerInterpreter = NaturalLanguageInterpreter()
+    _workerUtils = UtilsManager(presetFile)
+    _workerBarrier = barrier
+
+
+def _warmUp():
+    # ATTENDE CHE OGNI PROCESSO ABBIA PRESO UNO DEI TASK DI RISCALDAMENTO: UN PROCESSO BLOCCATO QUI NON PUÒ
+    # PRENDERNE UN ALTRO, QUINDI I TASK FINISCONO SU PROCESSI DISTINTI, TUTTI AVVIATI E INIZIALIZZATI
+    _workerBarrier.wait(WARM_UP_TIMEOUT)
+    return os.getpid()
+
+
+def renderRequest(data, presetName, prompt, overrides, fmt):
+    """
+    ESEGUITA NEL POOL: DECODIFICA, RISOLVE I PARAMETRI, ELABORA E CODIFICA UNA SINGOLA IMMAGINE
+    RESTITUISCE (BYTE CODIFICATI, PARAMETRI APPLICATI, TEMPI DELLE FASI IN MS)
+    SOLLEVA VALUEERROR (RICHIESTA O IMMAGINE NON VALIDA) O IMAGE.DECOMPRESSIONBOMBERROR (IMMAGINE TROPPO GRANDE)
+    """
+    engine = _workerEngine or ImageEngine()
+    timings = {}
+
+    start = time.perf_counter()
+    try:
+        image = engine.decodeImage(io.BytesIO(data))
+    except Image.DecompressionBombError:
+        raise
+    except Exception as e:
+        # I DECODER DI PIL SOLLEVANO ECCEZIONI DI TIPI DIVERSI: SONO TUTTE ERRORI DEL CLIENT
+        raise ValueError(f"immagine non leggibile: {e}")
+    timings["decode"] = (time.perf_counter() - start) * 1000.0
+
+    start = time.perf_counter()
+    params = resolveParams(
+        presetName, prompt, overrides=overrides,
+        interpreter=_workerInterpreter, utils=_workerUtils, statistics=lambda: computeStatistics(image)
+    )
+    timings["params"] = (time.perf_counter() - start) * 1000.0
+
+    start = time.perf_counter()
+    rendered = engine.renderImage(image, params)
+    timings["render"] = (time.perf_counter() - start) * 1000.0
+
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    rendered.save(buffer, fmt, **EXPORT_OPTIONS.get(fmt, {}))
+    timings["encode"] = (time.perf_counter() - start) * 1000.0
+
+    return buffer.getvalue(), params, timings
+
+
+class RenderService:
+    """
+    POOL DI PROCESSI DI RENDER CON CODA LIMITATA: OLTRE WORKERS + QUEUESIZE RICHIESTE CONTEMPORANEE
+    LE NUOVE VENGONO RIFIUTATE SUBITO (BACKPRESSURE) INVECE DI ACCUMULARE IMMAGINI IN MEMORIA
+    I TEMPI DI OGNI RICHIESTA FINISCONO NEL TRACER CON PREFISSO "SERVER."
+    """
+    def __init__(self, workers=None, queueSize=DEFAULT_QUEUE_SIZE, timeout=DEFAULT_TIMEOUT, presetFile="presets.json"):
+        self.workers = workers or os.cpu_count() or 1
+        self.queueSize = queueSize
+        self.timeout = timeout
+        self._warmUpBarrier = multiprocessing.Barrier(self.workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_initWorker, initargs=(presetFile, self._warmUpBarrier)
+        )
+
+        # UN POSTO PER OGNI RICHIESTA AMMESSA (IN LAVORAZIONE O IN CODA), LIBERATO SOLO QUANDO IL SUO TASK
+        # NEL POOL È DAVVERO FINITO: UN TASK OLTRE IL TIMEOUT CONTINUA A OCCUPARE UN PROCESSO E IL SUO POSTO
+        self._slots = threading.BoundedSemaphore(self.workers + queueSize)
+
+        self._lock = threading.Lock()
+        self.counters = {"completed": 0, "rejected": 0, "failed": 0, "timedOut": 0, "inFlight": 0}
+
+    def warmUp(self):
+        """
+        AVVIA E INIZIALIZZA SUBITO TUTTI I PROCESSI, COSÌ LA PRIMA RICHIESTA NON PAGA IMPORT E COSTRUZIONE
+        RESTITUISCE IL NUMERO DI PROCESSI PRONTI (SOLLEVA BROKENBARRIERERROR SE NON SI PRESENTANO ENTRO
+        WARM_UP_TIMEOUT)
+        """
+        futures = [self.executor.submit(_warmUp) for _ in range(self.workers)]
+        return len({future.result() for future in futures})
+
+    def acquire(self):
+        """
+        PRENOTA UN POSTO PER UNA NUOVA RICHIESTA; FALSE SE IL SERVIZIO È SATURO
+        """
+        if self._slots.acquire(blocking=False):
+            self._count("inFlight", 1)
+            return True
+        self._count("rejected", 1)
+        return False
+
+    def release(self):
+        self._count("inFlight", -1)
+        self._slots.release()
+
+    def render(self, data, presetName=None, prompt=None, overrides=None, fmt="PNG"):
+        """
+        ELABORA UNA RICHIESTA GIÀ AMMESSA CON ACQUIRE (BLOCCA IL THREAD DELLA CONNESSIONE, NON IL SERVIZIO)
+        IL POSTO PRENOTATO PASSA AL TASK: VIENE RILASCIATO QUANDO IL TASK FINISCE, ANCHE DOPO UN TIMEOUT
+        RESTITUISCE (BYTE, PARAMETRI, TEMPI IN MS COMPRESA L'ATTESA IN CODA)
+        """
+        start = time.perf_counter()
+        try:
+            future = self.executor.submit(renderRequest, data, presetName, prompt, overrides, fmt)
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release())
+
+        try:
+            output, params, timings = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # UN TASK ANCORA IN CODA VIENE ANNULLATO; UNO GIÀ IN ESECUZIONE NON SI PUÒ FERMARE E TIENE IL POSTO
+            future.cancel()
+            self._count("timedOut", 1)
+            raise
+        except Exception:
+            self._count("failed", 1)
+            raise
+
+        total = (time.perf_counter() - start) * 1000.0
+        # L'ATTESA COMPRENDE CODA E TRASFERIMENTO TRA PROCESSI: TUTTO CIÒ CHE NON È LAVORO DEL PROCESSO
+        timings["queue"] = max(0.0, total - sum(timings.values()))
+        timings["total"] = total
+
+        for phase, durationMs in timings.items():
+            tracer.record(f"server.{phase}", durationMs, format=fmt)
+        self._count("completed", 1)
+        return output, params, timings
+
+    def metrics(self):
+        """
+        CONTATORI E STATISTICHE DEI TEMPI PER FASE, PRONTI PER ESSERE SERIALIZZATI IN JSON
+        """
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "workers": self.workers,
+            "queueSize": self.queueSize,
+            "counters": counters,
+            "timings": {name: stats for name, stats in tracer.summary().items() if name.startswith("server.")}
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- METODI PRIVATI ---
+
+    def _count(self, name, delta):
+        with self._lock:
+            self.counters[name] += delta
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    TRADUCE LE RICHIESTE HTTP IN CHIAMATE AL RENDERSERVICE DEL SERVER (SELF.SERVER.SERVICE)
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/metrics":
+            self._sendJson(200, self.server.service.metrics())
+        elif path == "/health":
+            self._sendJson(200, {"status": "ok"})
+        else:
+            self._sendJson(404, {"error": f"percorso sconosciuto: {path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/render":
+            self._sendJson(404, {"error": f"percorso sconosciuto: {url.path}"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self._sendJson(400, {"error": "corpo della richiesta vuoto: serve l'immagine"})
+            return
+        if length > MAX_UPLOAD_BYTES:
+            self.close_connection = True
+            self._sendJson(413, {"error": f"immagine troppo grande (massimo {MAX_UPLOAD_BYTES} byte)"})
+            return
+
+        try:
+            presetName, prompt, overrides, fmt = self._parseQuery(url.query)
+        except ValueError as e:
+            self._discardBody(length)
+            self._sendJson(400, {"error": str(e)})
+            return
+
+        # BACKPRESSURE: IL POSTO SI PRENOTA PRIMA DI LEGGERE IL CORPO, COSÌ UN SERVIZIO SATURO NON BUFFERIZZA UPLOAD
+        service = self.server.service
+        if not service.acquire():
+            self._discardBody(length)
+            self._sendJson(503, {"error": "servizio saturo, riprovare"}, {"Retry-After": "1"})
+            return
+
+        try:
+            data = self.rfile.read(length)
+        except Exception:
+            service.release()
+            raise
+
+        # DA QUI IL POSTO APPARTIENE AL TASK DI RENDER, CHE LO RILASCIA QUANDO FINISCE
+        try:
+            output, params, timings = service.render(data, presetName, prompt, overrides, fmt)
+        except FutureTimeout:
+            self._sendJson(504, {"error": f"elaborazione oltre {service.timeout:.0f} s"})
+        except Image.DecompressionBombError as e:
+            self._sendJson(413, {"error": f"immagine troppo grande: {e}"})
+        except (ValueError, OSError) as e:
+            self._sendJson(400, {"error": str(e)})
+        except Exception as e:
+            self._sendJson(500, {"error": str(e)})
+        else:
+            self._send(200, output, CONTENT_TYPES[fmt], {
+                "Server-Timing": ", ".join(f"{phase};dur={durationMs:.1f}" for phase, durationMs in timings.items()),
+                "X-PromptVision-Params": json.dumps(params)
+            })
+
+    def log_message(self, format, *args):
+        # UNA RIGA PER RICHIESTA SU STDERR (SU SOCKET UNIX NON C'È UN INDIRIZZO DEL CLIENT)
+        sys.stderr.write(f"{time.strftime('%H:%M:%S')} {format % args}\n")
+
+    # --- METODI PRIVATI ---
+
+    def _parseQuery(self, query):
+        # RESTITUISCE (PRESET, PROMPT, PARAMETRI ESPLICITI, FORMATO PIL); VALUEERROR SE NON VALIDA
+        fields = {key: values[-1] for key, values in parse_qs(query).items()}
+        presetName = fields.pop("preset", None)
+        prompt = fields.pop("prompt", None)
+
+        extension = "." + fields.pop("format", "png").lower().lstrip(".")
+        if extension not in EXPORT_FORMATS:
+            raise ValueError(f"formato non supportato: {extension.lstrip('.')}")
+
+        overrides = {key: parseParamValue(key, value) for key, value in fields.items()}
+        return presetName, prompt, overrides, EXPORT_FORMATS[extension]
+
+    def _discardBody(self, length):
+        # LEGGE E SCARTA A BLOCCHI IL CORPO DI UNA RICHIESTA RIFIUTATA: IL CLIENT RICEVE LA RISPOSTA
+        # INVECE DI UN ERRORE DI CONNESSIONE E LA CONNESSIONE RESTA RIUSABILE
+        while length > 0:
+            chunk = self.rfile.read(min(length, DISCARD_CHUNK_BYTES))
+            if not chunk:
+                break
+            length -= len(chunk)
+
+    def _sendJson(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json", headers)
+
+    def _send(self, status, body, contentType, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """
+    SERVER HTTP SU SOCKET UNIX: STESSO HANDLER DELLA VERSIONE TCP, UN THREAD PER CONNESSIONE
+    """
+    daemon_threads = True
+
+
+def createServer(service, port=DEFAULT_PORT, socketPath=None):
+    """
+    CREA IL SERVER HTTP (TCP SU 127.0.0.1 O SOCKET UNIX) COLLEGATO AL SERVIZIO DI RENDER
+    """
+    if socketPath:
+        if os.path.exists(socketPath):
+            os.remove(socketPath)
+        server = UnixHTTPServer(socketPath, RenderRequestHandler)
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), RenderRequestHandler)
+        server.daemon_threads = True
+
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PromptVision: servizio di render locale senza interfaccia grafica")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"porta TCP su 127.0.0.1 (default: {DEFAULT_PORT})")
+    parser.add_argument("--socket", default=None, help="percorso di un socket Unix da usare al posto della porta TCP")
+    parser.add_argument("--workers", type=int, default=None, help="numero di processi di render (default: numero di CPU)")
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"richieste in attesa oltre a quelle in lavorazione (default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"secondi massimi per richiesta (default: {DEFAULT_TIMEOUT:.0f})")
+    parser.add_argument("--presets-file", default="presets.json", help="file dei preset (default: presets.json)")
+    parser.add_argument("--trace", default=None, help="file JSON lines su cui scrivere i tempi di ogni richiesta")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        tracer.setSink(args.trace)
+
+    service = RenderService(args.workers, args.queue, args.timeout, args.presets_file)
+    ready = service.warmUp()
+    server = createServer(service, args.port, args.socket)
+
+    address = args.socket or f"http://127.0.0.1:{args.port}"
+    print(f"PromptVision in ascolto su {address} ({ready} processi pronti, coda {args.queue})")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        tracer.setSink(None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
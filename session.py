@@ -0,0 +1,132 @@
+from PIL import Image
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+
+# FILE DELLA SESSIONE SALVATA ALLA CHIUSURA E RIPRESA AL LANCIO
+SESSION_FILE = "session.pvs"
+
+# VERSIONE DEL FORMATO (UNA SESSIONE DI UN'ALTRA VERSIONE VIENE IGNORATA)
+SESSION_VERSION = 1
+
+# QUALITÀ JPEG DEI PROXY SALVATI NELLA SESSIONE
+PROXY_QUALITY = 90
+
+# BYTE LETTI ALL'INIZIO E ALLA FINE DEL FILE ORIGINALE PER CALCOLARNE L'IMPRONTA
+FINGERPRINT_BYTES = 1024 * 1024
+
+
+def fileFingerprint(path):
+    """
+    IMPRONTA DEL FILE ORIGINALE: BLAKE2B DI DIMENSIONE, PRIMO E ULTIMO MEGABYTE
+    COSTANTE ANCHE PER TIFF DI CENTINAIA DI MEGABYTE (NESSUNA LETTURA COMPLETA ALL'AVVIO)
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode("ascii"), digest_size=16)
+    with open(path, "rb") as file:
+        digest.update(file.read(FINGERPRINT_BYTES))
+        if size > FINGERPRINT_BYTES:
+            file.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def sourceStatus(entry):
+    """
+    CONFRONTA IL FILE ORIGINALE CON QUELLO REGISTRATO NELLA SESSIONE: "ok", "changed" O "missing"
+    DIMENSIONE E DATA DI MODIFICA UGUALI BASTANO; ALTRIMENTI DECIDE L'IMPRONTA (ES. FILE COPIATO ALTROVE E RIPORTATO)
+    """
+    path = entry["source"]
+    try:
+        stat = os.stat(path)
+        if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime"]:
+            return "ok"
+        return "ok" if fileFingerprint(path) == entry["hash"] else "changed"
+    except OSError:
+        return "missing"
+
+
+def saveSession(path, engines, active, logs):
+    """
+    SCRIVE LA SESSIONE IN UN ARCHIVIO ZIP: SESSION.JSON (FILE ORIGINALI CON IMPRONTA, LOOK, LOG)
+    E PER OGNI DOCUMENTO IL PROXY DI ANTEPRIMA IN JPEG E I RECORD DELLA CRONOLOGIA (PARAMETRI E RITAGLI)
+    LA SCRITTURA È ATOMICA (TEMPORANEO NELLA STESSA CARTELLA + RENAME)
+    """
+    documents = []
+    members = []
+    for index, engine in enumerate(engines):
+        stat = os.stat(engine.sourcePath)
+        history = engine.history.snapshot()
+
+        # IL PRIMO LIVELLO DELLA PIRAMIDE È GIÀ GRANDE QUANTO IL DISPLAY E NON È RITAGLIATO NÉ ELABORATO
+        proxy = io.BytesIO()
+        engine.previewPyramid[0].save(proxy, "JPEG", quality=PROXY_QUALITY)
+
+        documents.append({
+            "source": engine.sourcePath,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": fileFingerprint(engine.sourcePath),
+            "look": engine.currentLook[0] if engine.currentLook else None,
+            "fields": history["fields"],
+            "labels": history["labels"],
+            "position": history["position"],
+            "proxy": f"proxy-{index}.jpg",
+            "history": f"history-{index}.bin"
+        })
+        members.append((f"proxy-{index}.jpg", proxy.getvalue(), zipfile.ZIP_STORED))
+        members.append((f"history-{index}.bin", history["records"], zipfile.ZIP_DEFLATED))
+
+    header = {
+        "version": SESSION_VERSION,
+        "active": engines.index(active) if active in engines else 0,
+        "logs": list(logs),
+        "documents": documents
+    }
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tempPath = tempfile.mkstemp(dir=directory, prefix=".session-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            with zipfile.ZipFile(file, "w") as archive:
+                archive.writestr("session.json", json.dumps(header, ensure_ascii=False), zipfile.ZIP_DEFLATED)
+                for name, data, compression in members:
+                    archive.writestr(name, data, compression)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tempPath, path)
+    except Exception:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+
+
+def loadSession(path):
+    """
+    LEGGE UNA SESSIONE SALVATA; NONE SE NON ESISTE O È DI UN'ALTRA VERSIONE
+    OGNI DOCUMENTO HA IL PROXY GIÀ DECODIFICATO ("proxy"), LO SNAPSHOT DELLA CRONOLOGIA ("history")
+    E LO STATO DEL FILE ORIGINALE ("status", VEDI SOURCESTATUS)
+    """
+    if not os.path.exists(path):
+        return None
+
+    with zipfile.ZipFile(path) as archive:
+        header = json.loads(archive.read("session.json").decode("utf-8"))
+        if header.get("version") != SESSION_VERSION:
+            return None
+
+        for entry in header["documents"]:
+            proxy = Image.open(io.BytesIO(archive.read(entry["proxy"])))
+            proxy.load()
+            entry["proxy"] = proxy.convert("RGB") if proxy.mode != "RGB" else proxy
+            entry["history"] = {
+                "fields": entry["fields"],
+                "records": archive.read(entry["history"]),
+                "labels": entry["labels"],
+                "position": entry["position"]
+            }
+            entry["status"] = sourceStatus(entry)
+    return header
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# I MODULI DELL'APPLICAZIONE SONO NELLA RADICE DEL REPOSITORY (LAYOUT PIATTO, NESSUN PACCHETTO)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,100 @@
+import pytest
+
+from cache import LRUCache
+
+
+def byteCache(maxSize):
+    return LRUCache(maxSize, sizeOf=len)
+
+
+def test_evicts_least_recent_by_bytes():
+    cache = byteCache(10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.put("c", b"12")
+    assert cache.currentSize == 10
+
+    cache.put("d", b"123")
+    assert "a" not in cache
+    assert [key for key in "bcd" if key in cache] == ["b", "c", "d"]
+    assert cache.currentSize == 9
+
+
+def test_one_large_value_evicts_several():
+    cache = byteCache(10)
+    for key in "abcde":
+        cache.put(key, b"12")
+
+    cache.put("f", b"12345678")
+    assert len(cache) == 2
+    assert "e" in cache and "f" in cache
+    assert cache.currentSize == 10
+
+
+def test_get_refreshes_recency():
+    cache = byteCache(6)
+    cache.put("a", b"12")
+    cache.put("b", b"12")
+    cache.put("c", b"12")
+    assert cache.get("a") == b"12"
+
+    cache.put("d", b"12")
+    assert "a" in cache
+    assert "b" not in cache
+
+
+def test_replacing_a_key_updates_size():
+    cache = byteCache(10)
+    cache.put("a", b"12345678")
+    cache.put("a", b"12")
+    assert cache.currentSize == 2
+
+    cache.put("b", b"12345678")
+    assert len(cache) == 2
+
+
+def test_oversize_value_is_not_stored():
+    cache = byteCache(4)
+    cache.put("a", b"12")
+    cache.put("a", b"12345")
+
+    assert "a" not in cache
+    assert cache.currentSize == 0
+
+
+def test_default_size_counts_entries():
+    cache = LRUCache(2)
+    for key in "abc":
+        cache.put(key, object())
+    assert len(cache) == 2
+    assert "a" not in cache
+
+
+def test_discard_and_clear():
+    cache = byteCache(10)
+    cache.put("a", b"123")
+    cache.put("b", b"1234")
+    cache.discard("a")
+    cache.discard("missing")
+    assert cache.currentSize == 4
+
+    cache.get("b")
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.currentSize == 0
+    assert cache.stats()["hits"] == 1
+
+
+def test_stats():
+    cache = byteCache(10)
+    assert cache.stats()["hitRate"] == 0.0
+
+    cache.put("a", b"123")
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+    assert cache.get("c", "default") == "default"
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["size"], stats["maxSize"]) == (2, 2, 1, 3, 10)
+    assert stats["hitRate"] == pytest.approx(0.5)
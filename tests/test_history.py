@@ -0,0 +1,192 @@
+import math
+
+import pytest
+
+import history
+from history import EditHistory
+
+FIELDS = ("brightness", "contrast")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(history.time, "monotonic", clock)
+    return clock
+
+
+def params(brightness, contrast=1.0):
+    return {"brightness": brightness, "contrast": contrast}
+
+
+def filledHistory(count, capacity=4):
+    edits = EditHistory(FIELDS, capacity=capacity)
+    edits.reset(params(0.0), None, "Apertura")
+    for index in range(1, count):
+        edits.record(params(float(index)), None, f"passo {index}")
+    return edits
+
+
+def test_ring_wraparound_keeps_most_recent(clock):
+    edits = filledHistory(7, capacity=4)
+
+    assert len(edits) == 4
+    assert edits.entries() == ["passo 3", "passo 4", "passo 5", "passo 6"]
+    assert edits.position == 3
+
+    values = []
+    while edits.canUndo:
+        values.append(edits.undo()[0]["brightness"])
+    assert values == [5.0, 4.0, 3.0]
+    assert edits.undo() is None
+    assert edits.jump(3) == (params(6.0), None)
+
+
+def test_record_after_undo_drops_redo_branch(clock):
+    edits = filledHistory(4, capacity=4)
+    edits.undo()
+    edits.undo()
+    edits.record(params(9.0), (0.1, 0.2, 0.9, 0.8), "ramo")
+
+    assert edits.entries() == ["Apertura", "passo 1", "ramo"]
+    assert not edits.canRedo
+    assert edits.jump(2) == (params(9.0), (0.1, 0.2, 0.9, 0.8))
+
+
+def test_crop_round_trip(clock):
+    edits = EditHistory(FIELDS)
+    edits.reset(params(1.0), None)
+    edits.record(params(1.0), (0.25, 0.0, 1.0, 0.5), "Ritaglio")
+
+    assert edits.undo() == (params(1.0), None)
+    assert edits.redo() == (params(1.0), (0.25, 0.0, 1.0, 0.5))
+
+
+def test_coalescing_within_window(clock):
+    edits = EditHistory(FIELDS, coalesceWindow=1.0)
+    edits.reset(params(1.0), None)
+    for value in (1.1, 1.2, 1.3):
+        clock.now += 0.5
+        edits.record(params(value), None, "Luminosità", coalesceKey="brightness")
+
+    assert edits.entries() == ["Apertura", "Luminosità"]
+    assert edits.jump(1)[0]["brightness"] == 1.3
+
+
+def test_coalescing_stops_after_window(clock):
+    edits = EditHistory(FIELDS, coalesceWindow=1.0)
+    edits.reset(params(1.0), None)
+    edits.record(params(1.1), None, "Luminosità", coalesceKey="brightness")
+    clock.now += 1.5
+    edits.record(params(1.2), None, "Luminosità", coalesceKey="brightness")
+
+    assert len(edits) == 3
+
+
+def test_coalescing_needs_same_key(clock):
+    edits = EditHistory(FIELDS)
+    edits.reset(params(1.0), None)
+    edits.record(params(1.1), None, "Luminosità", coalesceKey="brightness")
+    edits.record(params(1.1, 1.2), None, "Contrasto", coalesceKey="contrast")
+    edits.record(params(1.1, 1.3), None, "Contrasto")
+
+    assert edits.entries() == ["Apertura", "Luminosità", "Contrasto", "Contrasto"]
+
+
+def test_end_coalescing_starts_new_step(clock):
+    edits = EditHistory(FIELDS)
+    edits.reset(params(1.0), None)
+    edits.record(params(1.1), None, "Luminosità", coalesceKey="brightness")
+    edits.endCoalescing()
+    edits.record(params(1.2), None, "Luminosità", coalesceKey="brightness")
+
+    assert len(edits) == 3
+    assert edits.undo()[0]["brightness"] == 1.1
+
+
+def test_no_coalescing_away_from_end(clock):
+    edits = EditHistory(FIELDS)
+    edits.reset(params(1.0), None)
+    edits.record(params(1.1), None, "Luminosità", coalesceKey="brightness")
+    edits.record(params(1.2), None, "Luminosità")
+    edits.undo()
+    edits.record(params(1.5), None, "Luminosità", coalesceKey="brightness")
+
+    assert edits.entries() == ["Apertura", "Luminosità", "Luminosità"]
+    assert edits.jump(1)[0]["brightness"] == 1.1
+
+
+def test_first_state_is_never_coalesced(clock):
+    edits = EditHistory(FIELDS)
+    edits.reset(params(1.0), None)
+    edits.record(params(1.1), None, "Luminosità", coalesceKey="brightness")
+    edits.record(params(1.2), None, "Luminosità", coalesceKey="brightness")
+
+    assert edits.undo() == (params(1.0), None)
+
+
+def test_snapshot_restore_round_trip(clock):
+    edits = filledHistory(7, capacity=4)
+    edits.record(params(7.0), (0.0, 0.0, 0.5, 0.5), "Ritaglio")
+    edits.undo()
+    snapshot = edits.snapshot()
+
+    restored = EditHistory(FIELDS, capacity=4)
+    assert restored.restore(snapshot) == (params(6.0), None)
+    assert restored.entries() == edits.entries()
+    assert restored.position == edits.position
+    assert restored.redo() == (params(7.0), (0.0, 0.0, 0.5, 0.5))
+
+
+def test_restore_into_smaller_capacity_keeps_most_recent(clock):
+    edits = filledHistory(6, capacity=10)
+    edits.undo()
+    snapshot = edits.snapshot()
+
+    restored = EditHistory(FIELDS, capacity=3)
+    assert restored.restore(snapshot) == (params(4.0), None)
+    assert restored.entries() == ["passo 3", "passo 4", "passo 5"]
+    assert restored.position == 1
+
+
+def test_restore_keys_are_not_coalesced(clock):
+    edits = EditHistory(FIELDS)
+    edits.reset(params(1.0), None)
+    edits.record(params(1.1), None, "Luminosità", coalesceKey="brightness")
+
+    restored = EditHistory(FIELDS)
+    restored.restore(edits.snapshot())
+    restored.record(params(1.2), None, "Luminosità", coalesceKey="brightness")
+    assert len(restored) == 3
+
+
+def test_restore_rejects_other_fields(clock):
+    snapshot = filledHistory(3).snapshot()
+    with pytest.raises(ValueError):
+        EditHistory(("brightness", "saturation")).restore(snapshot)
+
+
+@pytest.mark.parametrize("change", [
+    {"records": b""},
+    {"records": b"\x00" * 7},
+    {"labels": ["Apertura"]},
+    {"position": 3},
+    {"position": -1}
+])
+def test_restore_rejects_invalid_data(clock, change):
+    edits = filledHistory(3)
+    snapshot = dict(edits.snapshot(), **change)
+
+    restored = EditHistory(FIELDS)
+    restored.reset(params(math.pi), None)
+    with pytest.raises(ValueError):
+        restored.restore(snapshot)
+    assert restored.entries() == ["Apertura"]
@@ -0,0 +1,109 @@
+from PIL import Image
+import pytest
+
+from imagestats import computeStatistics
+from interpreter import NaturalLanguageInterpreter
+
+NEUTRAL = {"brightness": 1.0, "contrast": 1.0, "saturation": 1.0, "sharpness": 1.0, "warmth": 1.0}
+
+# RISULTATI DELL'INTERPRETE ORIGINALE (VOCABOLARIO DI BASE) SU PARAMETRI NEUTRI, CON MEMORIA VUOTA
+BASELINE = [
+    ("più luminosa", {"brightness": 1.25}),
+    ("rendi l'immagine molto più scura", {"brightness": 0.5}),
+    ("meno contrasto", {"contrast": 0.75}),
+    ("un po' più calda", {"warmth": 1.125}),
+    ("leggermente più fredda e molto più nitida", {"warmth": 0.9, "sharpness": 1.5}),
+    ("aumenta il contrasto ma riduci la saturazione", {"contrast": 1.25, "saturation": 0.75}),
+    ("estremamente vivace", {"saturation": 1.75}),
+    ("un poco più chiara", {"brightness": 1.15}),
+    ("appena più calda", {"warmth": 1.075}),
+    ("sfoca un po'", {"sharpness": 0.875}),
+    ("reset", NEUTRAL),
+    ("torna all'originale", NEUTRAL),
+    ("bianco e nero", {"saturation": 0.0}),
+    ("più colori e più dettagli", {"saturation": 1.25, "sharpness": 1.25}),
+    ("abbassa l'esposizione", {"brightness": 0.75}),
+    ("immagine spenta", {"saturation": 0.75}),
+    ("davvero molto più luminosa", {"brightness": 1.5}),
+    ("super contrastata", {"contrast": 1.425}),
+    ("più blu", {"warmth": 0.75}),
+    ("autore più luminoso", {"brightness": 1.25}),
+    ("abbastanza più nitida", {"sharpness": 1.3}),
+    ("troppo scura", {"brightness": 0.375}),
+    ("meno ombre", {"brightness": 1.25}),
+    ("più marcata", {"contrast": 1.25}),
+    ("togli la dominante", {})
+]
+
+# DIFFERENZE VOLUTE RISPETTO ALL'INTERPRETE ORIGINALE:
+# "MORBIDEZZ" VINCE SUL PREFISSO "MORB" (CONTRASTO), LA VIRGOLA SEPARA I SEGMENTI ANCHE SEGUITA DA SPAZIO
+# E UN SEGMENTO PUÒ CITARE PIÙ PARAMETRI
+CHANGED = [
+    ("più morbidezza", {"sharpness": 0.75}),
+    ("più saturo, meno luminoso", {"saturation": 1.25, "brightness": 0.75}),
+    ("colori caldi estivi", {"saturation": 1.25, "warmth": 1.25})
+]
+
+
+def castImage():
+    return Image.new("RGB", (64, 48), (200, 140, 90))
+
+
+@pytest.mark.parametrize("text, expected", BASELINE + CHANGED)
+def test_vocabulary(text, expected):
+    changes, processedParams = NaturalLanguageInterpreter().parsePrompt(text, dict(NEUTRAL))
+    assert changes == pytest.approx(expected)
+    assert set(processedParams) == set(expected)
+
+
+def test_spacing_and_case_are_normalized():
+    interpreter = NaturalLanguageInterpreter()
+    assert interpreter.parsePrompt("  PIÙ   Luminosa ", dict(NEUTRAL))[0] == {"brightness": 1.25}
+
+
+def test_relative_commands_use_memory():
+    interpreter = NaturalLanguageInterpreter()
+    interpreter.parsePrompt("più luminosa", dict(NEUTRAL))
+
+    assert interpreter.parsePrompt("ancora", dict(NEUTRAL, brightness=1.25))[0] == {"brightness": 1.5}
+    assert interpreter.parsePrompt("di meno", dict(NEUTRAL))[0] == {"brightness": 0.75}
+
+
+def test_remember_false_keeps_memory():
+    interpreter = NaturalLanguageInterpreter()
+    interpreter.parsePrompt("più contrasto", dict(NEUTRAL))
+    interpreter.parsePrompt("più luminosa", dict(NEUTRAL), remember=False)
+
+    assert interpreter.parsePrompt("ancora", dict(NEUTRAL))[0] == {"contrast": 1.25}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("luminosità auto", True),
+    ("correggi la dominante", True),
+    ("correggi il bilanciamento", True),
+    ("togli la dominante", False),
+    ("autore più luminoso", False),
+    ("più luminosa", False)
+])
+def test_has_auto_command(text, expected):
+    assert NaturalLanguageInterpreter().hasAutoCommand(text) is expected
+
+
+def test_colour_cast_words_only_in_auto_segments():
+    image = castImage()
+    interpreter = NaturalLanguageInterpreter()
+    statistics = lambda: computeStatistics(image)
+
+    changes, _ = interpreter.parsePrompt("correggi la dominante", dict(NEUTRAL), statistics=statistics)
+    assert list(changes) == ["warmth"]
+    assert changes["warmth"] < 1.0
+
+    assert interpreter.parsePrompt("togli la dominante", dict(NEUTRAL), statistics=statistics) == ({}, [])
+
+
+def test_auto_without_statistics_changes_nothing():
+    interpreter = NaturalLanguageInterpreter()
+    interpreter.parsePrompt("più luminosa", dict(NEUTRAL))
+
+    # UN COMANDO AUTOMATICO NON RIPETE LE ULTIME MODIFICHE DALLA MEMORIA
+    assert interpreter.parsePrompt("correggi la dominante", dict(NEUTRAL)) == ({}, [])
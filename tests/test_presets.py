@@ -0,0 +1,128 @@
+import json
+import os
+import stat
+
+import pytest
+
+import utils
+from utils import PresetStore
+
+WARM = {"brightness": 1.0, "warmth": 1.25}
+COLD = {"brightness": 1.0, "warmth": 0.75}
+
+
+@pytest.fixture
+def store(tmp_path):
+    # NESSUNA SCRITTURA IN BACKGROUND DURANTE IL TEST: SI SCRIVE SOLO CON FLUSH
+    return PresetStore(str(tmp_path / "presets.json"), flushDelay=3600)
+
+
+def readPresets(store):
+    with open(store.path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def temporaryFiles(store):
+    return [name for name in os.listdir(os.path.dirname(store.path)) if name.startswith(".presets-")]
+
+
+def test_flush_writes_atomically(store):
+    store.set("Caldo", WARM)
+    store.set("Freddo", COLD)
+    assert not os.path.exists(store.path)
+
+    store.flush()
+    assert readPresets(store) == {"Caldo": WARM, "Freddo": COLD}
+    assert temporaryFiles(store) == []
+
+
+def test_flush_without_changes_does_not_write(store):
+    store.flush()
+    assert not os.path.exists(store.path)
+
+
+def test_flush_preserves_file_mode(store):
+    store.set("Caldo", WARM)
+    store.flush()
+    os.chmod(store.path, 0o640)
+
+    store.set("Freddo", COLD)
+    store.flush()
+    assert stat.S_IMODE(os.stat(store.path).st_mode) == 0o640
+
+
+def test_new_file_follows_umask(store, monkeypatch):
+    # MKSTEMP CREA IN 0600: UN FILE NUOVO DEVE AVERE I PERMESSI DI UN OPEN NORMALE
+    monkeypatch.setattr(utils, "_umask", 0o022)
+    store.set("Caldo", WARM)
+    store.flush()
+    assert stat.S_IMODE(os.stat(store.path).st_mode) == 0o644
+
+
+def test_failed_flush_keeps_original(store):
+    store.set("Caldo", WARM)
+    store.flush()
+    with open(store.path, "rb") as file:
+        original = file.read()
+
+    store.set("Rotto", {"brightness": object()})
+    with pytest.raises(TypeError):
+        store.flush()
+
+    with open(store.path, "rb") as file:
+        assert file.read() == original
+    assert temporaryFiles(store) == []
+
+    store.delete("Rotto")
+    store.flush()
+
+
+def test_external_change_is_reloaded(store):
+    store.set("Caldo", WARM)
+    store.flush()
+
+    with open(store.path, "w", encoding="utf-8") as file:
+        json.dump({"Caldo": WARM, "Esterno": COLD}, file)
+
+    assert store.names() == ["Caldo", "Esterno"]
+    assert store.get("Esterno") == COLD
+
+
+def test_pending_changes_survive_reload(store):
+    store.set("Caldo", WARM)
+    store.set("Vecchio", COLD)
+    store.flush()
+
+    store.set("Locale", WARM)
+    store.delete("Vecchio")
+    with open(store.path, "w", encoding="utf-8") as file:
+        json.dump({"Caldo": WARM, "Vecchio": COLD, "Esterno": COLD}, file)
+
+    assert store.names() == ["Caldo", "Esterno", "Locale"]
+
+    store.flush()
+    assert readPresets(store) == {"Caldo": WARM, "Esterno": COLD, "Locale": WARM}
+
+
+def test_get_returns_copy(store):
+    store.set("Caldo", WARM)
+    store.get("Caldo")["warmth"] = 3.0
+    assert store.get("Caldo") == WARM
+
+
+def test_delete(store):
+    store.set("Caldo", WARM)
+    store.flush()
+
+    assert store.delete("Caldo")
+    assert not store.delete("Caldo")
+    assert store.get("Caldo") is None
+
+    store.flush()
+    assert readPresets(store) == {}
+
+
+def test_corrupted_file_is_empty(store):
+    with open(store.path, "w", encoding="utf-8") as file:
+        file.write("{non json")
+    assert store.names() == []
@@ -0,0 +1,57 @@
+import numpy as np
+from PIL import Image
+import pytest
+
+from processor import ImageEngine, LUT_TOLERANCE
+
+PARAMS = ("brightness", "contrast", "saturation", "sharpness", "warmth")
+
+
+def randomImage(rng, size=(96, 64)):
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8), "RGB")
+
+
+def render(engine, name, image, params):
+    engine.renderEngine = name
+    return np.asarray(engine.renderImage(image, params), dtype=np.int16)
+
+
+def combinedParams(rng, low, high, count):
+    engine = ImageEngine()
+    for _ in range(count):
+        params = engine._defaultParams()
+        params.update({key: float(rng.uniform(low, high)) for key in PARAMS})
+        yield params
+
+
+@pytest.mark.parametrize("low, high", [(0.5, 1.6), (0.0, 3.0)])
+def test_numpy_matches_pil_chain(low, high):
+    rng = np.random.default_rng(1)
+    engine = ImageEngine()
+    image = randomImage(rng)
+    for params in combinedParams(rng, low, high, 60):
+        reference = render(engine, "pil", image, params)
+        assert np.array_equal(render(engine, "numpy", image, params), reference), params
+
+
+@pytest.mark.parametrize("low, high", [(0.5, 1.6), (0.0, 3.0)])
+def test_lut_within_tolerance(low, high):
+    rng = np.random.default_rng(2)
+    engine = ImageEngine()
+    image = randomImage(rng)
+    for params in combinedParams(rng, low, high, 60):
+        reference = render(engine, "pil", image, params)
+        error = np.abs(render(engine, "lut", image, params) - reference).max()
+        assert error <= LUT_TOLERANCE, params
+
+
+def test_extreme_params():
+    rng = np.random.default_rng(3)
+    engine = ImageEngine()
+    image = randomImage(rng)
+    params = engine._defaultParams()
+    params.update(brightness=3.0, contrast=3.0, saturation=0.25)
+
+    reference = render(engine, "pil", image, params)
+    assert np.array_equal(render(engine, "numpy", image, params), reference)
+    assert np.abs(render(engine, "lut", image, params) - reference).max() <= LUT_TOLERANCE
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+from PIL import Image
+import pytest
+
+from processor import ImageEngine
+from session import SESSION_VERSION, fileFingerprint, loadSession, saveSession
+
+
+def writeImage(path, seed):
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8), "RGB").save(path)
+
+
+def editedEngine(path):
+    engine = ImageEngine()
+    assert engine.loadImage(str(path), render=False)
+    engine.updateParamsBatch({"brightness": 1.25}, label="Luminosità")
+    engine.updateParamsBatch({"contrast": 0.75}, label="Contrasto")
+    engine.undo(render=False)
+    return engine
+
+
+@pytest.fixture
+def saved(tmp_path):
+    source = tmp_path / "foto.png"
+    writeImage(source, 1)
+    engine = editedEngine(source)
+    sessionPath = tmp_path / "session.pvs"
+    saveSession(str(sessionPath), [engine], engine, ["prompt"])
+    return engine, source, sessionPath
+
+
+def test_round_trip(saved):
+    engine, source, sessionPath = saved
+    header = loadSession(str(sessionPath))
+
+    assert header["version"] == SESSION_VERSION
+    assert header["active"] == 0
+    assert header["logs"] == ["prompt"]
+
+    entry, = header["documents"]
+    assert entry["source"] == str(source)
+    assert entry["status"] == "ok"
+    assert entry["proxy"].mode == "RGB"
+    assert entry["proxy"].size == engine.previewPyramid[0].size
+    assert entry["history"]["labels"] == engine.history.entries()
+
+    resumed = ImageEngine()
+    resumed.resumeDraft(entry["source"], entry["proxy"], entry["history"])
+    assert resumed.isDraft
+    assert resumed.currentParams == engine.currentParams
+    assert resumed.history.position == engine.history.position
+    assert resumed.redo(render=False)
+    assert resumed.currentParams["contrast"] == 0.75
+
+
+def test_no_temporary_files_left(saved):
+    _, _, sessionPath = saved
+    assert sorted(os.listdir(sessionPath.parent)) == ["foto.png", "session.pvs"]
+
+
+def test_touched_file_is_still_ok(saved):
+    _, source, sessionPath = saved
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5 * 10 ** 9))
+
+    assert loadSession(str(sessionPath))["documents"][0]["status"] == "ok"
+
+
+def test_rewritten_file_is_changed(saved):
+    _, source, sessionPath = saved
+    stat = os.stat(source)
+    writeImage(source, 2)
+    # DATA DIVERSA: DECIDE L'IMPRONTA
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert loadSession(str(sessionPath))["documents"][0]["status"] == "changed"
+
+
+def test_deleted_file_is_missing(saved):
+    _, source, sessionPath = saved
+    os.remove(source)
+
+    assert loadSession(str(sessionPath))["documents"][0]["status"] == "missing"
+
+
+def test_missing_session(tmp_path):
+    assert loadSession(str(tmp_path / "session.pvs")) is None
+
+
+def test_fingerprint_covers_head_and_tail(tmp_path, monkeypatch):
+    import session
+    monkeypatch.setattr(session, "FINGERPRINT_BYTES", 16)
+
+    path = tmp_path / "dati.bin"
+    data = bytearray(range(64))
+    path.write_bytes(bytes(data))
+    reference = fileFingerprint(str(path))
+
+    # IL CENTRO DEL FILE NON FA PARTE DELL'IMPRONTA, INIZIO E FINE SÌ
+    data[32] ^= 0xFF
+    path.write_bytes(bytes(data))
+    assert fileFingerprint(str(path)) == reference
+
+    for index in (0, 63):
+        changed = bytearray(data)
+        changed[index] ^= 0xFF
+        path.write_bytes(bytes(changed))
+        assert fileFingerprint(str(path)) != reference
+
+    path.write_bytes(bytes(data) + b"\x00")
+    assert fileFingerprint(str(path)) != reference
@@ -0,0 +1,193 @@
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+import json
+import queue
+import threading
+import time
+import weakref
+
+# NUMERO MASSIMO DI EVENTI TENUTI IN MEMORIA (I PIÙ VECCHI VENGONO SOVRASCRITTI)
+TRACE_CAPACITY = 4096
+
+
+class JsonLinesSink:
+    """
+    SCRIVE GLI EVENTI SU FILE IN FORMATO JSON LINES DA UN THREAD DEDICATO,
+    COSÌ CHI REGISTRA UN EVENTO NON ATTENDE MAI IL DISCO
+    """
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="TraceSink", daemon=True)
+        self._thread.start()
+
+    def write(self, event):
+        self._queue.put(event)
+
+    def close(self):
+        """
+        SCRIVE GLI EVENTI RIMASTI IN CODA E CHIUDE IL FILE
+        """
+        self._queue.put(None)
+        self._thread.join(timeout=2.0)
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as file:
+            while True:
+                event = self._queue.get()
+                if event is None:
+                    return
+                file.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+                # SVUOTA LA CODA PRIMA DEL FLUSH PER RAGGRUPPARE LE SCRITTURE
+                if self._queue.empty():
+                    file.flush()
+
+
+class Tracer:
+    """
+    REGISTRO STRUTTURATO DELLE OPERAZIONI: OGNI EVENTO HA NOME, DURATA IN MS, THREAD E CAMPI LIBERI
+    GLI EVENTI STANNO IN UN BUFFER CIRCOLARE DI DIMENSIONE FISSA, CON UN SINK JSON LINES OPZIONALE
+    """
+    def __init__(self, capacity=TRACE_CAPACITY):
+        self.events = deque(maxlen=capacity)
+        self.sink = None
+
+        # CACHE OSSERVATE NEL RIEPILOGO: (NOME, RIFERIMENTO DEBOLE), PIÙ CACHE POSSONO AVERE LO STESSO NOME
+        self._caches = []
+        self._cachesLock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **fields):
+        """
+        MISURA LA DURATA DEL BLOCCO WITH E LA REGISTRA COME EVENTO
+        """
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000.0, **fields)
+
+    def record(self, name, durationMs, **fields):
+        """
+        REGISTRA UN EVENTO GIÀ MISURATO (APPEND SU DEQUE: SICURO ANCHE DA PIÙ THREAD)
+        """
+        event = {
+            "time": time.time(),
+            "op": name,
+            "ms": round(durationMs, 3),
+            "thread": threading.current_thread().name
+        }
+        event.update(fields)
+        self.events.append(event)
+
+        sink = self.sink
+        if sink:
+            sink.write(event)
+
+    def watchCache(self, name, cache):
+        """
+        AGGIUNGE UNA CACHE (CON STATS()) AL RIEPILOGO; NON LA TIENE IN VITA
+        """
+        with self._cachesLock:
+            self._caches = [(key, ref) for key, ref in self._caches if ref() is not None]
+            self._caches.append((name, weakref.ref(cache)))
+
+    def cacheSummary(self):
+        """
+        STATISTICHE DELLE CACHE OSSERVATE, SOMMATE PER NOME: HIT, MISS, PERCENTUALE DI HIT, ENTRY E OCCUPAZIONE
+        """
+        with self._cachesLock:
+            caches = [(name, ref()) for name, ref in self._caches]
+
+        result = {}
+        for name, cache in caches:
+            if cache is None:
+                continue
+            stats = cache.stats()
+            total = result.setdefault(name, {"hits": 0, "misses": 0, "entries": 0, "size": 0})
+            for key in total:
+                total[key] += stats[key]
+
+        for total in result.values():
+            lookups = total["hits"] + total["misses"]
+            total["hitRate"] = total["hits"] / lookups if lookups else 0.0
+        return result
+
+    def setSink(self, path):
+        """
+        ATTIVA (O CON NONE DISATTIVA) LA SCRITTURA ASINCRONA DEGLI EVENTI SU FILE JSON LINES
+        """
+        if self.sink:
+            self.sink.close()
+        self.sink = JsonLinesSink(path) if path else None
+
+    def summary(self):
+        """
+        STATISTICHE PER OPERAZIONE SUGLI EVENTI IN MEMORIA: CONTEGGIO, P50, P95 E MASSIMO (MS)
+        """
+        durations = {}
+        for event in list(self.events):
+            durations.setdefault(event["op"], []).append(event["ms"])
+
+        result = {}
+        for name, values in durations.items():
+            values.sort()
+            result[name] = {
+                "count": len(values),
+                "p50": self._percentile(values, 50),
+                "p95": self._percentile(values, 95),
+                "max": values[-1]
+            }
+        return result
+
+    def formatSummary(self):
+        """
+        RESTITUISCE IL RIEPILOGO COME TESTO PRONTO PER LA UI (TEMPI, POI CACHE USATE ALMENO UNA VOLTA)
+        """
+        summary = self.summary()
+        caches = {name: stats for name, stats in self.cacheSummary().items() if stats["hits"] + stats["misses"]}
+        if not summary and not caches:
+            return ""
+
+        lines = []
+        for name in sorted(summary):
+            stats = summary[name]
+            lines.append(
+                f"{name}: {stats['count']}x  p50 {stats['p50']:.1f} ms  "
+                f"p95 {stats['p95']:.1f} ms  max {stats['max']:.1f} ms"
+            )
+        for name in sorted(caches):
+            lines.append(formatCacheStats(f"cache.{name}", caches[name]))
+        return "\n".join(lines)
+
+    def _percentile(self, values, percent):
+        # PERCENTILE NEAREST-RANK SU VALORI GIÀ ORDINATI
+        index = max(0, -(-len(values) * percent // 100) - 1)
+        return values[index]
+
+
+def formatCacheStats(name, stats):
+    """
+    UNA RIGA DI TESTO CON HIT, MISS, PERCENTUALE DI HIT E OCCUPAZIONE DI UNA CACHE
+    """
+    return (f"{name}: {stats['hits']} hit / {stats['misses']} miss ({stats['hitRate'] * 100:.0f}%)  "
+            f"{stats['entries']} entry")
+
+
+def traced(name):
+    """
+    DECORATORE: REGISTRA OGNI CHIAMATA DELLA FUNZIONE COME SPAN CON IL NOME INDICATO
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ISTANZA CONDIVISA DA TUTTI I MODULI
+tracer = Tracer()
@@ -1,21 +1,285 @@
+from collections import deque
+import atexit
 import json
 import os
+import tempfile
+import threading
+import weakref
 from datetime import datetime
 
+from PIL import ImageFilter
+
+# RITARDO CON CUI UNA SERIE DI SALVATAGGI VIENE SCRITTA SU DISCO IN UN'UNICA OPERAZIONE (SECONDI)
+PRESET_FLUSH_DELAY = 0.5
+
+# CARTELLA DELLE LUT .CUBE, ACCANTO AL FILE DEI PRESET
+LUT_DIRECTORY = "luts"
+
+# UMASK DEL PROCESSO, LETTA SOLO LA PRIMA VOLTA CHE SERVE (VEDI _PROCESSUMASK)
+_umask = None
+_umaskLock = threading.Lock()
+
+# ARCHIVI DEI PRESET ANCORA VIVI, SCRITTI TUTTI DA UN UNICO HOOK ALLA CHIUSURA DEL PROCESSO
+_openStores = weakref.WeakSet()
+
+
+def _processUmask():
+    # SU LINUX SI LEGGE DA /PROC SENZA TOCCARLA; ALTRIMENTI OS.UMASK VA REIMPOSTATA PER LEGGERLA E
+    # PER UN ISTANTE VALE 0 PER TUTTO IL PROCESSO: SUCCEDE UNA SOLA VOLTA, SOTTO LOCK
+    global _umask
+    with _umaskLock:
+        if _umask is None:
+            try:
+                with open("/proc/self/status", "r", encoding="ascii") as file:
+                    _umask = next(int(line.split()[1], 8) for line in file if line.startswith("Umask:"))
+            except (OSError, StopIteration, ValueError, IndexError):
+                _umask = os.umask(0o022)
+                os.umask(_umask)
+        return _umask
+
+
+def _defaultFileMode(path):
+    # PERMESSI DA DARE A UN FILE RISCRITTO CON TEMPORANEO + RENAME: QUELLI DEL FILE ESISTENTE,
+    # ALTRIMENTI QUELLI DI UN FILE NUOVO CREATO CON OPEN (MKSTEMP CREA SEMPRE IN 0600)
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        return 0o666 & ~_processUmask()
+
+
+@atexit.register
+def _flushOpenStores():
+    # NESSUNA MODIFICA VA PERSA ALLA CHIUSURA DEL PROCESSO
+    for store in list(_openStores):
+        try:
+            store.flush()
+        except Exception as e:
+            print(f"ERRORE NELLA SCRITTURA DEL FILE PRESET: {e}")
+
+
+def writeCubeFile(path, lut, title):
+    """
+    SCRIVE UNA LUT 3D (COLOR3DLUT A 3 CANALI) NEL FORMATO .CUBE (ROSSO CHE VARIA PIÙ VELOCEMENTE)
+    """
+    size = lut.size[0]
+    table = lut.table
+    lines = [f'TITLE "{title}"', f"LUT_3D_SIZE {size}", "DOMAIN_MIN 0.0 0.0 0.0", "DOMAIN_MAX 1.0 1.0 1.0"]
+    for index in range(0, len(table), 3):
+        lines.append(f"{table[index]:.6f} {table[index + 1]:.6f} {table[index + 2]:.6f}")
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def readCubeFile(path):
+    """
+    LEGGE UN FILE .CUBE 3D E RESTITUISCE LA COLOR3DLUT CORRISPONDENTE
+    SOLLEVA VALUEERROR PER FILE MALFORMATI O NON SUPPORTATI (LUT 1D, DOMINIO DIVERSO DA 0-1)
+    """
+    size = None
+    table = []
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        for line in file:
+            parts = line.split()
+            if not parts or parts[0].startswith("#") or parts[0] == "TITLE":
+                continue
+
+            keyword = parts[0].upper()
+            if keyword == "LUT_3D_SIZE":
+                size = int(parts[1])
+            elif keyword == "LUT_1D_SIZE":
+                raise ValueError("LUT 1D non supportate")
+            elif keyword in ("DOMAIN_MIN", "DOMAIN_MAX"):
+                expected = 0.0 if keyword == "DOMAIN_MIN" else 1.0
+                if any(float(value) != expected for value in parts[1:4]):
+                    raise ValueError("Dominio della LUT diverso da 0-1 non supportato")
+            elif keyword[0].isdigit() or keyword[0] in "-.":
+                table.extend(float(value) for value in parts[:3])
+
+    if not size or len(table) != size ** 3 * 3:
+        raise ValueError("File .cube non valido")
+    return ImageFilter.Color3DLUT(size, table, channels=3)
+
+
+class PresetStore:
+    """
+    ARCHIVIO DEI PRESET CON INDICE IN MEMORIA
+    IL FILE VIENE RILETTO SOLO QUANDO CAMBIANO MTIME O DIMENSIONE (ES. SINCRONIZZAZIONE ESTERNA),
+    LE SCRITTURE SONO ACCORPATE E AVVENGONO IN MODO ATOMICO (FILE TEMPORANEO + RENAME)
+    """
+    def __init__(self, path, flushDelay=PRESET_FLUSH_DELAY):
+        self.path = path
+        self.flushDelay = flushDelay
+
+        # INDICE NOME -> PARAMETRI E CACHE DEI NOMI ORDINATI
+        self._presets = {}
+        self._sortedNames = None
+
+        # FIRMA (MTIME, DIMENSIONE) DEL FILE QUANDO È STATO LETTO O SCRITTO L'ULTIMA VOLTA
+        self._signature = None
+
+        # MODIFICHE NON ANCORA SCRITTE: NOME -> PARAMETRI (NONE = ELIMINATO)
+        self._pending = {}
+        self._timer = None
+        self._lock = threading.RLock()
+
+        # SCRITTO ALLA CHIUSURA DEL PROCESSO SE È ANCORA VIVO (RIFERIMENTO DEBOLE: NON LO TIENE IN MEMORIA)
+        _openStores.add(self)
+
+    def names(self):
+        """
+        NOMI DI TUTTI I PRESET, ORDINATI ALFABETICAMENTE (CALCOLATI SOLO DOPO UNA MODIFICA)
+        """
+        with self._lock:
+            self._refresh()
+            if self._sortedNames is None:
+                self._sortedNames = sorted(self._presets)
+            return list(self._sortedNames)
+
+    def get(self, name):
+        """
+        PARAMETRI DEL PRESET (COPIA) O NONE SE NON ESISTE
+        """
+        with self._lock:
+            self._refresh()
+            params = self._presets.get(name)
+            return dict(params) if params is not None else None
+
+    def set(self, name, params):
+        """
+        SALVA O SOVRASCRIVE UN PRESET; LA SCRITTURA SU DISCO VIENE ACCORPATA CON LE SUCCESSIVE
+        """
+        with self._lock:
+            self._refresh()
+            if name not in self._presets:
+                self._sortedNames = None
+            self._presets[name] = dict(params)
+            self._pending[name] = self._presets[name]
+            self._scheduleFlush()
+
+    def delete(self, name):
+        """
+        ELIMINA UN PRESET; RESTITUISCE FALSE SE NON ESISTE
+        """
+        with self._lock:
+            self._refresh()
+            if name not in self._presets:
+                return False
+
+            del self._presets[name]
+            self._sortedNames = None
+            self._pending[name] = None
+            self._scheduleFlush()
+            return True
+
+    def flush(self):
+        """
+        SCRIVE SU DISCO LE MODIFICHE IN SOSPESO (FILE TEMPORANEO NELLA STESSA CARTELLA + RENAME ATOMICO)
+        """
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+
+            # UN FILE CAMBIATO DA ALTRI NEL FRATTEMPO VIENE RILETTO E LE MODIFICHE LOCALI APPLICATE SOPRA
+            self._refresh()
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tempPath = tempfile.mkstemp(dir=directory, prefix=".presets-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as file:
+                    json.dump(self._presets, file, ensure_ascii=False, separators=(",", ":"))
+                    file.flush()
+                    os.fsync(file.fileno())
+                # LA LIBRERIA DI PRESET PUÒ ESSERE CONDIVISA: IL RENAME NON DEVE RENDERLA PRIVATA
+                os.chmod(tempPath, _defaultFileMode(self.path))
+                os.replace(tempPath, self.path)
+            except Exception:
+                if os.path.exists(tempPath):
+                    os.remove(tempPath)
+                raise
+
+            self._pending.clear()
+            self._signature = self._fileSignature()
+
+    # --- METODI PRIVATI ---
+
+    def _scheduleFlush(self):
+        # UN SOLO TIMER PER UNA SERIE DI MODIFICHE RAVVICINATE
+        if self._timer is None:
+            self._timer = threading.Timer(self.flushDelay, self._flushInBackground)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flushInBackground(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"ERRORE NELLA SCRITTURA DEL FILE PRESET: {e}")
+
+    def _fileSignature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        # RILEGGE IL FILE SOLO SE È CAMBIATO DALL'ULTIMA LETTURA/SCRITTURA
+        signature = self._fileSignature()
+        if signature == self._signature:
+            return
+
+        self._signature = signature
+        self._presets = self._readFile() if signature else {}
+        self._sortedNames = None
+
+        # LE MODIFICHE LOCALI NON ANCORA SCRITTE RESTANO VALIDE
+        for name, params in self._pending.items():
+            if params is None:
+                self._presets.pop(name, None)
+            else:
+                self._presets[name] = params
+
+    def _readFile(self):
+        """
+        LEGGE IL FILE JSON IN MODO SICURO, GESTENDO CASI DI FILE MANCANTE O CORROTTO
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                content = file.read()
+                if not content:
+                    return {}
+                return json.loads(content)
+        except (json.JSONDecodeError, Exception) as e:
+            print(f"ERRORE NELLA LETTURA DEI PRESET: {e}")
+            # SE IL FILE È CORROTTO, RESTITUISCE DIZIONARIO VUOTO PER NON BLOCCARE L'APP
+            return {}
+
+
 class UtilsManager:
     """
     GESTISCE LA PERSISTENZA DEI DATI (PRESET) E LA REGISTRAZIONE DELLE ATTIVITÀ DURANTE LA SESSIONE
     """
-    def __init__(self):
-        # FILE LOCALE PER LA PERSISTENZA DEI PRESET
-        self.presetFile = "presets.json"
+    def __init__(self, presetFile="presets.json"):
+        # FILE LOCALE PER LA PERSISTENZA DEI PRESET, CON INDICE IN MEMORIA E SCRITTURE ATOMICHE
+        self.presetFile = presetFile
+        self.presetStore = PresetStore(presetFile)
 
-        # STORICO IN MEMORIA DELLE AZIONI EFFETTUATE
-        self.logHistory = []
+        # CARTELLA DELLE LUT 3D (.CUBE) IMPORTATE O ESPORTATE
+        self.lutDirectory = os.path.join(os.path.dirname(presetFile), LUT_DIRECTORY)
 
         # LIMITE MASSIMO DI ENTRY NELLA CRONOLOGIA PER EVITARE ECCESSIVO CONSUMO DI RAM
         self.maxLogs = 100
 
+        # STORICO IN MEMORIA DELLE AZIONI EFFETTUATE (BUFFER CIRCOLARE: LE PIÙ VECCHIE ESCONO DA SOLE)
+        self.logHistory = deque(maxlen=self.maxLogs)
+
+        # RIGHE DELLO STORICO GIÀ ORDINATE PER LA UI (DALLA PIÙ RECENTE), INVALIDATE A OGNI NUOVA AZIONE
+        self._logEntries = None
+
     def logAction(self, description):
         """
         REGISTRA UN'AZIONE CON TIMESTAMP
@@ -24,31 +288,34 @@ class UtilsManager:
         timestamp = datetime.now().strftime("%H:%M:%S")
         entry = f"[{timestamp}] {description}"
 
+        # IL DEQUE SCARTA L'AZIONE PIÙ VECCHIA IN O(1) QUANDO È PIENO
         self.logHistory.append(entry)
-
-        # MANTIENE PULITA LA MEMORIA
-        if len(self.logHistory) > self.maxLogs:
-            self.logHistory.pop(0)
+        self._logEntries = None
 
         return entry
 
-    def getLogs(self):
+    def restoreLogs(self, entries):
         """
-        RESTITUISCE LO STORICO COME STRINGA PRONTA PER LA UI
+        RIPRISTINA LO STORICO DI UNA SESSIONE PRECEDENTE (DAL PIÙ VECCHIO AL PIÙ RECENTE)
+        """
+        self.logHistory.extend(entries)
+        self._logEntries = None
+
+    def getLogEntries(self):
+        """
+        RESTITUISCE LO STORICO COME LISTA DI RIGHE PRONTA PER LA UI
         LE AZIONI PIÙ RECENTI SONO IN ALTO
         """
-        if not self.logHistory:
-            return ""
-        return "\n".join(reversed(self.logHistory))
+        if self._logEntries is None:
+            self._logEntries = list(reversed(self.logHistory))
+        return self._logEntries
 
     def savePreset(self, name, params):
         """
         SALVA O SOVRASCRIVE UN PRESET CON I PARAMETRI CORRENTI
         """
         try:
-            data = self._readPresets()
-            data[name] = params
-            self._writePresets(data)
+            self.presetStore.set(name, params)
             return True
         except Exception as e:
             print(f"ERRORE NEL SALVATAGGIO PRESET: {e}")
@@ -58,53 +325,69 @@ class UtilsManager:
         """
         RESTITUISCE I NOMI DI TUTTI I PRESET DISPONIBILI, ORDINATI ALFABETICAMENTE
         """
-        presets = self._readPresets()
-        return sorted(list(presets.keys()))
+        return self.presetStore.names()
 
     def loadPreset(self, name):
         """
         CARICA UN PRESET SPECIFICO SE ESISTE
         """
-        return self._readPresets().get(name)
+        return self.presetStore.get(name)
 
     def deletePreset(self, name):
         """
         ELIMINA UN PRESET DAL FILE DI PERSISTENZA
         """
-        data = self._readPresets()
-        if name not in data:
-            return False
+        return self.presetStore.delete(name)
 
-        del data[name]
-        self._writePresets(data)
-        return True
+    def flushPresets(self):
+        """
+        FORZA LA SCRITTURA SU DISCO DEI PRESET MODIFICATI (ALTRIMENTI AVVIENE DOPO PRESET_FLUSH_DELAY)
+        """
+        self.presetStore.flush()
 
-    # --- METODI PRIVATI PER L'ACCESSO AL FILE SYSTEM ---
+    def getLutNames(self):
+        """
+        RESTITUISCE I NOMI DELLE LUT SALVATE, ORDINATI ALFABETICAMENTE
+        """
+        if not os.path.isdir(self.lutDirectory):
+            return []
+        return sorted(
+            os.path.splitext(name)[0] for name in os.listdir(self.lutDirectory) if name.lower().endswith(".cube")
+        )
 
-    def _readPresets(self):
+    def saveLut(self, name, lut):
         """
-        LEGGE IL FILE JSON IN MODO SICURO, GESTENDO CASI DI FILE MANCANTE O CORROTTO
+        SALVA UNA LUT 3D NELLA CARTELLA DELLE LUT COME FILE .CUBE
         """
-        if not os.path.exists(self.presetFile):
-            return {}
+        try:
+            os.makedirs(self.lutDirectory, exist_ok=True)
+            writeCubeFile(os.path.join(self.lutDirectory, name + ".cube"), lut, name)
+            return True
+        except Exception as e:
+            print(f"ERRORE NEL SALVATAGGIO LUT: {e}")
+            return False
 
+    def loadLut(self, name):
+        """
+        CARICA UNA LUT SALVATA; NONE SE NON ESISTE O NON È VALIDA
+        """
         try:
-            with open(self.presetFile, "r", encoding="utf-8") as file:
-                content = file.read()
-                if not content:
-                    return {}
-                return json.loads(content)
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"ERRORE NELLA LETTURA DEI PRESET: {e}")
-            # SE IL FILE È CORROTTO, RESTITUISCE DIZIONARIO VUOTO PER NON BLOCCARE L'APP
-            return {}
+            return readCubeFile(os.path.join(self.lutDirectory, name + ".cube"))
+        except Exception as e:
+            print(f"ERRORE NELLA LETTURA LUT: {e}")
+            return None
 
-    def _writePresets(self, data):
+    def importLut(self, path):
         """
-        SCRIVE I PRESET SU DISCO IN FORMATO LEGGIBILE (INDENTATO)
+        VALIDA UN FILE .CUBE ESTERNO E NE SALVA UNA COPIA TRA LE LUT; RESTITUISCE (NOME, LUT) O NONE
         """
         try:
-            with open(self.presetFile, "w", encoding="utf-8") as file:
-                json.dump(data, file, indent=4, ensure_ascii=False)
+            lut = readCubeFile(path)
         except Exception as e:
-            print(f"ERRORE NELLA SCRITTURA DEL FILE PRESET: {e}")
+            print(f"ERRORE NELL'IMPORTAZIONE LUT: {e}")
+            return None
+
+        name = os.path.splitext(os.path.basename(path))[0]
+        if not self.saveLut(name, lut):
+            return None
+        return name, lut